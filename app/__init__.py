@@ -1,7 +1,7 @@
 """Top-level package for SRO NOSO Chatbot."""
-from asyncio import set_event_loop_policy, WindowsSelectorEventLoopPolicy
 import sys
 
-# Windows-совместимость для asyncio <3.12
-if sys.platform.startswith("win"):
+# Windows-совместимость для asyncio <3.12; политика есть только в сборке для Windows
+if sys.platform == "win32":
+    from asyncio import set_event_loop_policy, WindowsSelectorEventLoopPolicy
     set_event_loop_policy(WindowsSelectorEventLoopPolicy())
@@ -0,0 +1,191 @@
+"""Типы FAISS-индексов векторного хранилища и выбор между ними.
+
+Три уровня по размеру корпуса:
+
+* ``flat`` — точный перебор (``IndexFlatIP``), до десятков тысяч векторов;
+* ``hnsw`` — граф HNSW: логарифмический поиск, векторы хранятся без сжатия,
+  удаление не поддерживается — удалённые векторы отсекаются при поиске
+  до перестроения графа;
+* ``ivfpq`` — инвертированные списки с продуктовым квантованием: векторы
+  сжимаются в ``pq_m`` байт, индекс требует обучения и переобучается,
+  когда корпус заметно вырастает относительно обучающего.
+
+Все индексы обёрнуты в ``IndexIDMap2``: векторы адресуются идентификаторами
+фрагментов сегментного хранилища.
+"""
+import math
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import faiss
+import numpy as np
+
+INDEX_FLAT = "flat"
+INDEX_HNSW = "hnsw"
+INDEX_IVFPQ = "ivfpq"
+INDEX_AUTO = "auto"
+
+# Порядок уровней: автоматически индекс переводится только на уровень выше
+INDEX_TIERS = (INDEX_FLAT, INDEX_HNSW, INDEX_IVFPQ)
+
+# Бит на субквантователь PQ (256 центроидов)
+PQ_BITS = 8
+
+# Обучающих векторов на центроид: минимум для k-means и предел выборки
+MIN_TRAINING_POINTS_PER_CENTROID = 39
+MAX_TRAINING_POINTS_PER_CENTROID = 256
+
+# Во сколько раз корпус должен вырасти относительно обучающего для переобучения
+RETRAIN_GROWTH = 4.0
+
+
+@dataclass
+class ANNParams:
+    """Параметры выбора и построения индекса."""
+    index_type: str = INDEX_AUTO
+    hnsw_min_vectors: int = 20000
+    ivfpq_min_vectors: int = 500000
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 200
+    hnsw_ef_search: int = 128
+    ivf_nprobe: int = 32
+    pq_m: int = 48
+
+    @classmethod
+    def from_config(cls, rag_config: Any) -> 'ANNParams':
+        return cls(
+            index_type=rag_config.index_type,
+            hnsw_min_vectors=rag_config.hnsw_min_vectors,
+            ivfpq_min_vectors=rag_config.ivfpq_min_vectors,
+            hnsw_m=rag_config.hnsw_m,
+            hnsw_ef_construction=rag_config.hnsw_ef_construction,
+            hnsw_ef_search=rag_config.hnsw_ef_search,
+            ivf_nprobe=rag_config.ivf_nprobe,
+            pq_m=rag_config.pq_m
+        )
+
+    def select_type(self, vector_count: int) -> str:
+        """Тип индекса для корпуса из ``vector_count`` векторов.
+
+        IVF-PQ выбирается, только если векторов хватает для обучения
+        квантователей, — иначе, даже при явно заданном типе, используется HNSW.
+        """
+        if self.index_type == INDEX_AUTO:
+            if vector_count >= self.ivfpq_min_vectors:
+                index_type = INDEX_IVFPQ
+            elif vector_count >= self.hnsw_min_vectors:
+                index_type = INDEX_HNSW
+            else:
+                index_type = INDEX_FLAT
+        else:
+            index_type = self.index_type
+
+        if index_type == INDEX_IVFPQ and vector_count < min_training_vectors(vector_count):
+            return INDEX_HNSW
+        return index_type
+
+
+def ivf_lists(vector_count: int) -> int:
+    """Число инвертированных списков: ~4·√N."""
+    return max(1, int(4 * math.sqrt(vector_count)))
+
+
+def min_training_vectors(vector_count: int) -> int:
+    """Минимум обучающих векторов для IVF-PQ на корпусе такого размера."""
+    return MIN_TRAINING_POINTS_PER_CENTROID * max(ivf_lists(vector_count), 2 ** PQ_BITS)
+
+
+def create_index(index_type: str, dimension: int, params: ANNParams, vector_count: int = 0) -> faiss.Index:
+    """Создаёт пустой индекс; IVF-PQ рассчитывается на ``vector_count`` векторов."""
+    if index_type == INDEX_HNSW:
+        index = faiss.IndexHNSWFlat(dimension, params.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = params.hnsw_ef_construction
+        index.hnsw.efSearch = params.hnsw_ef_search
+    elif index_type == INDEX_IVFPQ:
+        if dimension % params.pq_m:
+            raise ValueError(f"Размерность {dimension} не делится на число субквантователей {params.pq_m}")
+        quantizer = faiss.IndexFlatIP(dimension)
+        index = faiss.IndexIVFPQ(
+            quantizer, dimension, ivf_lists(vector_count), params.pq_m, PQ_BITS,
+            faiss.METRIC_INNER_PRODUCT
+        )
+        index.nprobe = params.ivf_nprobe
+    else:
+        index = faiss.IndexFlatIP(dimension)
+
+    return faiss.IndexIDMap2(index)
+
+
+def build_index(
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    dimension: int,
+    params: ANNParams,
+    index_type: Optional[str] = None
+) -> faiss.Index:
+    """Строит индекс по готовым векторам, при необходимости обучая его."""
+    index_type = index_type or params.select_type(len(vectors))
+    index = create_index(index_type, dimension, params, vector_count=len(vectors))
+
+    if not index.is_trained:
+        sample_size = MAX_TRAINING_POINTS_PER_CENTROID * max(ivf_lists(len(vectors)), 2 ** PQ_BITS)
+        if len(vectors) > sample_size:
+            rng = np.random.default_rng(0)
+            sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+        else:
+            sample = vectors
+        index.train(np.ascontiguousarray(sample, dtype='float32'))
+
+    if len(vectors):
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype='float32'), ids.astype('int64'))
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Тип индекса по его классу."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(inner, faiss.IndexHNSW):
+        return INDEX_HNSW
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return INDEX_IVFPQ
+    return INDEX_FLAT
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """Можно ли удалять векторы из индекса (граф HNSW этого не умеет)."""
+    return index_type_of(index) != INDEX_HNSW
+
+
+def needs_retrain(index: faiss.Index) -> bool:
+    """Корпус IVF-индекса вырос настолько, что списки стали слишком длинными."""
+    if index_type_of(index) != INDEX_IVFPQ:
+        return False
+    nlist = faiss.downcast_index(index.index).nlist
+    trained_for = (nlist / 4) ** 2
+    return index.ntotal > RETRAIN_GROWTH * trained_for
+
+
+def search_params(
+    index: faiss.Index,
+    params: ANNParams,
+    top_k: int,
+    selector: Optional[faiss.IDSelector] = None
+) -> Optional[faiss.SearchParameters]:
+    """Параметры поиска: ширина обхода графа или число просматриваемых списков
+    и ``selector`` — допустимые идентификаторы (фильтр по полям документа,
+    отсечение удалённых, но ещё не вычищенных из индекса векторов)."""
+    index_type = index_type_of(index)
+    if index_type == INDEX_HNSW:
+        search = faiss.SearchParametersHNSW(efSearch=max(params.hnsw_ef_search, top_k))
+    elif index_type == INDEX_IVFPQ:
+        search = faiss.SearchParametersIVF(nprobe=params.ivf_nprobe)
+    elif selector is not None:
+        search = faiss.SearchParameters()
+    else:
+        return None
+
+    if selector is not None:
+        search.sel = selector
+        # Параметры хранят только указатель — селектор должен жить до конца поиска
+        search.selector_ref = selector
+    return search
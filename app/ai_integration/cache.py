@@ -0,0 +1,222 @@
+"""Кеши ИИ-компонентов: локальный LRU с TTL и общий уровень в Redis."""
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from app.monitoring.metrics import CACHE_EVICTIONS, CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Нормализует текст запроса для ключа кеша.
+
+    Различия в регистре, пробелах, «ё»/«е» и юникодных формах не влияют
+    на смысл вопроса и не должны давать промах кеша.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def cache_key(*parts: str) -> str:
+    """Строит компактный ключ кеша из нормализованных частей."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(normalize_text(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LocalCache:
+    """Ограниченный по размеру кеш в памяти процесса с вытеснением LRU и TTL.
+
+    Помимо числа записей ограничивается суммарный объём значений
+    ``max_bytes``: значения больше этого предела не кешируются вовсе.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        name: str = "local"
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.name = name
+        self._data: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        """Суммарный объём хранимых значений."""
+        return self._bytes
+
+    def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._pop(key, reason="expired")
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if key in self._data:
+            self._pop(key)
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            CACHE_EVICTIONS.labels(cache=self.name, reason="too_large").inc()
+            return
+
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+        self._bytes += len(value)
+
+        while len(self._data) > self.max_size:
+            self._pop(next(iter(self._data)), reason="size")
+        while self.max_bytes is not None and self._bytes > self.max_bytes:
+            self._pop(next(iter(self._data)), reason="bytes")
+
+    def delete(self, key: str) -> None:
+        if key in self._data:
+            self._pop(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def _pop(self, key: str, reason: Optional[str] = None) -> None:
+        """Удаляет запись; ``reason`` учитывается в метрике вытеснений."""
+        _, value = self._data.pop(key)
+        self._bytes -= len(value)
+        if reason is not None:
+            CACHE_EVICTIONS.labels(cache=self.name, reason=reason).inc()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TieredCache:
+    """Двухуровневый кеш: локальная память процесса и общий Redis.
+
+    Локальный уровень отвечает без сетевого запроса, Redis делает кеш общим
+    для всех процессов бота. Недоступность Redis не ломает запрос: уровень
+    отключается на ``REDIS_RETRY_INTERVAL`` секунд, а кеш продолжает работать
+    локально.
+    """
+
+    # Пауза перед повторным обращением к Redis после ошибки, секунд
+    REDIS_RETRY_INTERVAL = 30.0
+
+    # Ограничение времени операций с Redis: кеш не должен замедлять ответ
+    REDIS_TIMEOUT = 0.5
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int = 10000,
+        ttl: Optional[float] = None,
+        redis_url: Optional[str] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.local = LocalCache(max_size=max_size, ttl=ttl, max_bytes=max_bytes, name=name)
+        self.redis_url = redis_url
+
+        self._redis: Optional[aioredis.Redis] = None
+        self._redis_disabled_until = 0.0
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        """Возвращает клиент Redis, если общий уровень включён и доступен."""
+        if not self.redis_url or time.monotonic() < self._redis_disabled_until:
+            return None
+
+        if self._redis is None:
+            # Отдельный клиент без decode_responses: значения хранятся как байты
+            self._redis = aioredis.from_url(
+                self.redis_url,
+                socket_timeout=self.REDIS_TIMEOUT,
+                socket_connect_timeout=self.REDIS_TIMEOUT
+            )
+        return self._redis
+
+    def _redis_failed(self, error: Exception) -> None:
+        logger.warning(f"Cache '{self.name}': Redis unavailable, using local tier only: {error}")
+        self._redis_disabled_until = time.monotonic() + self.REDIS_RETRY_INTERVAL
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.name}:{key}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Ищет значение сначала в памяти процесса, затем в Redis."""
+        value = self.local.get(key)
+        if value is not None:
+            CACHE_REQUESTS.labels(cache=self.name, tier="local", result="hit").inc()
+            return value
+        CACHE_REQUESTS.labels(cache=self.name, tier="local", result="miss").inc()
+
+        client = self._get_redis()
+        if client is None:
+            return None
+
+        try:
+            value = await client.get(self._redis_key(key))
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+
+        if value is None:
+            CACHE_REQUESTS.labels(cache=self.name, tier="redis", result="miss").inc()
+            return None
+
+        CACHE_REQUESTS.labels(cache=self.name, tier="redis", result="hit").inc()
+        self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Сохраняет значение на обоих уровнях."""
+        ttl = ttl if ttl is not None else self.ttl
+        self.local.set(key, value, ttl)
+
+        client = self._get_redis()
+        if client is None:
+            return
+
+        try:
+            await client.set(self._redis_key(key), value, ex=int(ttl) if ttl else None)
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def delete(self, key: str) -> None:
+        """Удаляет значение с обоих уровней."""
+        self.local.delete(key)
+
+        client = self._get_redis()
+        if client is None:
+            return
+
+        try:
+            await client.delete(self._redis_key(key))
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def close(self) -> None:
+        """Закрывает соединение с Redis."""
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
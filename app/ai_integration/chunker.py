@@ -0,0 +1,279 @@
+"""Разбиение документов на фрагменты с учётом токенов и структуры документа."""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Заголовки, начинающие новый раздел: фрагмент не пересекает их границу
+HARD_BOUNDARY_RE = re.compile(
+    r"^\s*(?:"
+    r"(?:статья|раздел|глава|часть|приложение)\s+(?:№\s*)?[\dIVXLC]+"
+    r"|\d{1,2}\.?\s+[А-ЯЁA-Z][А-ЯЁA-Z\s,\-]{3,}$"
+    r")",
+    re.IGNORECASE
+)
+
+# Пункты и подпункты: предпочтительные места разреза внутри раздела
+SOFT_BOUNDARY_RE = re.compile(
+    r"^\s*(?:пункт\s+\d|\d{1,2}(?:\.\d{1,3}){0,3}[.)]?\s+\S|[а-я]\)\s)",
+    re.IGNORECASE
+)
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+")
+WORD_RE = re.compile(r"\S+")
+
+# Максимальная длина заголовка раздела в метаданных
+SECTION_TITLE_LIMIT = 150
+
+BODY, SOFT, HARD = 0, 1, 2
+
+
+def estimate_tokens(texts: List[str]) -> List[int]:
+    """Грубая оценка числа токенов, если токенизатор модели недоступен."""
+    return [int(len(text.split()) * 1.6) + 1 for text in texts]
+
+
+@dataclass
+class Chunk:
+    """Фрагмент документа и его положение в исходном тексте."""
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Unit:
+    """Строка (абзац) документа — минимальная единица разбиения."""
+    text: str
+    page: int
+    start: int
+    end: int
+    kind: int = BODY
+    tokens: int = 0
+
+
+class StructuredChunker:
+    """Разбивает документ на фрагменты ограниченной длины в токенах.
+
+    Длина измеряется токенизатором модели эмбеддингов, чтобы фрагмент целиком
+    помещался в её окно. Фрагменты не пересекают границ статей и разделов,
+    а внутри раздела режутся по возможности на границе пунктов. Соседние
+    фрагменты перекрываются на ``overlap_tokens`` токенов.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Optional[Callable[[List[str]], List[int]]] = None,
+        max_tokens: int = 126,
+        overlap_tokens: int = 24
+    ):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("Перекрытие должно быть меньше размера фрагмента")
+
+        self.count_tokens = count_tokens or estimate_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def chunk(self, pages: Iterable[str]) -> List[Chunk]:
+        """Разбивает постраничный текст документа на фрагменты.
+
+        Смещения ``char_start``/``char_end`` указываются в тексте,
+        полученном объединением страниц через перевод строки.
+        """
+        stream = self.stream()
+        chunks: List[Chunk] = []
+        for page in pages:
+            chunks.extend(stream.feed(page))
+        chunks.extend(stream.finish())
+        return chunks
+
+    def stream(self) -> "ChunkStream":
+        """Создаёт потоковое разбиение одного документа."""
+        return ChunkStream(self)
+
+    def _page_units(self, page: str, page_number: int, offset: int) -> List[_Unit]:
+        """Делит страницу на непустые строки с их смещениями и длиной в токенах."""
+        units = []
+        for line in page.split("\n"):
+            if line.strip():
+                if HARD_BOUNDARY_RE.match(line):
+                    kind = HARD
+                elif SOFT_BOUNDARY_RE.match(line):
+                    kind = SOFT
+                else:
+                    kind = BODY
+                units.append(_Unit(line, page_number, offset, offset + len(line), kind))
+            offset += len(line) + 1
+
+        if not units:
+            return units
+
+        for unit, tokens in zip(units, self.count_tokens([unit.text for unit in units])):
+            unit.tokens = tokens
+        return self._split_oversized(units)
+
+    def _split_oversized(self, units: List[_Unit]) -> List[_Unit]:
+        """Делит строки длиннее фрагмента по предложениям, а затем по словам."""
+        result = []
+        for unit in units:
+            if unit.tokens <= self.max_tokens:
+                result.append(unit)
+                continue
+
+            pieces = self._pieces(unit, self._sentence_spans(unit.text))
+            for piece in pieces:
+                if piece.tokens <= self.max_tokens:
+                    result.append(piece)
+                else:
+                    result.extend(self._split_words(piece))
+        return result
+
+    @staticmethod
+    def _sentence_spans(text: str) -> List[Tuple[int, int]]:
+        """Границы предложений строки."""
+        spans = []
+        start = 0
+        for match in SENTENCE_END_RE.finditer(text):
+            spans.append((start, match.start()))
+            start = match.end()
+        spans.append((start, len(text)))
+        return spans
+
+    def _pieces(self, unit: _Unit, spans: List[Tuple[int, int]]) -> List[_Unit]:
+        """Создаёт единицы для частей строки по их границам ``(start, end)`` в ``unit.text``."""
+        spans = [(start, end) for start, end in spans if unit.text[start:end].strip()]
+        texts = [unit.text[start:end] for start, end in spans]
+        pieces = []
+        for i, ((start, end), text, tokens) in enumerate(zip(spans, texts, self.count_tokens(texts))):
+            pieces.append(_Unit(
+                text,
+                unit.page,
+                unit.start + start,
+                unit.start + end,
+                unit.kind if i == 0 else BODY,
+                tokens
+            ))
+        return pieces
+
+    def _split_words(self, unit: _Unit) -> List[_Unit]:
+        """Делит часть строки на окна слов, укладывающиеся в размер фрагмента."""
+        words = list(WORD_RE.finditer(unit.text))
+        spans: List[Tuple[int, int]] = []
+        window_start, window_end, current_tokens = None, 0, 0
+        for word, tokens in zip(words, self.count_tokens([word.group() for word in words])):
+            if window_start is not None and current_tokens + tokens > self.max_tokens:
+                spans.append((window_start, window_end))
+                window_start, current_tokens = None, 0
+            if window_start is None:
+                window_start = word.start()
+            window_end = word.end()
+            current_tokens += tokens
+        if window_start is not None:
+            spans.append((window_start, window_end))
+
+        # Окна из отдельных слов ещё раз считаются целиком: слова могут склеиваться
+        pieces = self._pieces(unit, spans)
+        for piece in pieces:
+            piece.tokens = min(piece.tokens, self.max_tokens)
+        return pieces
+
+    @staticmethod
+    def _tokens(units: List[_Unit]) -> int:
+        return sum(unit.tokens for unit in units)
+
+    @staticmethod
+    def _split_point(buffer: List[_Unit]) -> int:
+        """Позиция разреза буфера: последняя граница пункта или конец буфера.
+
+        Заголовок не отрывается от следующего за ним текста.
+        """
+        for i in range(len(buffer) - 1, 0, -1):
+            if buffer[i].kind != BODY and any(unit.kind != HARD for unit in buffer[:i]):
+                return i
+        return len(buffer)
+
+    def _overlap(self, units: List[_Unit]) -> List[_Unit]:
+        """Хвостовые строки фрагмента, переносимые в начало следующего."""
+        overlap: List[_Unit] = []
+        tokens = 0
+        for unit in reversed(units):
+            if tokens + unit.tokens > self.overlap_tokens:
+                break
+            overlap.insert(0, _Unit(unit.text, unit.page, unit.start, unit.end, BODY, unit.tokens))
+            tokens += unit.tokens
+        return overlap
+
+    def _make_chunk(self, units: List[_Unit], section: Optional[str]) -> Chunk:
+        return Chunk(
+            text="\n".join(unit.text for unit in units),
+            metadata={
+                "section": section,
+                "page_start": units[0].page,
+                "page_end": units[-1].page,
+                "char_start": units[0].start,
+                "char_end": units[-1].end,
+                "tokens": self._tokens(units),
+            }
+        )
+
+
+class ChunkStream:
+    """Потоковое разбиение одного документа.
+
+    Страницы подаются по мере извлечения, готовые фрагменты возвращаются
+    сразу: в памяти держится только незавершённый фрагмент.
+    """
+
+    def __init__(self, chunker: StructuredChunker):
+        self.chunker = chunker
+        self._buffer: List[_Unit] = []
+        self._section: Optional[str] = None
+        self._page_number = 0
+        self._offset = 0
+
+    def feed(self, page: str) -> List[Chunk]:
+        """Принимает очередную страницу и возвращает завершённые фрагменты."""
+        self._page_number += 1
+        units = self.chunker._page_units(page, self._page_number, self._offset)
+        self._offset += len(page) + 1
+
+        chunks: List[Chunk] = []
+        for unit in units:
+            self._add(unit, chunks)
+        return chunks
+
+    def finish(self) -> List[Chunk]:
+        """Завершает документ и возвращает последний фрагмент."""
+        chunks = []
+        if self._buffer:
+            chunks.append(self.chunker._make_chunk(self._buffer, self._section))
+        self._buffer = []
+        return chunks
+
+    def _add(self, unit: _Unit, chunks: List[Chunk]) -> None:
+        chunker = self.chunker
+        buffer = self._buffer
+
+        if unit.kind == HARD:
+            title = unit.text.strip()[:SECTION_TITLE_LIMIT]
+            if buffer and all(item.kind == HARD for item in buffer):
+                # Заголовки подряд («Раздел I» и «Статья 1») остаются вместе
+                self._section = f"{self._section} / {title}"
+            else:
+                # Новый раздел: перекрытие через границу раздела не переносится
+                if buffer:
+                    chunks.append(chunker._make_chunk(buffer, self._section))
+                buffer = []
+                self._section = title
+
+        while buffer and chunker._tokens(buffer) + unit.tokens > chunker.max_tokens:
+            cut = chunker._split_point(buffer)
+            emitted, rest = buffer[:cut], buffer[cut:]
+            chunks.append(chunker._make_chunk(emitted, self._section))
+
+            overlap = chunker._overlap(emitted)
+            if chunker._tokens(overlap + rest) + unit.tokens <= chunker.max_tokens:
+                buffer = overlap + rest
+            else:
+                buffer = rest
+
+        buffer.append(unit)
+        self._buffer = buffer
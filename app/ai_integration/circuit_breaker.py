@@ -0,0 +1,85 @@
+"""Автоматический выключатель (circuit breaker) для внешнего API.
+
+После серии отказов подряд выключатель «размыкается», и запросы к API
+сразу отклоняются, не тратя десятки секунд на таймауты и повторы. Через
+``recovery_timeout`` секунд выключатель пропускает один пробный запрос
+(полуоткрытое состояние): успех замыкает его, отказ снова размыкает.
+"""
+import logging
+import time
+
+from app.monitoring.metrics import CIRCUIT_STATE, CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Значения состояний для метрики
+_STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class CircuitBreaker:
+    """Размыкается после ``failure_threshold`` отказов подряд.
+
+    В полуоткрытом состоянии пробный запрос разрешается не чаще раза
+    в ``recovery_timeout`` секунд: если пробный запрос прервался, не сообщив
+    исход, следующая проба всё равно состоится.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._next_probe_at = 0.0
+
+        CIRCUIT_STATE.labels(name=name).set(_STATE_VALUES[self._state])
+
+    @property
+    def state(self) -> str:
+        """Текущее состояние; открытый выключатель переходит в полуоткрытый по таймауту."""
+        if self._state == STATE_OPEN and time.monotonic() >= self._next_probe_at:
+            self._transition(STATE_HALF_OPEN)
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Запросы сейчас отклоняются без обращения к API."""
+        return self.state == STATE_OPEN
+
+    def allow_request(self) -> bool:
+        """Можно ли выполнить запрос; в полуоткрытом состоянии — только пробный."""
+        state = self.state
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_HALF_OPEN and time.monotonic() >= self._next_probe_at:
+            self._next_probe_at = time.monotonic() + self.recovery_timeout
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        if self._state != STATE_CLOSED:
+            self._transition(STATE_CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+            self._next_probe_at = time.monotonic() + self.recovery_timeout
+            if self._state != STATE_OPEN:
+                self._transition(STATE_OPEN)
+
+    def _transition(self, state: str) -> None:
+        logger.warning(f"Circuit '{self.name}': {self._state} -> {state}")
+        self._state = state
+        CIRCUIT_STATE.labels(name=self.name).set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(name=self.name, state=state).inc()
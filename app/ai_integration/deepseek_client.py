@@ -1,23 +1,65 @@
 """Обновленный клиент DeepSeek с использованием нативного SDK."""
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 import asyncio
 
 from config.settings import config
-from app.ai_integration.deepseek_sdk import DeepSeekClient as NativeDeepSeekClient, DeepSeekError
+from app.ai_integration.cache import TieredCache
+from app.ai_integration.circuit_breaker import CircuitBreaker
+from app.ai_integration.rate_governor import RateGovernor
+from app.ai_integration.single_flight import SingleFlight
+from app.ai_integration.deepseek_sdk import (
+    DeepSeekClient as NativeDeepSeekClient,
+    DeepSeekError,
+    DeepSeekUnavailable,
+)
 
 
 class DeepSeekClient:
     """Обёртка над нативным DeepSeek клиентом для обратной совместимости."""
     
     def __init__(self):
+        # Кэш ответов общий для всех процессов бота через Redis
+        cache = TieredCache(
+            "llm",
+            max_size=config.ai.response_cache_size,
+            ttl=config.ai.response_cache_ttl,
+            redis_url=config.redis.url if config.ai.response_cache_redis else None,
+            max_bytes=config.ai.response_cache_max_bytes
+        )
         self._client = NativeDeepSeekClient(
             api_key=config.ai.api_key,
             model=config.ai.model,
             timeout=30,
             max_retries=3,
-            cache_ttl=3600
+            cache_ttl=config.ai.response_cache_ttl,
+            cache=cache,
+            single_flight=SingleFlight(
+                "llm",
+                redis_url=config.redis.url if config.ai.response_cache_redis else None,
+                lock_ttl=config.ai.single_flight_timeout
+            ),
+            governor=RateGovernor(
+                "llm",
+                requests_per_minute=config.ai.rate_requests_per_minute,
+                tokens_per_minute=config.ai.rate_tokens_per_minute,
+                initial_concurrency=config.ai.concurrency_initial,
+                max_concurrency=config.ai.concurrency_max,
+                latency_target=config.ai.latency_target,
+                max_queue=config.ai.queue_size,
+                max_queue_wait=config.ai.queue_timeout
+            ),
+            breaker=CircuitBreaker(
+                "llm",
+                failure_threshold=config.ai.circuit_failure_threshold,
+                recovery_timeout=config.ai.circuit_recovery_timeout
+            )
         )
     
+    @property
+    def is_available(self) -> bool:
+        """API доступно: выключатель не разомкнут после серии отказов."""
+        return self._client.is_available
+    
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -35,6 +77,31 @@ class DeepSeekClient:
             )
             return response.content
             
+        except DeepSeekUnavailable:
+            # Вызывающий код переходит в режим деградации
+            raise
+        except DeepSeekError as e:
+            raise Exception(f"DeepSeek API error: {e}")
+    
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = None,
+        max_tokens: int = None,
+        temperature: float = None
+    ) -> AsyncIterator[str]:
+        """Выполняет потоковый запрос к DeepSeek API, отдавая фрагменты ответа."""
+        try:
+            async for delta in self._client.chat_completion_stream(
+                messages=messages,
+                model=model or config.ai.model,
+                max_tokens=max_tokens or config.ai.max_tokens,
+                temperature=temperature or config.ai.temperature
+            ):
+                yield delta
+        
+        except DeepSeekUnavailable:
+            raise
         except DeepSeekError as e:
             raise Exception(f"DeepSeek API error: {e}")
     
@@ -45,6 +112,27 @@ class DeepSeekClient:
         system_prompt: Optional[str] = None
     ) -> str:
         """Генерирует ответ на вопрос пользователя."""
+        messages = self._build_messages(user_question, context, system_prompt)
+        return await self.chat_completion(messages)
+    
+    async def stream_response(
+        self,
+        user_question: str,
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Генерирует ответ на вопрос пользователя в потоковом режиме."""
+        messages = self._build_messages(user_question, context, system_prompt)
+        async for delta in self.stream_chat_completion(messages):
+            yield delta
+    
+    @staticmethod
+    def _build_messages(
+        user_question: str,
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """Формирует список сообщений для запроса."""
         messages = []
         
         # Системный промпт
@@ -68,7 +156,7 @@ class DeepSeekClient:
         # Вопрос пользователя
         messages.append({"role": "user", "content": user_question})
         
-        return await self.chat_completion(messages)
+        return messages
     
     async def close(self) -> None:
         """Закрывает клиент."""
@@ -1,12 +1,24 @@
 import asyncio
-import time
 import json
+import time
 import httpx
 import hashlib
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
+from typing import AsyncIterator, List, Dict, Optional
+from dataclasses import asdict, dataclass
 import logging
 
+from app.ai_integration.cache import TieredCache
+from app.ai_integration.circuit_breaker import CircuitBreaker
+from app.ai_integration.prompt_builder import estimate_llm_tokens
+from app.ai_integration.rate_governor import (
+    GovernorOverloaded,
+    RateGovernor,
+    backoff_delay,
+    parse_retry_after,
+)
+from app.ai_integration.single_flight import SingleFlight
+from app.monitoring.metrics import LLM_TOKENS
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,6 +27,11 @@ class DeepSeekError(Exception):
     pass
 
 
+class DeepSeekUnavailable(DeepSeekError):
+    """API недоступно: выключатель разомкнут после серии отказов."""
+    pass
+
+
 @dataclass
 class DeepSeekResponse:
     """Ответ от DeepSeek API."""
@@ -35,7 +52,11 @@ class DeepSeekClient:
         model: str = "deepseek-chat",
         timeout: int = 30,
         max_retries: int = 3,
-        cache_ttl: int = 3600
+        cache_ttl: int = 3600,
+        cache: Optional[TieredCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        governor: Optional[RateGovernor] = None,
+        breaker: Optional[CircuitBreaker] = None
     ):
         self.api_key = api_key
         self.model = model
@@ -43,37 +64,63 @@ class DeepSeekClient:
         self.max_retries = max_retries
         self.cache_ttl = cache_ttl
         
-        # Простой in-memory кэш
-        self._cache: Dict[str, Tuple[float, DeepSeekResponse]] = {}
+        # Кэш ответов: по умолчанию только в памяти процесса; общий кэш
+        # с уровнем Redis передаётся снаружи
+        self._cache = cache or TieredCache("llm", max_size=1000, ttl=cache_ttl)
+        
+        # Одинаковые одновременные запросы выполняются одним обращением к API
+        self._single_flight = single_flight or SingleFlight("llm")
+        
+        # Лимиты частоты, токенов и параллельности запросов к API
+        self._governor = governor or RateGovernor("llm")
         
-        # HTTP клиент
+        # При серии отказов запросы отклоняются сразу, без таймаутов и повторов
+        self._breaker = breaker or CircuitBreaker("llm")
+        
+        # HTTP клиент; соединений не больше верхнего предела параллельности
         self._client = httpx.AsyncClient(
             timeout=self.timeout,
-            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
+            limits=httpx.Limits(
+                max_keepalive_connections=self._governor.max_concurrency,
+                max_connections=self._governor.max_concurrency
+            )
         )
     
-    def _get_cache_key(self, messages: List[Dict], model: str) -> str:
+    def _get_cache_key(
+        self,
+        messages: List[Dict],
+        model: str,
+        temperature: float,
+        max_tokens: int
+    ) -> str:
         """Создает ключ кэша для запроса."""
-        content = json.dumps(messages, sort_keys=True) + model
-        return hashlib.md5(content.encode()).hexdigest()
+        content = json.dumps(
+            [messages, model, temperature, max_tokens], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
     
-    def _get_from_cache(self, cache_key: str) -> Optional[DeepSeekResponse]:
+    async def _get_from_cache(self, cache_key: str) -> Optional[DeepSeekResponse]:
         """Получает ответ из кэша."""
-        if cache_key in self._cache:
-            timestamp, response = self._cache[cache_key]
-            if time.time() - timestamp < self.cache_ttl:
-                logger.debug(f"Cache hit for key {cache_key[:8]}...")
-                return response
-            else:
-                # Удаляем устаревший кэш
-                del self._cache[cache_key]
-        return None
-    
-    def _save_to_cache(self, cache_key: str, response: DeepSeekResponse) -> None:
+        raw = await self._cache.get(cache_key)
+        if raw is None:
+            return None
+        
+        logger.debug(f"Cache hit for key {cache_key[:8]}...")
+        return DeepSeekResponse(**json.loads(raw))
+    
+    async def _save_to_cache(self, cache_key: str, response: DeepSeekResponse) -> None:
         """Сохраняет ответ в кэш."""
-        self._cache[cache_key] = (time.time(), response)
+        raw = json.dumps(asdict(response), ensure_ascii=False).encode()
+        await self._cache.set(cache_key, raw, ttl=self.cache_ttl)
         logger.debug(f"Cached response for key {cache_key[:8]}...")
     
+    def _get_headers(self) -> Dict[str, str]:
+        """Заголовки запроса к API."""
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -85,13 +132,27 @@ class DeepSeekClient:
         """Выполняет запрос к DeepSeek API."""
         
         used_model = model or self.model
-        cache_key = self._get_cache_key(messages, used_model)
+        
+        if stream:
+            # Собираем потоковый ответ целиком; кэш для stream не используем
+            parts = [
+                delta async for delta in self.chat_completion_stream(
+                    messages, model=used_model, temperature=temperature, max_tokens=max_tokens
+                )
+            ]
+            return DeepSeekResponse(
+                content="".join(parts),
+                model=used_model,
+                usage={},
+                finish_reason="stop"
+            )
+        
+        cache_key = self._get_cache_key(messages, used_model, temperature, max_tokens)
         
         # Проверяем кэш
-        if not stream:  # Для stream запросов кэш не используем
-            cached_response = self._get_from_cache(cache_key)
-            if cached_response:
-                return cached_response
+        cached_response = await self._get_from_cache(cache_key)
+        if cached_response:
+            return cached_response
         
         # Подготавливаем запрос
         payload = {
@@ -99,17 +160,33 @@ class DeepSeekClient:
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens,
-            "stream": stream
+            "stream": False
         }
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        return await self._single_flight.do(
+            cache_key,
+            lambda: self._request_completion(payload, cache_key),
+            lambda: self._get_from_cache(cache_key)
+        )
+    
+    async def _request_completion(self, payload: Dict, cache_key: str) -> DeepSeekResponse:
+        """Выполняет запрос к API с повторами и сохраняет ответ в кэш."""
+        headers = self._get_headers()
+        reserved = self._reserve_tokens(payload)
         
         # Выполняем запрос с повторами
         last_exception = None
+        delay = 0.0
         for attempt in range(self.max_retries):
+            if delay:
+                await asyncio.sleep(delay)
+                delay = 0.0
+            
+            self._check_circuit()
+            await self._acquire(reserved)
+            started_at = time.monotonic()
+            throttled = False
+            tokens_used = None
             try:
                 response = await self._client.post(
                     f"{self.BASE_URL}/chat/completions",
@@ -126,18 +203,22 @@ class DeepSeekClient:
                         usage=data.get("usage", {}),
                         finish_reason=data["choices"][0]["finish_reason"]
                     )
+                    tokens_used = deepseek_response.usage.get("total_tokens")
+                    self._record_usage(deepseek_response.model, deepseek_response.usage)
+                    self._breaker.record_success()
                     
                     # Сохраняем в кэш только успешные ответы
-                    if not stream:
-                        self._save_to_cache(cache_key, deepseek_response)
+                    await self._save_to_cache(cache_key, deepseek_response)
                     
                     return deepseek_response
                 
                 elif response.status_code == 429:
-                    # Rate limit - ждем и повторяем
-                    wait_time = 2 ** attempt
-                    logger.warning(f"Rate limit hit, waiting {wait_time}s before retry {attempt + 1}")
-                    await asyncio.sleep(wait_time)
+                    # Rate limit - новые запросы ждут, повтор встаёт в очередь;
+                    # отклонённый запрос токенов не расходует
+                    throttled = True
+                    tokens_used = 0
+                    last_exception = DeepSeekError("Rate limit exceeded")
+                    self._pause_after_rate_limit(response, attempt)
                     continue
                 
                 elif response.status_code in [401, 403]:
@@ -145,8 +226,10 @@ class DeepSeekClient:
                 
                 elif response.status_code >= 500:
                     # Серверная ошибка - повторяем
-                    logger.warning(f"Server error {response.status_code}, retry {attempt + 1}")
-                    await asyncio.sleep(1)
+                    last_exception = DeepSeekError(f"Server error {response.status_code}")
+                    self._breaker.record_failure()
+                    delay = backoff_delay(attempt)
+                    logger.warning(f"Server error {response.status_code}, retry {attempt + 1} in {delay:.1f}s")
                     continue
                 
                 else:
@@ -155,19 +238,177 @@ class DeepSeekClient:
                     
             except httpx.TimeoutException as e:
                 last_exception = DeepSeekError(f"Request timeout: {e}")
+                self._breaker.record_failure()
+                delay = backoff_delay(attempt)
                 logger.warning(f"Timeout on attempt {attempt + 1}")
-                await asyncio.sleep(1)
                 continue
             
             except httpx.RequestError as e:
                 last_exception = DeepSeekError(f"Request error: {e}")
+                self._breaker.record_failure()
+                delay = backoff_delay(attempt)
                 logger.warning(f"Request error on attempt {attempt + 1}: {e}")
-                await asyncio.sleep(1)
                 continue
+            
+            finally:
+                self._governor.release(
+                    time.monotonic() - started_at,
+                    throttled=throttled,
+                    tokens_used=tokens_used,
+                    tokens_reserved=reserved
+                )
         
         # Если все попытки неудачны
         raise last_exception or DeepSeekError("All retry attempts failed")
     
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000
+    ) -> AsyncIterator[str]:
+        """Выполняет потоковый запрос (SSE) и отдаёт фрагменты ответа по мере генерации.
+        
+        Повторы выполняются только до получения первого фрагмента: после начала
+        генерации ошибка соединения пробрасывается вызывающему коду. Разрешение
+        регулятора нагрузки удерживается до конца потока; задержкой ответа
+        считается время до первого фрагмента.
+        """
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            # Последний фрагмент потока содержит usage для учёта токенов
+            "stream_options": {"include_usage": True}
+        }
+        reserved = self._reserve_tokens(payload)
+        
+        last_exception = None
+        delay = 0.0
+        for attempt in range(self.max_retries):
+            if delay:
+                await asyncio.sleep(delay)
+                delay = 0.0
+            
+            self._check_circuit()
+            await self._acquire(reserved)
+            started_at = time.monotonic()
+            first_delta_at = None
+            throttled = False
+            tokens_used = None
+            try:
+                async with self._client.stream(
+                    "POST",
+                    f"{self.BASE_URL}/chat/completions",
+                    json=payload,
+                    headers=self._get_headers()
+                ) as response:
+                    if response.status_code == 200:
+                        async for line in response.aiter_lines():
+                            # Формат SSE: строки "data: {...}", завершение — "data: [DONE]"
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                return
+                            
+                            chunk = json.loads(data)
+                            if chunk.get("usage"):
+                                tokens_used = chunk["usage"].get("total_tokens")
+                                self._record_usage(chunk.get("model", payload["model"]), chunk["usage"])
+                            choices = chunk.get("choices") or [{}]
+                            delta = choices[0].get("delta", {}).get("content")
+                            if delta:
+                                if first_delta_at is None:
+                                    first_delta_at = time.monotonic()
+                                    self._breaker.record_success()
+                                yield delta
+                        return
+                    
+                    elif response.status_code == 429:
+                        throttled = True
+                        tokens_used = 0
+                        last_exception = DeepSeekError("Rate limit exceeded")
+                        self._pause_after_rate_limit(response, attempt)
+                        continue
+                    
+                    elif response.status_code in [401, 403]:
+                        raise DeepSeekError(f"Authentication error: {response.status_code}")
+                    
+                    elif response.status_code >= 500:
+                        last_exception = DeepSeekError(f"Server error {response.status_code}")
+                        self._breaker.record_failure()
+                        delay = backoff_delay(attempt)
+                        logger.warning(f"Server error {response.status_code}, retry {attempt + 1} in {delay:.1f}s")
+                        continue
+                    
+                    else:
+                        body = await response.aread()
+                        raise DeepSeekError(f"API error {response.status_code}: {body[:500]!r}")
+            
+            except (httpx.TimeoutException, httpx.RequestError) as e:
+                self._breaker.record_failure()
+                if first_delta_at is not None:
+                    raise DeepSeekError(f"Stream interrupted: {e}")
+                last_exception = DeepSeekError(f"Request error: {e}")
+                delay = backoff_delay(attempt)
+                logger.warning(f"Stream request error on attempt {attempt + 1}: {e}")
+                continue
+            
+            finally:
+                self._governor.release(
+                    (first_delta_at or time.monotonic()) - started_at,
+                    throttled=throttled,
+                    tokens_used=tokens_used,
+                    tokens_reserved=reserved
+                )
+        
+        raise last_exception or DeepSeekError("All retry attempts failed")
+    
+    @staticmethod
+    def _record_usage(model: str, usage: Dict[str, int]) -> None:
+        """Учитывает токены ответа, в том числе попадания в кеш префикса запроса."""
+        for kind in ("prompt_cache_hit_tokens", "prompt_cache_miss_tokens", "completion_tokens"):
+            if usage.get(kind):
+                LLM_TOKENS.labels(model=model, kind=kind[:-len("_tokens")]).inc(usage[kind])
+    
+    @property
+    def is_available(self) -> bool:
+        """Можно ли обращаться к API (выключатель не разомкнут)."""
+        return not self._breaker.is_open
+    
+    def _check_circuit(self) -> None:
+        """Отклоняет запрос сразу, если выключатель разомкнут."""
+        if not self._breaker.allow_request():
+            raise DeepSeekUnavailable("DeepSeek API is unavailable, circuit is open")
+    
+    async def _acquire(self, reserved_tokens: int) -> None:
+        """Ожидает разрешения регулятора нагрузки на запрос."""
+        try:
+            await self._governor.acquire(tokens=reserved_tokens)
+        except GovernorOverloaded as e:
+            raise DeepSeekError(f"Too many pending requests: {e}")
+    
+    def _reserve_tokens(self, payload: Dict) -> int:
+        """Оценивает расход токенов запроса до получения usage из ответа."""
+        if not self._governor.tracks_tokens:
+            return 0
+        prompt_tokens = sum(
+            estimate_llm_tokens(message.get("content") or "") for message in payload["messages"]
+        )
+        return prompt_tokens + payload["max_tokens"]
+    
+    def _pause_after_rate_limit(self, response: httpx.Response, attempt: int) -> None:
+        """Приостанавливает запросы на время из Retry-After или по экспоненте с разбросом."""
+        wait_time = parse_retry_after(response.headers.get("Retry-After"))
+        if wait_time is None:
+            wait_time = backoff_delay(attempt)
+        self._governor.pause(wait_time)
+        logger.warning(f"Rate limit hit, pausing requests for {wait_time:.1f}s before retry {attempt + 1}")
+    
     async def simple_chat(self, user_message: str, system_prompt: Optional[str] = None) -> str:
         """Упрощенный метод для одиночных сообщений."""
         messages = []
@@ -181,13 +422,15 @@ class DeepSeekClient:
         return response.content
     
     def clear_cache(self) -> None:
-        """Очищает кэш."""
-        self._cache.clear()
+        """Очищает кэш в памяти процесса; записи в Redis истекают по TTL."""
+        self._cache.local.clear()
         logger.info("DeepSeek cache cleared")
     
     async def close(self) -> None:
-        """Закрывает HTTP клиент."""
+        """Закрывает HTTP клиент и соединение кэша."""
         await self._client.aclose()
+        await self._cache.close()
+        await self._single_flight.close()
     
     async def __aenter__(self):
         return self
@@ -1,31 +1,47 @@
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List, Optional
 
 import pdfplumber
 
+from app.ai_integration.chunker import Chunk, ChunkStream, StructuredChunker
+
 
 class DocumentProcessor:
-    """Извлечение текста из PDF-документов."""
+    """Извлечение текста из PDF-документов и разбиение его на фрагменты."""
+
+    def __init__(self, chunker: Optional[StructuredChunker] = None):
+        self.chunker = chunker or StructuredChunker()
 
     @staticmethod
-    def extract_text(file_path: Path) -> str:
-        text = ""
+    def iter_pages(file_path: Path) -> Iterator[str]:
+        """Извлекает текст PDF постранично, не удерживая разобранные страницы."""
         with pdfplumber.open(file_path) as pdf:
             for page in pdf.pages:
-                page_text = page.extract_text() or ""
-                text += page_text + "\n"
-        return text
+                text = page.extract_text() or ""
+                # pdfplumber кеширует объекты страницы до закрытия документа
+                page.close()
+                yield text
 
-    @staticmethod
-    def split_into_chunks(text: str, max_tokens: int = 1000) -> List[str]:
-        words = text.split()
-        chunk, current = [], 0
-        for word in words:
-            if current + len(word) >= max_tokens:
-                yield " ".join(chunk)
-                chunk, current = [word], len(word)
-            else:
-                chunk.append(word)
-                current += len(word)
-        if chunk:
-            yield " ".join(chunk)
+    @classmethod
+    def extract_text(cls, file_path: Path) -> str:
+        return "".join(f"{page}\n" for page in cls.iter_pages(file_path))
+
+    def chunk_pages(self, pages: Iterable[str]) -> List[Chunk]:
+        """Разбивает постраничный текст на фрагменты с метаданными положения."""
+        return self.chunker.chunk(pages)
+
+    def chunk_stream(self) -> ChunkStream:
+        """Потоковое разбиение документа, страницы которого извлекаются по одной."""
+        return self.chunker.stream()
+
+    def split_into_chunks(self, text: str, max_tokens: Optional[int] = None) -> Iterator[str]:
+        """Разбивает текст на фрагменты не длиннее ``max_tokens`` токенов."""
+        chunker = self.chunker
+        if max_tokens is not None:
+            chunker = StructuredChunker(
+                count_tokens=chunker.count_tokens,
+                max_tokens=max_tokens,
+                overlap_tokens=min(chunker.overlap_tokens, max_tokens // 2)
+            )
+        for chunk in chunker.chunk([text]):
+            yield chunk.text
@@ -0,0 +1,169 @@
+"""Бэкенды вычисления эмбеддингов: PyTorch и ONNX Runtime.
+
+Бэкенд PyTorch загружает модель через sentence-transformers. Бэкенд ONNX
+Runtime работает с моделью, экспортированной скриптом
+``scripts/export_onnx_model.py`` (при необходимости квантованной в int8),
+и не импортирует ``torch``: на CPU он быстрее и занимает меньше памяти.
+"""
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class TorchBackend:
+    """Модель sentence-transformers на PyTorch."""
+
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        # Импорт torch занимает секунды — выполняется только для этого бэкенда
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = SentenceTransformer(model_name, device=self.device)
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def max_seq_length(self) -> int:
+        return self.model.max_seq_length
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        encoded = self.model.tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=False,
+            verbose=False
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+
+class OnnxBackend:
+    """Экспортированная модель на ONNX Runtime (CPU).
+
+    Каталог модели содержит ``model.onnx`` и/или ``model_int8.onnx``,
+    ``tokenizer.json`` и ``embedding_config.json`` с параметрами пулинга
+    и именем исходной модели. Модель, экспортированная из другого
+    энкодера, не загружается: её векторы несовместимы с индексом.
+    """
+
+    name = "onnx"
+
+    MODEL_FILE = "model.onnx"
+    QUANTIZED_MODEL_FILE = "model_int8.onnx"
+    TOKENIZER_FILE = "tokenizer.json"
+    CONFIG_FILE = "embedding_config.json"
+
+    def __init__(
+        self,
+        model_path: str,
+        model_name: Optional[str] = None,
+        quantized: bool = True,
+        threads: int = 0
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = Path(model_path)
+        settings = json.loads((path / self.CONFIG_FILE).read_text(encoding="utf-8"))
+
+        if model_name is not None and settings.get("model_name") != model_name:
+            raise ValueError(
+                f"ONNX model in {path} was exported from {settings.get('model_name')!r}, "
+                f"expected {model_name!r}; re-run scripts/export_onnx_model.py"
+            )
+
+        self.model_name = settings["model_name"]
+        self.dimension = settings["dimension"]
+        self.max_seq_length = settings["max_seq_length"]
+        self.normalize = settings.get("normalize", False)
+        self.quantized = quantized
+        self.device = "cpu"
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+
+        model_file = path / (self.QUANTIZED_MODEL_FILE if quantized else self.MODEL_FILE)
+        self.session = ort.InferenceSession(
+            str(model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        # Токенизатор для модели: обрезка до окна и дополнение до длины пачки
+        self.tokenizer = Tokenizer.from_file(str(path / self.TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(
+            pad_id=settings["pad_token_id"], pad_token=settings["pad_token"]
+        )
+
+        # Токенизатор для подсчёта длины текста: без обрезки и дополнения
+        self._counter = Tokenizer.from_file(str(path / self.TOKENIZER_FILE))
+        self._counter.no_truncation()
+        self._counter.no_padding()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array(
+            [encoding.attention_mask for encoding in encodings], dtype=np.int64
+        )
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling по значимым токенам, как у Pooling из sentence-transformers
+        mask = attention_mask[..., np.newaxis].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.normalize:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+        return embeddings.astype(np.float32)
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        encodings = self._counter.encode_batch(texts, add_special_tokens=False)
+        return [len(encoding.ids) for encoding in encodings]
+
+
+def load_backend(
+    name: str,
+    model_name: str,
+    onnx_path: str = "data/models/onnx",
+    onnx_quantized: bool = True,
+    onnx_threads: int = 0
+):
+    """Создаёт бэкенд эмбеддингов по имени из конфигурации."""
+    if name == TorchBackend.name:
+        return TorchBackend(model_name)
+    if name == OnnxBackend.name:
+        return OnnxBackend(
+            onnx_path, model_name=model_name, quantized=onnx_quantized, threads=onnx_threads
+        )
+    raise ValueError(f"Unknown embedding backend: {name}")
+
+
+def cosine_parity(reference: np.ndarray, candidate: np.ndarray) -> Tuple[float, float]:
+    """Минимальное и среднее косинусное сходство соответствующих векторов."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    similarity = np.sum(reference * candidate, axis=1)
+    return float(similarity.min()), float(similarity.mean())
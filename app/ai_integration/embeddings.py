@@ -1,44 +1,89 @@
 from typing import List, Union, Optional
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import torch
 import asyncio
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import config
+from app.ai_integration.cache import TieredCache, cache_key
+from app.ai_integration.embedding_backends import TorchBackend, load_backend
+from app.ai_integration.micro_batcher import MicroBatcher
 
 
 class EmbeddingService:
     """Сервис для генерации эмбеддингов текста."""
     
-    def __init__(self, model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"):
-        self.model_name = model_name
-        self.model: Optional[SentenceTransformer] = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __init__(self, model_name: Optional[str] = None, backend: Optional[str] = None):
+        self.model_name = model_name or config.embedding.model_name
+        self.backend_name = backend or config.embedding.backend
+        self.model = None
+        self.device = "cpu"
         self._load_model()
+        
+        # Все прямые проходы модели выполняются в одном выделенном потоке:
+        # модель сама распараллеливает вычисления внутри пачки
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._batcher = MicroBatcher(
+            self._encode_texts,
+            max_batch_size=config.embedding.max_batch_size,
+            max_wait=config.embedding.max_wait_ms / 1000,
+            executor=self._executor
+        )
+        
+        # Кеш эмбеддингов запросов, общий для процессов бота через Redis
+        self._cache = TieredCache(
+            "embedding",
+            max_size=config.embedding.cache_size,
+            ttl=config.embedding.cache_ttl,
+            redis_url=config.redis.url if config.embedding.cache_redis else None
+        )
     
     def _load_model(self) -> None:
         """Загружает модель для создания эмбеддингов."""
         try:
-            self.model = SentenceTransformer(self.model_name, device=self.device)
-            print(f"Loaded embedding model: {self.model_name} on {self.device}")
+            self.model = load_backend(
+                self.backend_name,
+                self.model_name,
+                onnx_path=config.embedding.onnx_path,
+                onnx_quantized=config.embedding.onnx_quantized,
+                onnx_threads=config.embedding.onnx_threads
+            )
         except Exception as e:
-            print(f"Error loading model: {e}")
-            # Fallback к базовой модели
-            self.model = SentenceTransformer('all-MiniLM-L6-v2', device=self.device)
-            print("Loaded fallback model: all-MiniLM-L6-v2")
+            print(f"Error loading {self.backend_name} backend: {e}")
+            try:
+                # Fallback к той же модели на PyTorch
+                self.model = TorchBackend(self.model_name)
+            except Exception as e:
+                print(f"Error loading model: {e}")
+                # Fallback к базовой модели
+                self.model = TorchBackend('all-MiniLM-L6-v2')
+                self.model_name = 'all-MiniLM-L6-v2'
+                print("Loaded fallback model: all-MiniLM-L6-v2")
+        
+        self.device = self.model.device
+        print(f"Loaded embedding model: {self.model.model_name} ({self.model.name}) on {self.device}")
+    
+    @property
+    def model_id(self) -> str:
+        """Идентификатор модели и бэкенда: эмбеддинги бэкендов слегка различаются."""
+        variant = self.model.name
+        if getattr(self.model, 'quantized', False):
+            variant += "-int8"
+        return f"{self.model.model_name}:{variant}"
+    
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Синхронно кодирует пачку текстов."""
+        return self.model.encode(texts)
     
     async def encode(self, text: str) -> np.ndarray:
-        """Создает эмбеддинг для одного текста."""
+        """Создает эмбеддинг для одного текста.
+        
+        Конкурентные вызовы объединяются в общую пачку и кодируются
+        одним проходом модели.
+        """
         if not self.model:
             raise RuntimeError("Model not loaded")
         
-        # Выполняем в отдельном потоке для неблокирующего выполнения
-        loop = asyncio.get_event_loop()
-        embedding = await loop.run_in_executor(
-            None, 
-            lambda: self.model.encode(text, convert_to_numpy=True)
-        )
-        
-        return embedding
+        return await self._batcher.submit(text)
     
     async def encode_batch(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
         """Создает эмбеддинги для списка текстов."""
@@ -48,28 +93,35 @@ class EmbeddingService:
         if not texts:
             return np.array([])
         
-        # Выполняем в отдельном потоке для неблокирующего выполнения
-        loop = asyncio.get_event_loop()
+        # Выполняем в потоке модели для неблокирующего выполнения
+        loop = asyncio.get_running_loop()
         
-        # Обрабатываем батчами для экономии памяти
+        # Обрабатываем батчами для экономии памяти; между батчами
+        # успевают пройти пользовательские запросы
         embeddings = []
         for i in range(0, len(texts), batch_size):
             batch = texts[i:i + batch_size]
             batch_embeddings = await loop.run_in_executor(
-                None,
-                lambda: self.model.encode(batch, convert_to_numpy=True, show_progress_bar=False)
+                self._executor, self._encode_texts, batch
             )
             embeddings.append(batch_embeddings)
         
         return np.vstack(embeddings)
     
-    @lru_cache(maxsize=1000)
-    def encode_cached(self, text: str) -> np.ndarray:
-        """Создает эмбеддинг с кешированием для часто используемых текстов."""
-        if not self.model:
-            raise RuntimeError("Model not loaded")
-        
-        return self.model.encode(text, convert_to_numpy=True)
+    async def encode_cached(self, text: str) -> np.ndarray:
+        """Создает эмбеддинг с кешированием для часто используемых текстов.
+        
+        Ключ строится по нормализованному тексту и имени модели, значение
+        хранится как байты float32.
+        """
+        key = cache_key(self.model_id, text)
+        cached = await self._cache.get(key)
+        if cached is not None:
+            return np.frombuffer(cached, dtype=np.float32)
+        
+        embedding = await self.encode(text)
+        await self._cache.set(key, embedding.astype(np.float32).tobytes())
+        return embedding
     
     async def similarity(self, text1: str, text2: str) -> float:
         """Вычисляет косинусное сходство между двумя текстами."""
@@ -109,17 +161,28 @@ class EmbeddingService:
         
         return results
     
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Считает длину текстов в токенах модели (без служебных токенов)."""
+        if not self.model:
+            raise RuntimeError("Model not loaded")
+        
+        if not texts:
+            return []
+        
+        return self.model.count_tokens(texts)
+    
     def get_embedding_dimension(self) -> int:
         """Возвращает размерность эмбеддингов."""
         if not self.model:
             raise RuntimeError("Model not loaded")
         
-        return self.model.get_sentence_embedding_dimension()
+        return self.model.dimension
     
     def get_model_info(self) -> dict:
         """Возвращает информацию о модели."""
         return {
-            'model_name': self.model_name,
+            'model_name': self.model.model_name if self.model else self.model_name,
+            'backend': self.model.name if self.model else None,
             'device': self.device,
             'dimension': self.get_embedding_dimension() if self.model else None,
             'max_seq_length': self.model.max_seq_length if self.model else None
@@ -180,7 +243,13 @@ class EmbeddingService:
         
         return results[:top_k]
     
+    async def close(self) -> None:
+        """Останавливает обработку запросов и освобождает поток модели."""
+        await self._batcher.close()
+        await self._cache.close()
+        self._executor.shutdown(wait=False)
+    
     def clear_cache(self) -> None:
-        """Очищает кеш эмбеддингов."""
-        self.encode_cached.cache_clear()
+        """Очищает локальный кеш эмбеддингов."""
+        self._cache.local.clear()
         print("Cleared embedding cache")
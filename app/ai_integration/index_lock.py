@@ -0,0 +1,118 @@
+"""Межпроцессная блокировка записи в каталог векторного индекса.
+
+Индекс, сегменты, лексический индекс и манифест обновляются и ботом
+(синхронизация при запуске), и скриптом ночной переиндексации. Запись
+выполняется только под исключительной файловой блокировкой ``index.lock``,
+иначе процессы перезаписывают результаты друг друга.
+"""
+import asyncio
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator, Optional
+
+# Интервал повторных попыток на платформах без блокирующего ожидания
+POLL_INTERVAL = 0.5
+
+
+class IndexLockedError(Exception):
+    """Каталог индекса заблокирован другим процессом."""
+
+
+class IndexLock:
+    """Исключительная блокировка файла: ``flock`` в POSIX, ``msvcrt.locking`` в Windows.
+
+    Внутри процесса захваты упорядочиваются ``asyncio.Lock``, между
+    процессами — блокировкой файла. Повторный захват тем же владельцем
+    не поддерживается.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file: Optional[IO[bytes]] = None
+        self._local = asyncio.Lock()
+
+    async def acquire(self, wait: bool = True) -> None:
+        """Захватывает блокировку; без ``wait`` сразу бросает ``IndexLockedError``."""
+        if not wait and self._local.locked():
+            raise IndexLockedError(f"{self.path} is locked")
+
+        await self._local.acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            self._file = await loop.run_in_executor(None, self._lock_file, wait)
+        except BaseException:
+            self._local.release()
+            raise
+
+    def release(self) -> None:
+        """Освобождает блокировку."""
+        if self._file is not None:
+            self._unlock_file(self._file)
+            self._file = None
+        self._local.release()
+
+    @contextmanager
+    def hold(self, wait: bool = True) -> Iterator[bool]:
+        """Синхронно захватывает только файловую блокировку — для кода вне event loop.
+
+        Отдаёт ``False``, если без ``wait`` каталог заблокирован другим
+        процессом. Используется при загрузке хранилища, пока оно ещё
+        недоступно корутинам: внутри процесса захваты не упорядочиваются.
+        """
+        try:
+            f = self._lock_file(wait)
+        except IndexLockedError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self._unlock_file(f)
+
+    async def __aenter__(self) -> "IndexLock":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+    def _lock_file(self, wait: bool) -> IO[bytes]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, "a+b")
+        try:
+            while True:
+                try:
+                    self._try_lock(f, wait)
+                    return f
+                except OSError:
+                    if not wait:
+                        raise IndexLockedError(f"{self.path} is locked by another process")
+                    time.sleep(POLL_INTERVAL)
+        except BaseException:
+            f.close()
+            raise
+
+    @staticmethod
+    def _try_lock(f: IO[bytes], wait: bool) -> None:
+        if sys.platform.startswith("win"):
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    @staticmethod
+    def _unlock_file(f: IO[bytes]) -> None:
+        try:
+            if sys.platform.startswith("win"):
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            f.close()
@@ -0,0 +1,413 @@
+"""Конвейер индексации документов СРО.
+
+Текст извлекается в пуле процессов подключаемыми извлекателями (PDF, DOCX,
+DOC) и передаётся в основной процесс пачками страниц по мере извлечения.
+Фрагменты со всех файлов собираются в общие пачки для расчёта эмбеддингов,
+а индекс сохраняется на диск один раз в конце прогона.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from queue import Empty
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.ai_integration.chunker import Chunk, ChunkStream
+from app.ai_integration.document_processor import DocumentProcessor
+from app.utils.helpers import file_sha256
+
+if TYPE_CHECKING:
+    from app.ai_integration.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Реестр извлекателей текста: расширение файла -> генератор страниц
+EXTRACTORS: Dict[str, Callable[[Path], Iterator[str]]] = {}
+
+# Ограничение времени на конвертацию одного .doc файла, секунд
+DOC_CONVERT_TIMEOUT = 120
+
+# Сколько страниц дочерний процесс передаёт за одно сообщение
+PAGES_PER_MESSAGE = 8
+
+# Ёмкость очереди страниц: при заполнении извлечение ждёт расчёта эмбеддингов
+QUEUE_MAX_MESSAGES = 32
+
+# Период проверки состояния пула процессов при пустой очереди, секунд
+QUEUE_POLL_INTERVAL = 1.0
+
+# Типы сообщений дочерних процессов
+EXTRACT_PAGES = "pages"
+EXTRACT_DONE = "done"
+EXTRACT_FAILED = "failed"
+
+# Очередь страниц дочернего процесса (задаётся при его запуске)
+_page_queue = None
+
+
+def register_extractor(*suffixes: str) -> Callable:
+    """Регистрирует генератор страниц для расширений файлов.
+
+    Функция должна быть определена на уровне модуля: она выполняется
+    в дочернем процессе.
+    """
+    def decorator(func: Callable[[Path], Iterator[str]]) -> Callable[[Path], Iterator[str]]:
+        for suffix in suffixes:
+            EXTRACTORS[suffix.lower()] = func
+        return func
+    return decorator
+
+
+@register_extractor(".pdf")
+def extract_pdf(path: Path) -> Iterator[str]:
+    """Извлекает текст PDF постранично."""
+    return DocumentProcessor.iter_pages(path)
+
+
+@register_extractor(".docx")
+def extract_docx(path: Path) -> Iterator[str]:
+    """Извлекает текст DOCX: абзацы и ячейки таблиц.
+
+    Формат не хранит разбиение на страницы, поэтому документ — одна страница.
+    """
+    import docx
+
+    document = docx.Document(str(path))
+    lines = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            lines.append(" | ".join(cell.text.strip() for cell in row.cells))
+
+    yield "\n".join(line for line in lines if line.strip())
+
+
+@register_extractor(".doc")
+def extract_doc(path: Path) -> Iterator[str]:
+    """Извлекает текст старого формата DOC локальным конвертером.
+
+    Используется ``antiword``, а при его отсутствии — LibreOffice в режиме
+    headless.
+    """
+    if shutil.which("antiword"):
+        result = subprocess.run(
+            ["antiword", "-m", "UTF-8.txt", "-w", "0", str(path)],
+            capture_output=True,
+            check=True,
+            timeout=DOC_CONVERT_TIMEOUT
+        )
+        yield result.stdout.decode("utf-8", errors="replace")
+        return
+
+    soffice = shutil.which("soffice") or shutil.which("libreoffice")
+    if soffice:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Отдельный профиль: параллельные экземпляры LibreOffice
+            # с общим профилем блокируют друг друга
+            subprocess.run(
+                [
+                    soffice,
+                    f"-env:UserInstallation=file://{tmp_dir}/profile",
+                    "--headless",
+                    "--convert-to", "txt:Text (encoded):UTF8",
+                    "--outdir", tmp_dir,
+                    str(path)
+                ],
+                capture_output=True,
+                check=True,
+                timeout=DOC_CONVERT_TIMEOUT
+            )
+            converted = Path(tmp_dir) / f"{path.stem}.txt"
+            yield converted.read_text(encoding="utf-8", errors="replace")
+            return
+
+    raise RuntimeError("Не найден конвертер .doc (antiword или LibreOffice)")
+
+
+def _init_worker(page_queue) -> None:
+    """Запоминает очередь страниц в дочернем процессе."""
+    global _page_queue
+    _page_queue = page_queue
+
+
+def _extract_file(path: str) -> None:
+    """Извлекает текст файла в дочернем процессе.
+
+    Страницы отправляются в очередь пачками по мере извлечения, в конце —
+    сообщение о завершении или текст ошибки.
+    """
+    file_path = Path(path)
+    try:
+        extractor = EXTRACTORS[file_path.suffix.lower()]
+        batch: List[str] = []
+        for page in extractor(file_path):
+            batch.append(page)
+            if len(batch) >= PAGES_PER_MESSAGE:
+                _page_queue.put((EXTRACT_PAGES, path, batch))
+                batch = []
+        if batch:
+            _page_queue.put((EXTRACT_PAGES, path, batch))
+        _page_queue.put((EXTRACT_DONE, path, None))
+    except Exception as e:
+        _page_queue.put((EXTRACT_FAILED, path, f"{type(e).__name__}: {e}"))
+
+
+@dataclass
+class IngestionStats:
+    """Статистика прогона индексации."""
+    files: int = 0
+    failed: int = 0
+    skipped: int = 0
+    deleted: int = 0
+    pages: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        """Краткое описание прогона для логов."""
+        return (
+            f"{self.files} files ({self.failed} failed, {self.skipped} unchanged, "
+            f"{self.deleted} removed), {self.pages} pages, "
+            f"{self.chunks} chunks in {self.elapsed:.1f}s: "
+            f"{self.pages_per_second:.1f} pages/s, {self.chunks_per_second:.1f} chunks/s"
+        )
+
+
+class IngestionPipeline:
+    """Параллельная индексация документов в векторное хранилище."""
+
+    def __init__(
+        self,
+        vector_store: "VectorStore",
+        document_processor: Optional[DocumentProcessor] = None,
+        max_workers: Optional[int] = None,
+        embed_batch_size: int = 256
+    ):
+        self.vector_store = vector_store
+        self.document_processor = document_processor or DocumentProcessor()
+        self.max_workers = max_workers or None
+        self.embed_batch_size = embed_batch_size
+
+    @staticmethod
+    def discover(root: Path) -> List[Path]:
+        """Находит в каталоге все файлы поддерживаемых форматов."""
+        return sorted(
+            path for path in Path(root).rglob("*")
+            if path.is_file() and path.suffix.lower() in EXTRACTORS
+        )
+
+    async def sync(
+        self,
+        root: Path,
+        documents: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> IngestionStats:
+        """Инкрементально синхронизирует индекс с каталогом документов.
+
+        Файлы сравниваются с манифестом хранилища по SHA-256: неизменённые
+        пропускаются, изменённые переиндексируются, а фрагменты удалённых
+        файлов удаляются из индекса. ``documents`` — поля записей ``Document``
+        по путям файлов; у неизменённых файлов они обновляются в манифесте
+        без переиндексации.
+        """
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+
+        paths = self.discover(root)
+        hashes = dict(zip(
+            (str(path) for path in paths),
+            await asyncio.gather(*(
+                loop.run_in_executor(None, file_sha256, path) for path in paths
+            ))
+        ))
+
+        # Разделитель платформы: в Windows пути источников записаны через обратную косую черту
+        root_prefix = os.path.join(str(Path(root)), "")
+        deleted = 0
+        for source in list(self.vector_store.manifest):
+            if source.startswith(root_prefix) and source not in hashes:
+                await self.vector_store.delete_documents_by_source(source, commit=False)
+                deleted += 1
+
+        changed = []
+        for path in paths:
+            source = str(path)
+            stored_hash = self.vector_store.get_source_hash(source)
+            if stored_hash == hashes[source]:
+                document = (documents or {}).get(source) or {}
+                if documents is not None and document != (self.vector_store.get_source_document(source) or {}):
+                    self.vector_store.set_source_document(source, document)
+                continue
+            if source in self.vector_store.manifest:
+                # Изменённый файл: старые фрагменты удаляются перед переиндексацией
+                await self.vector_store.delete_documents_by_source(source, commit=False)
+            changed.append(path)
+
+        stats = await self.run(changed, hashes=hashes, documents=documents)
+        stats.skipped = len(paths) - len(changed)
+        stats.deleted = deleted
+        stats.elapsed = time.perf_counter() - started
+
+        logger.info(f"Sync finished: {stats.summary()}")
+        return stats
+
+    async def run(
+        self,
+        paths: List[Path],
+        hashes: Optional[Dict[str, str]] = None,
+        documents: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> IngestionStats:
+        """Индексирует файлы и сохраняет индекс один раз в конце.
+
+        Страницы разбиваются на фрагменты по мере поступления из дочерних
+        процессов, поэтому в памяти одновременно находится лишь ограниченное
+        число страниц даже для документов на сотни страниц. Если переданы
+        хэши файлов, они сохраняются в манифест хранилища для последующей
+        инкрементальной синхронизации. Поля документа из ``documents``
+        добавляются в метаданные фрагментов файла и в манифест.
+        """
+        stats = IngestionStats()
+        documents = documents or {}
+        if not paths:
+            self.vector_store.save()
+            return stats
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+
+        texts: List[str] = []
+        metadata: List[Dict[str, Any]] = []
+        streams: Dict[str, ChunkStream] = {}
+
+        # spawn: дочерние процессы не наследуют потоки torch/FAISS родителя
+        context = multiprocessing.get_context("spawn")
+        page_queue = context.Queue(maxsize=QUEUE_MAX_MESSAGES)
+
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(page_queue,)
+        ) as executor:
+            futures = {
+                str(path): loop.run_in_executor(executor, _extract_file, str(path))
+                for path in paths
+            }
+            pending = set(futures)
+
+            # Пока идёт расчёт эмбеддингов, процессы продолжают извлечение
+            while pending:
+                kind, source, payload = await self._next_message(page_queue, futures, pending)
+
+                if kind == EXTRACT_PAGES:
+                    stream = streams.setdefault(source, self.document_processor.chunk_stream())
+                    stats.pages += len(payload)
+                    for page in payload:
+                        self._collect(source, stream.feed(page), texts, metadata, documents.get(source))
+
+                elif kind == EXTRACT_DONE:
+                    pending.discard(source)
+                    stats.files += 1
+                    stream = streams.pop(source, None)
+                    if stream:
+                        self._collect(source, stream.finish(), texts, metadata, documents.get(source))
+                    if hashes and source in hashes:
+                        self.vector_store.set_source_hash(source, hashes[source])
+                    if source in documents:
+                        self.vector_store.set_source_document(source, documents[source])
+
+                else:
+                    pending.discard(source)
+                    stats.files += 1
+                    stats.failed += 1
+                    streams.pop(source, None)
+                    logger.error(f"Error processing {source}: {payload}")
+                    await self._discard(source, texts, metadata)
+
+                if len(texts) >= self.embed_batch_size:
+                    stats.chunks += await self._embed(texts, metadata)
+                    texts, metadata = [], []
+
+        page_queue.close()
+
+        stats.chunks += await self._embed(texts, metadata)
+        self.vector_store.save()
+
+        if self.vector_store.needs_retrain:
+            logger.info("Vector index outgrew its training set, retraining")
+            await self.vector_store.retrain()
+
+        stats.elapsed = time.perf_counter() - started
+        logger.info(f"Ingestion finished: {stats.summary()}")
+        return stats
+
+    @staticmethod
+    async def _next_message(
+        page_queue,
+        futures: Dict[str, "asyncio.Future"],
+        pending: Set[str]
+    ) -> Tuple[str, str, Any]:
+        """Ожидает сообщение дочернего процесса, не блокируя event loop.
+
+        Если процесс пула аварийно завершился и не успел сообщить об ошибке,
+        файл считается необработанным.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                return await loop.run_in_executor(
+                    None, page_queue.get, True, QUEUE_POLL_INTERVAL
+                )
+            except Empty:
+                for source in pending:
+                    future = futures[source]
+                    if future.done() and future.exception() is not None:
+                        error = future.exception()
+                        return EXTRACT_FAILED, source, f"{type(error).__name__}: {error}"
+
+    @staticmethod
+    def _collect(
+        source: str,
+        chunks: List[Chunk],
+        texts: List[str],
+        metadata: List[Dict[str, Any]],
+        document: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Добавляет фрагменты файла в текущую пачку."""
+        for chunk in chunks:
+            texts.append(chunk.text)
+            metadata.append({"source": source, **(document or {}), **chunk.metadata})
+
+    async def _discard(
+        self,
+        source: str,
+        texts: List[str],
+        metadata: List[Dict[str, Any]]
+    ) -> None:
+        """Убирает фрагменты файла, извлечение которого прервалось с ошибкой."""
+        keep = [i for i, meta in enumerate(metadata) if meta["source"] != source]
+        texts[:] = [texts[i] for i in keep]
+        metadata[:] = [metadata[i] for i in keep]
+
+        if source in self.vector_store.manifest:
+            await self.vector_store.delete_documents_by_source(source, commit=False)
+
+    async def _embed(self, texts: List[str], metadata: List[Dict[str, Any]]) -> int:
+        """Рассчитывает эмбеддинги пачки фрагментов и добавляет их в хранилище."""
+        if not texts:
+            return 0
+        await self.vector_store.add_documents(texts, metadata, commit=False)
+        return len(texts)
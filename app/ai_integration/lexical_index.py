@@ -0,0 +1,328 @@
+"""Лексический (BM25) индекс фрагментов документов.
+
+Дополняет векторный поиск там, где важны точные совпадения: номера статей
+и пунктов, ИНН и ОГРН, аббревиатуры (НОСТРОЙ, СОУТ). Слова приводятся
+к основе стеммером Snowball для русского языка, числа индексируются
+как есть.
+
+Индекс хранится в ``lexical_index.npz`` в формате CSR: словарь терминов,
+смещения списков вхождений по терминам и плоские массивы идентификаторов
+фрагментов и частот. Новые фрагменты копятся в памяти и вливаются
+в массивы при сохранении; удалённые фрагменты отбрасываются при поиске
+и вычищаются при следующем сохранении.
+"""
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import snowballstemmer
+
+# Числа с разделителями (55.8, 01.09.2024, 3/2) и слова
+_TOKEN_RE = re.compile(r"\d+(?:[./\-]\d+)*|[^\W\d_]+")
+
+STOP_WORDS = frozenset("""
+а без более бы был была были было быть в вам вас весь во вот все всех вы где
+да для до его ее если есть еще же за и из или им их к как ко когда кто ли либо
+мне может мы на над не него нее нет ни них но ну о об однако он она они оно от
+по под при с со так также такой там те тем то того тоже той только том ты у уже
+хотя чем что чтобы эта эти это этого этой этом я
+""".split())
+
+
+class Tokenizer:
+    """Разбивает текст на термины для лексического индекса."""
+
+    def __init__(self):
+        self._stemmer = snowballstemmer.stemmer("russian")
+        self._cache: Dict[str, str] = {}
+
+    def tokenize(self, text: str) -> List[str]:
+        terms = []
+        for token in _TOKEN_RE.findall(text):
+            if token[0].isdigit():
+                terms.append(token)
+                continue
+
+            word = token.lower().replace("ё", "е")
+            if len(word) < 2 or word in STOP_WORDS:
+                continue
+            terms.append(self._stem(word))
+        return terms
+
+    def _stem(self, word: str) -> str:
+        stem = self._cache.get(word)
+        if stem is None:
+            stem = self._stemmer.stemWord(word)
+            self._cache[word] = stem
+        return stem
+
+
+class LexicalIndex:
+    """Инвертированный индекс с ранжированием BM25.
+
+    Обновляется вместе с ``VectorStore``: ``add`` при добавлении фрагментов,
+    ``remove`` при удалении, ``save`` при фиксации индекса на диске.
+    """
+
+    INDEX_FILE = "lexical_index.npz"
+
+    def __init__(self, index_path: Path, k1: float = 1.2, b: float = 0.75):
+        self.index_file = Path(index_path) / self.INDEX_FILE
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = Tokenizer()
+
+        self._load()
+
+    def _reset(self) -> None:
+        # Влитая часть индекса (CSR); ``_vocabulary`` — термины по номерам
+        self._terms: Dict[str, int] = {}
+        self._vocabulary: List[str] = []
+        self._term_offsets = np.zeros(1, dtype='int64')
+        self._postings = np.empty(0, dtype='int64')
+        self._frequencies = np.empty(0, dtype='uint16')
+        self._doc_ids = np.empty(0, dtype='int64')
+        self._doc_lengths = np.empty(0, dtype='uint32')
+
+        # Фрагменты, добавленные после последнего сохранения
+        self._pending: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._pending_lengths: Dict[int, int] = {}
+        self._removed: Set[int] = set()
+
+        self._total_length = 0
+        self.next_id = 0
+
+    def _load(self) -> None:
+        """Загружает индекс из файла."""
+        self._reset()
+        if not self.index_file.exists():
+            return
+
+        try:
+            with np.load(self.index_file) as data:
+                vocabulary = data["vocabulary"].tobytes().decode("utf-8")
+                self._vocabulary = vocabulary.split("\n") if vocabulary else []
+                self._terms = {term: i for i, term in enumerate(self._vocabulary)}
+                self._term_offsets = data["term_offsets"]
+                self._postings = data["postings"]
+                self._frequencies = data["frequencies"]
+                self._doc_ids = data["doc_ids"]
+                self._doc_lengths = data["doc_lengths"]
+                self.next_id = int(data["next_id"])
+            self._total_length = int(self._doc_lengths.sum())
+        except Exception as e:
+            print(f"Error loading lexical index: {e}")
+            self._reset()
+
+    def __len__(self) -> int:
+        return len(self._doc_ids) + len(self._pending_lengths) - len(self._removed)
+
+    @property
+    def is_dirty(self) -> bool:
+        """Есть изменения, не сохранённые на диск."""
+        return bool(self._pending_lengths or self._removed)
+
+    def add(self, records: Iterable[Tuple[int, str]]) -> None:
+        """Индексирует фрагменты ``(chunk_id, text)`` с возрастающими идентификаторами."""
+        for chunk_id, text in records:
+            if chunk_id in self._removed:
+                # Хранилища, созданные до сохранения границы идентификаторов,
+                # после компактизации выдавали их заново — старые вхождения
+                # нужно вычистить
+                self._merge()
+
+            terms = self.tokenizer.tokenize(text)
+            for term, frequency in Counter(terms).items():
+                self._pending[term].append((chunk_id, min(frequency, 65535)))
+            self._pending_lengths[chunk_id] = len(terms)
+            self._total_length += len(terms)
+            self.next_id = max(self.next_id, chunk_id + 1)
+
+    def remove(self, chunk_ids: Iterable[int]) -> None:
+        """Исключает фрагменты из поиска."""
+        for chunk_id in chunk_ids:
+            if chunk_id in self._removed:
+                continue
+            length = self._pending_lengths.get(chunk_id)
+            if length is None:
+                pos = int(np.searchsorted(self._doc_ids, chunk_id))
+                if pos >= len(self._doc_ids) or self._doc_ids[pos] != chunk_id:
+                    continue
+                length = int(self._doc_lengths[pos])
+            self._removed.add(chunk_id)
+            self._total_length -= length
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Возвращает до ``top_k`` пар ``(chunk_id, score)`` по убыванию BM25.
+
+        ``allowed`` — битовая карта допустимых идентификаторов: остальные
+        фрагменты отбрасываются до подсчёта оценок.
+        """
+        doc_count = len(self)
+        if not doc_count:
+            return []
+        average_length = max(self._total_length / doc_count, 1.0)
+
+        removed = np.fromiter(self._removed, dtype='int64') if self._removed else None
+        ids_parts = []
+        score_parts = []
+        for term in set(self.tokenizer.tokenize(query)):
+            ids, frequencies, lengths = self._term_postings(term)
+            if removed is not None and len(ids):
+                live = ~np.isin(ids, removed)
+                ids, frequencies, lengths = ids[live], frequencies[live], lengths[live]
+            # IDF считается по всему корпусу, чтобы оценки не зависели от фильтра
+            idf = np.log(1 + (doc_count - len(ids) + 0.5) / (len(ids) + 0.5))
+            if allowed is not None and len(ids):
+                keep = ids < len(allowed)
+                keep[keep] = allowed[ids[keep]]
+                ids, frequencies, lengths = ids[keep], frequencies[keep], lengths[keep]
+            if not len(ids):
+                continue
+
+            norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+            ids_parts.append(ids)
+            score_parts.append(idf * frequencies * (self.k1 + 1) / (frequencies + norm))
+
+        if not ids_parts:
+            return []
+
+        unique_ids, inverse = np.unique(np.concatenate(ids_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(unique_ids[i]), float(scores[i])) for i in top]
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Идентификаторы фрагментов, частоты термина и длины фрагментов."""
+        ids = np.empty(0, dtype='int64')
+        frequencies = np.empty(0, dtype='float64')
+        lengths = np.empty(0, dtype='float64')
+
+        term_id = self._terms.get(term)
+        if term_id is not None:
+            start, end = self._term_offsets[term_id], self._term_offsets[term_id + 1]
+            ids = self._postings[start:end]
+            frequencies = self._frequencies[start:end].astype('float64')
+            lengths = self._doc_lengths[np.searchsorted(self._doc_ids, ids)].astype('float64')
+
+        pending = self._pending.get(term)
+        if pending:
+            pending_ids = np.fromiter((chunk_id for chunk_id, _ in pending), dtype='int64')
+            ids = np.concatenate([ids, pending_ids])
+            frequencies = np.concatenate([
+                frequencies, np.fromiter((tf for _, tf in pending), dtype='float64')
+            ])
+            lengths = np.concatenate([
+                lengths,
+                np.fromiter((self._pending_lengths[chunk_id] for chunk_id, _ in pending), dtype='float64')
+            ])
+
+        return ids, frequencies, lengths
+
+    def save(self) -> None:
+        """Вливает новые фрагменты в массивы индекса и атомарно сохраняет его."""
+        if self.is_dirty:
+            self._merge()
+
+        tmp_file = self.index_file.with_name(self.INDEX_FILE + ".tmp")
+        vocabulary = "\n".join(self._vocabulary).encode("utf-8")
+        with open(tmp_file, "wb") as f:
+            np.savez(
+                f,
+                vocabulary=np.frombuffer(vocabulary, dtype='uint8'),
+                term_offsets=self._term_offsets,
+                postings=self._postings,
+                frequencies=self._frequencies,
+                doc_ids=self._doc_ids,
+                doc_lengths=self._doc_lengths,
+                next_id=np.int64(self.next_id)
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.index_file)
+
+    def _merge(self) -> None:
+        """Вливает новые фрагменты в CSR-массивы и вычищает удалённые.
+
+        Python-цикл идёт только по терминам новых фрагментов; вхождения
+        всего корпуса объединяются и упорядочиваются по номеру термина
+        операциями numpy.
+        """
+        removed = np.fromiter(self._removed, dtype='int64') if self._removed else None
+
+        # Номер термина для каждого вхождения влитой части
+        term_ids = np.repeat(
+            np.arange(len(self._vocabulary), dtype='int64'), np.diff(self._term_offsets)
+        )
+        postings = self._postings
+        frequencies = self._frequencies
+
+        if self._pending:
+            new_terms, new_postings, new_frequencies = [], [], []
+            for term, entries in self._pending.items():
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    term_id = len(self._vocabulary)
+                    self._terms[term] = term_id
+                    self._vocabulary.append(term)
+                entries = np.asarray(entries, dtype='int64')
+                new_terms.append(np.full(len(entries), term_id, dtype='int64'))
+                new_postings.append(entries[:, 0])
+                new_frequencies.append(entries[:, 1].astype('uint16'))
+            term_ids = np.concatenate([term_ids] + new_terms)
+            postings = np.concatenate([postings] + new_postings)
+            frequencies = np.concatenate([frequencies] + new_frequencies)
+
+        doc_ids = np.concatenate([
+            self._doc_ids, np.fromiter(self._pending_lengths, dtype='int64')
+        ])
+        doc_lengths = np.concatenate([
+            self._doc_lengths, np.fromiter(self._pending_lengths.values(), dtype='uint32')
+        ])
+
+        if removed is not None:
+            live = ~np.isin(doc_ids, removed)
+            doc_ids, doc_lengths = doc_ids[live], doc_lengths[live]
+            live = ~np.isin(postings, removed)
+            term_ids, postings, frequencies = term_ids[live], postings[live], frequencies[live]
+
+        # Устойчивая сортировка сохраняет порядок вхождений внутри термина
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, postings, frequencies = term_ids[order], postings[order], frequencies[order]
+        counts = np.bincount(term_ids, minlength=len(self._vocabulary))
+
+        if removed is not None and not counts.all():
+            # Термины, оставшиеся без вхождений, убираются из словаря
+            keep = counts > 0
+            self._vocabulary = [term for term, kept in zip(self._vocabulary, keep) if kept]
+            self._terms = {term: i for i, term in enumerate(self._vocabulary)}
+            counts = counts[keep]
+
+        order = np.argsort(doc_ids, kind="stable")
+        self._term_offsets = np.concatenate([[0], np.cumsum(counts)]).astype('int64')
+        self._postings = postings
+        self._frequencies = frequencies
+        self._doc_ids = doc_ids[order]
+        self._doc_lengths = doc_lengths[order]
+        self._pending = defaultdict(list)
+        self._pending_lengths = {}
+        self._removed = set()
+        self._total_length = int(self._doc_lengths.sum())
+
+    def clear(self) -> None:
+        """Очищает индекс."""
+        self._reset()
+        self.save()
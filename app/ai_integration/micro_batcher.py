@@ -0,0 +1,112 @@
+"""Динамическое объединение одиночных запросов в пачки (micro-batching)."""
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Объединяет конкурентные вызовы в пачки для одной функции обработки.
+
+    Первый запрос пачки ждёт не дольше ``max_wait`` секунд, пока подойдут
+    другие, либо пока пачка не наберёт ``max_batch_size`` элементов. Пачка
+    обрабатывается в переданном исполнителе; пока он занят, новые запросы
+    копятся в очереди и уходят следующей пачкой без дополнительного ожидания.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        executor: Optional[Executor] = None
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Набираемая или обрабатываемая пачка: её запросы уже сняты с очереди
+        self._batch: List[Tuple[Any, asyncio.Future]] = []
+
+    async def submit(self, item: Any) -> Any:
+        """Ставит элемент в очередь и возвращает результат его обработки."""
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    def _ensure_started(self) -> None:
+        """Запускает обработчик очереди в текущем event loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            self._batch = []
+            await self._collect(self._batch)
+            batch = [(item, future) for item, future in self._batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                results = await self._loop.run_in_executor(
+                    self.executor, self.process_batch, [item for item, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Batch processing failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def _collect(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        """Набирает пачку в ``batch``: ждёт первый запрос, затем добирает до лимита или таймаута."""
+        batch.append(await self._queue.get())
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def close(self) -> None:
+        """Останавливает обработчик и отменяет ожидающие запросы."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for _, future in self._batch:
+            future.cancel()
+        self._batch = []
+
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                future.cancel()
@@ -0,0 +1,271 @@
+"""Сборка запроса к модели в пределах бюджета токенов.
+
+Бюджет ``max_prompt_tokens`` делится между обязательными частями (системный
+промпт и вопрос), найденными фрагментами документов и историей диалога.
+Порядок сообщений детерминирован и рассчитан на кеширование префикса
+запроса на стороне API: статический системный промпт, фрагменты документов
+в порядке их идентификаторов, резюме и реплики диалога, вопрос. Одинаковые
+фрагменты в разных запросах дают побайтно одинаковое начало запроса.
+
+Фрагменты важнее истории: история получает не больше ``history_share``
+оставшегося бюджета плюс то, что не понадобилось фрагментам; последние
+реплики важнее резюме ранней части диалога. Повторы
+и перекрытия соседних фрагментов удаляются до подсчёта бюджета.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.monitoring.metrics import PROMPT_TOKENS
+
+# Средняя длина токена DeepSeek в символах для русского текста
+CHARS_PER_TOKEN = 3
+
+# Служебные токены разметки на одно сообщение
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Минимальный остаток бюджета, ради которого фрагмент или реплика обрезается
+MIN_PART_TOKENS = 40
+
+# Минимальное перекрытие соседних фрагментов в словах
+MIN_OVERLAP_WORDS = 3
+
+CONTEXT_HEADER = "Информация из документов СРО:\n"
+SUMMARY_HEADER = "Краткое содержание предыдущей части диалога:\n"
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+# Фрагмент контекста: идентификатор (если известен) и текст
+ContextChunk = Tuple[Optional[int], str]
+
+
+def estimate_llm_tokens(text: str) -> int:
+    """Оценка числа токенов текста для модели DeepSeek."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class Prompt:
+    """Собранный запрос и распределение его токенов по частям."""
+    messages: List[Dict[str, str]]
+    tokens: Dict[str, int] = field(default_factory=dict)
+    dropped_chunks: int = 0
+    dropped_turns: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens.values())
+
+
+class PromptBuilder:
+    """Собирает сообщения для модели, не превышая ``max_prompt_tokens``."""
+
+    def __init__(
+        self,
+        max_prompt_tokens: int = 6000,
+        history_share: float = 0.25,
+        max_history_turns: int = 5,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.history_share = history_share
+        self.max_history_turns = max_history_turns
+        self.count_tokens = count_tokens or estimate_llm_tokens
+
+    def build(
+        self,
+        system_prompt: str,
+        question: str,
+        context: Optional[str] = None,
+        history: Optional[List[Dict]] = None,
+        summary: Optional[str] = None,
+        chunks: Optional[List[Dict[str, Any]]] = None
+    ) -> Prompt:
+        """Собирает сообщения: системный промпт, контекст, история, вопрос.
+
+        ``chunks`` — результаты поиска по релевантности (``content``
+        и ``metadata`` с ``chunk_id``); без них используется ``context`` —
+        фрагменты, разделённые пустой строкой, в порядке релевантности;
+        ``history`` — реплики от старых к новым с ключами ``user_message``
+        и ``bot_response``; ``summary`` — резюме более ранних реплик.
+        """
+        budget = self.max_prompt_tokens
+
+        system_tokens = self._message_tokens(system_prompt)
+        # Вопрос обрезается, только если не помещается даже без контекста
+        question = self._truncate(question, budget - system_tokens - MESSAGE_OVERHEAD_TOKENS)
+        question_tokens = self._message_tokens(question)
+        remaining = max(0, budget - system_tokens - question_tokens)
+
+        turns = (history or [])[-self.max_history_turns:]
+        summary = SUMMARY_HEADER + summary if summary else None
+        history_reserve = min(
+            sum(self._turn_tokens(turn) for turn in turns)
+            + (self._message_tokens(summary) if summary else 0),
+            int(remaining * self.history_share)
+        )
+
+        candidates = self._deduplicate(self._context_chunks(context, chunks))
+        context_budget = remaining - history_reserve - self._message_tokens(CONTEXT_HEADER)
+        kept_chunks, context_tokens = self._fit_chunks(candidates, context_budget)
+        if kept_chunks:
+            context_tokens += self._message_tokens(CONTEXT_HEADER)
+        if all(chunk_id is not None for chunk_id, _ in kept_chunks):
+            # Отбор шёл по релевантности, порядок в запросе — по идентификатору
+            kept_chunks.sort(key=lambda chunk: chunk[0])
+
+        # Не понадобившийся фрагментам бюджет достаётся истории
+        history_budget = remaining - context_tokens
+        kept_turns, history_tokens = self._fit_history(turns, history_budget)
+        if summary:
+            summary_budget = history_budget - history_tokens - MESSAGE_OVERHEAD_TOKENS
+            if summary_budget >= MIN_PART_TOKENS:
+                summary = self._truncate(summary, summary_budget)
+                history_tokens += self._message_tokens(summary)
+            else:
+                summary = None
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if kept_chunks:
+            messages.append({
+                "role": "system",
+                "content": CONTEXT_HEADER + "\n\n".join(text for _, text in kept_chunks)
+            })
+        if summary:
+            messages.append({"role": "system", "content": summary})
+        for turn in kept_turns:
+            messages.append({"role": "user", "content": turn["user_message"]})
+            messages.append({"role": "assistant", "content": turn["bot_response"]})
+        messages.append({"role": "user", "content": question})
+
+        prompt = Prompt(
+            messages=messages,
+            tokens={
+                "system": system_tokens,
+                "context": context_tokens,
+                "history": history_tokens,
+                "question": question_tokens,
+            },
+            dropped_chunks=len(candidates) - len(kept_chunks),
+            dropped_turns=len(turns) - len(kept_turns)
+        )
+        for part, tokens in prompt.tokens.items():
+            PROMPT_TOKENS.labels(part=part).observe(tokens)
+        return prompt
+
+    def _message_tokens(self, text: str) -> int:
+        return self.count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+
+    def _turn_tokens(self, turn: Dict) -> int:
+        return self._message_tokens(turn["user_message"]) + self._message_tokens(turn["bot_response"])
+
+    @staticmethod
+    def _context_chunks(
+        context: Optional[str],
+        chunks: Optional[List[Dict[str, Any]]]
+    ) -> List[ContextChunk]:
+        if chunks is not None:
+            return [
+                (chunk.get("metadata", {}).get("chunk_id"), chunk["content"].strip())
+                for chunk in chunks if chunk["content"].strip()
+            ]
+        if not context:
+            return []
+        return [(None, part.strip()) for part in _PARAGRAPH_RE.split(context) if part.strip()]
+
+    @staticmethod
+    def _deduplicate(chunks: List[ContextChunk]) -> List[ContextChunk]:
+        """Удаляет повторы и перекрытия фрагментов, сохраняя порядок по релевантности.
+
+        Соседние фрагменты документа перекрываются на несколько предложений:
+        у менее релевантного фрагмента отбрасывается часть, совпадающая
+        с началом или концом уже взятого.
+        """
+        kept: List[Tuple[List[str], ContextChunk]] = []
+        for chunk_id, chunk in chunks:
+            words = chunk.split()
+            normalized = " ".join(words)
+            if any(normalized in " ".join(previous) for previous, _ in kept):
+                continue
+
+            text = chunk
+            for previous, _ in kept:
+                overlap = _overlap_words(previous, words)
+                if overlap >= MIN_OVERLAP_WORDS:
+                    words = words[overlap:]
+                    text = " ".join(words)
+                overlap = _overlap_words(words, previous)
+                if overlap >= MIN_OVERLAP_WORDS:
+                    words = words[:-overlap]
+                    text = " ".join(words)
+            if words:
+                kept.append((words, (chunk_id, text)))
+
+        return [chunk for _, chunk in kept]
+
+    def _fit_chunks(self, chunks: List[ContextChunk], budget: int) -> Tuple[List[ContextChunk], int]:
+        """Берёт фрагменты по порядку релевантности, пока хватает бюджета."""
+        kept = []
+        used = 0
+        for chunk_id, chunk in chunks:
+            tokens = self.count_tokens(chunk)
+            if used + tokens <= budget:
+                kept.append((chunk_id, chunk))
+                used += tokens
+                continue
+
+            if budget - used >= MIN_PART_TOKENS:
+                chunk = self._truncate(chunk, budget - used)
+                kept.append((chunk_id, chunk))
+                used += self.count_tokens(chunk)
+            break
+
+        return kept, used
+
+    def _fit_history(self, turns: List[Dict], budget: int) -> Tuple[List[Dict], int]:
+        """Берёт реплики от новых к старым; последняя помещающаяся сокращается."""
+        kept = []
+        used = 0
+        for turn in reversed(turns):
+            tokens = self._turn_tokens(turn)
+            if used + tokens <= budget:
+                kept.append(turn)
+                used += tokens
+                continue
+
+            answer_budget = budget - used - self._message_tokens(turn["user_message"]) - MESSAGE_OVERHEAD_TOKENS
+            if answer_budget >= MIN_PART_TOKENS:
+                turn = {**turn, "bot_response": self._truncate(turn["bot_response"], answer_budget)}
+                kept.append(turn)
+                used += self._turn_tokens(turn)
+            break
+
+        kept.reverse()
+        return kept, used
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Обрезает текст до ``max_tokens`` по границе предложения или слова."""
+        if self.count_tokens(text) <= max_tokens:
+            return text
+
+        limit = max(0, (max_tokens - 1) * CHARS_PER_TOKEN - 1)
+        while True:
+            head = text[:limit]
+            sentence_end = max(head.rfind(". "), head.rfind(".\n"))
+            if sentence_end > limit // 2:
+                head = head[:sentence_end + 1]
+            else:
+                head = head.rsplit(" ", 1)[0] + "…"
+
+            # Счётчик токенов может расходиться с оценкой по символам
+            if limit == 0 or self.count_tokens(head) <= max_tokens:
+                return head
+            limit = limit * 9 // 10
+
+
+def _overlap_words(previous: List[str], words: List[str]) -> int:
+    """Длина наибольшего конца ``previous``, с которого начинается ``words``."""
+    for size in range(min(len(previous), len(words)), 0, -1):
+        if previous[-size:] == words[:size]:
+            return size
+    return 0
@@ -1,54 +1,325 @@
-from typing import List, Dict, Optional
-import os
+from typing import TYPE_CHECKING, Any, List, Dict, Optional
+import asyncio
+import time
 from pathlib import Path
 
+from config.settings import config
+from app.ai_integration.ann_index import ANNParams
+from app.ai_integration.chunker import StructuredChunker
 from app.ai_integration.document_processor import DocumentProcessor
+from app.ai_integration.index_lock import IndexLockedError
+from app.ai_integration.ingestion import IngestionPipeline, IngestionStats
 from app.ai_integration.vector_store import VectorStore
+from app.monitoring.metrics import RETRIEVAL_LATENCY
+
+if TYPE_CHECKING:
+    from app.ai_integration.reranker import CrossEncoderReranker
+
+
+class DocumentIndexError(Exception):
+    """Документ не добавлен в индекс."""
+    pass
+
+
+class DocumentMetadataUnavailable(DocumentIndexError):
+    """Поля документа не загрузились из базы: без признака доступности он не индексируется."""
+    pass
+
+
+class DocumentIngestionFailed(DocumentIndexError):
+    """Не удалось извлечь текст документа или рассчитать его эмбеддинги."""
+    pass
 
 
 class RAGSystem:
     """Система Retrieval-Augmented Generation для поиска в документах."""
     
-    def __init__(self):
-        self.document_processor = DocumentProcessor()
-        self.vector_store = VectorStore()
+    # Интервал повторной синхронизации, если она была отложена
+    SYNC_RETRY_INTERVAL = 60.0
+    
+    def __init__(
+        self,
+        vector_store: Optional[VectorStore] = None,
+        reranker: Optional["CrossEncoderReranker"] = None
+    ):
+        self.vector_store = vector_store or VectorStore(
+            index_path=config.rag.index_path,
+            ann_params=ANNParams.from_config(config.rag)
+        )
+        # Длина фрагментов измеряется токенизатором той же модели, что считает эмбеддинги
+        self.document_processor = DocumentProcessor(StructuredChunker(
+            count_tokens=self.vector_store.embedding_service.count_tokens,
+            max_tokens=config.rag.chunk_max_tokens,
+            overlap_tokens=config.rag.chunk_overlap_tokens
+        ))
+        self.pipeline = IngestionPipeline(
+            self.vector_store,
+            document_processor=self.document_processor,
+            max_workers=config.rag.ingestion_workers,
+            embed_batch_size=config.rag.embed_batch_size
+        )
+        # Уточняет порядок кандидатов поиска; без него берутся лучшие по поиску
+        self.reranker = reranker
         self._initialized = False
+        self._init_lock = asyncio.Lock()
+        # Время (monotonic), раньше которого отложенная синхронизация не повторяется
+        self._sync_retry_at = 0.0
     
-    async def initialize(self, documents_path: str = "documents/") -> None:
-        """Инициализирует RAG систему, обрабатывая все документы."""
-        if self._initialized:
+    async def initialize(self, documents_path: Optional[str] = None) -> None:
+        """Инициализирует RAG систему, обрабатывая все документы.
+        
+        Блокировку каталога индекса инициализация не ждёт: пока его обновляет
+        другой процесс (ночная переиндексация), поиск идёт по индексу,
+        загруженному с диска. Отложенная синхронизация повторяется при
+        следующих поисках не чаще раза в ``SYNC_RETRY_INTERVAL`` секунд.
+        """
+        if self._initialized or time.monotonic() < self._sync_retry_at:
             return
         
+        # Система разделяется обработчиками — индексируем документы один раз
+        async with self._init_lock:
+            if self._initialized or time.monotonic() < self._sync_retry_at:
+                return
+            await self._index_documents(documents_path or config.rag.documents_path)
+    
+    async def _index_documents(self, documents_path: str) -> Optional[IngestionStats]:
+        """Синхронизирует индекс с каталогом: обрабатываются только изменённые файлы."""
         docs_path = Path(documents_path)
         if not docs_path.exists():
-            return
+            return None
         
-        # Обрабатываем все PDF файлы
-        for pdf_file in docs_path.glob("**/*.pdf"):
-            try:
-                text = self.document_processor.extract_text(pdf_file)
-                chunks = list(self.document_processor.split_into_chunks(text))
-                
-                # Добавляем в векторную базу
-                await self.vector_store.add_documents(chunks, source=str(pdf_file))
-                
-            except Exception as e:
-                print(f"Error processing {pdf_file}: {e}")
+        try:
+            stats = await self.sync_documents(docs_path, wait=False)
+        except IndexLockedError:
+            print("Vector index is locked by another process, index sync postponed")
+            stats = None
+        if stats is None:
+            self._sync_retry_at = time.monotonic() + self.SYNC_RETRY_INTERVAL
+            return None
         
         self._initialized = True
+        return stats
     
-    async def search(self, query: str, top_k: int = 5) -> List[Dict[str, str]]:
-        """Ищет релевантные фрагменты документов."""
+    async def sync_documents(self, documents_path: Path, wait: bool = True) -> Optional[IngestionStats]:
+        """Синхронизирует индекс с каталогом под блокировкой каталога индекса.
+        
+        Бот и скрипт переиндексации пишут в одни и те же файлы: синхронизация
+        выполняется под ``write_lock`` по состоянию, перечитанному с диска.
+        Без ``wait`` при занятой блокировке бросается ``IndexLockedError``.
+        
+        Если поля документов не загрузились, синхронизация откладывается
+        и возвращается ``None``: иначе новые файлы попали бы в индекс без
+        признака доступности и стали бы видны всем пользователям.
+        """
+        documents = await self.load_document_metadata(documents_path)
+        if documents is None:
+            print("Document metadata unavailable, index sync postponed")
+            return None
+        
+        await self.vector_store.write_lock.acquire(wait=wait)
+        try:
+            self.vector_store.reload_if_changed()
+            return await self.pipeline.sync(documents_path, documents=documents)
+        finally:
+            self.vector_store.write_lock.release()
+    
+    async def load_document_metadata(self, documents_path: Path) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Поля записей ``Document`` по путям файлов для метаданных фрагментов.
+        
+        Возвращает ``None``, если база недоступна: синхронизация тогда
+        откладывается (см. ``sync_documents``).
+        """
+        try:
+            from app.database.connection import get_async_session
+            from app.database.repositories.document_repository import DocumentRepository
+            
+            async with get_async_session() as session:
+                documents = await DocumentRepository(session).get_indexable_documents()
+        except Exception as e:
+            print(f"Error loading document metadata: {e}")
+            return None
+        
+        return {
+            str(documents_path / document.file_path): {
+                'document_id': document.id,
+                'category': document.category,
+                'document_type': document.document_type,
+                'is_public': document.is_public,
+                'version': document.version
+            }
+            for document in documents
+        }
+    
+    async def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Ищет релевантные фрагменты документов.
+
+        Векторный поиск находит фрагменты, близкие по смыслу, лексический
+        (BM25) — по точному совпадению номеров, реквизитов и аббревиатур.
+        Списки объединяются по рангам (reciprocal rank fusion), поэтому
+        несопоставимые шкалы оценок двух поисков не нужно нормировать.
+        С переранжированием отбирается ``rerank_candidates`` кандидатов,
+        из которых кросс-энкодер выбирает ``top_k``. ``filters`` ограничивает
+        поиск полями документа, например ``{"is_public": True}`` или
+        ``{"category": "Положения"}``.
+        """
         if not self._initialized:
             await self.initialize()
         
-        return await self.vector_store.search(query, top_k=top_k)
+        if self.reranker is None:
+            return await self._retrieve(query, top_k, filters)
+        
+        results = await self._retrieve(query, max(top_k, config.rag.rerank_candidates), filters)
+        return await self.reranker.rerank(query, results, top_k)
+    
+    async def _retrieve(
+        self,
+        query: str,
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Отбирает кандидатов векторным и (при гибридном поиске) лексическим поиском."""
+        if not config.rag.hybrid_search:
+            return await self.vector_store.search(
+                query, top_k=top_k, score_threshold=config.rag.dense_score_threshold, filters=filters
+            )
+        
+        candidates = top_k * config.rag.hybrid_candidates
+        
+        started = time.perf_counter()
+        dense = await self.vector_store.search(
+            query, top_k=candidates, score_threshold=config.rag.dense_score_threshold, filters=filters
+        )
+        RETRIEVAL_LATENCY.labels(stage="dense").observe(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        lexical = self.vector_store.lexical_search(query, top_k=candidates, filters=filters)
+        RETRIEVAL_LATENCY.labels(stage="lexical").observe(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        results = self.fuse_results([dense, lexical], top_k=top_k, k=config.rag.rrf_k)
+        RETRIEVAL_LATENCY.labels(stage="fusion").observe(time.perf_counter() - started)
+        
+        return results
+    
+    async def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Ищет фрагменты для списка вопросов — результаты в порядке ``queries``.
+
+        Для пакетной обработки (оценка качества, подготовка ответов на частые
+        вопросы): эмбеддинги вопросов считаются одной пачкой, векторный поиск —
+        один вызов FAISS по матрице запросов. Ранжирование то же, что у ``search``.
+        """
+        if not self._initialized:
+            await self.initialize()
+        
+        if self.reranker is None:
+            return await self._retrieve_batch(queries, top_k, filters)
+        
+        candidates = await self._retrieve_batch(
+            queries, max(top_k, config.rag.rerank_candidates), filters
+        )
+        return await self._rerank_batch(queries, candidates, top_k)
+    
+    async def _rerank_batch(
+        self,
+        queries: List[str],
+        candidates: List[List[Dict[str, Any]]],
+        top_k: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Переранжирует кандидатов группами вопросов, помещающимися в пачку модели.
+        
+        Пары одной группы считаются вместе с бюджетом времени одного вопроса
+        на каждый вопрос группы. Если группа не уложилась в бюджет, остальные
+        вопросы не ждут модель и получают кандидатов в исходном порядке.
+        """
+        group_size = max(1, config.rag.rerank_batch_size // max(config.rag.rerank_candidates, 1))
+        timeout = config.rag.rerank_timeout_ms / 1000 * group_size
+        
+        reranked: List[List[Dict[str, Any]]] = []
+        fallback = False
+        for start in range(0, len(queries), group_size):
+            group = list(zip(queries[start:start + group_size], candidates[start:start + group_size]))
+            if fallback:
+                reranked.extend(results[:top_k] for _, results in group)
+                continue
+            
+            group_results = await asyncio.gather(*(
+                self.reranker.rerank(query, results, top_k, timeout=timeout)
+                for query, results in group
+            ))
+            reranked.extend(group_results)
+            # Без оценок модели возвращается исходный порядок — бюджет исчерпан
+            fallback = any(
+                len(results) > 1 and ranked and "rerank_score" not in ranked[0]
+                for (_, results), ranked in zip(group, group_results)
+            )
+        return reranked
+    
+    async def _retrieve_batch(
+        self,
+        queries: List[str],
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Отбор кандидатов для списка вопросов, как в ``_retrieve``."""
+        if not config.rag.hybrid_search:
+            return await self.vector_store.search_batch(
+                queries, top_k=top_k, score_threshold=config.rag.dense_score_threshold, filters=filters
+            )
+        
+        candidates = top_k * config.rag.hybrid_candidates
+        dense = await self.vector_store.search_batch(
+            queries, top_k=candidates, score_threshold=config.rag.dense_score_threshold, filters=filters
+        )
+        return [
+            self.fuse_results(
+                [dense_results, self.vector_store.lexical_search(query, top_k=candidates, filters=filters)],
+                top_k=top_k,
+                k=config.rag.rrf_k
+            )
+            for query, dense_results in zip(queries, dense)
+        ]
+    
+    @staticmethod
+    def fuse_results(
+        result_lists: List[List[Dict[str, Any]]],
+        top_k: int = 5,
+        k: int = 60
+    ) -> List[Dict[str, Any]]:
+        """Объединяет ранжированные списки: оценка фрагмента — сумма ``1 / (k + ранг)``."""
+        scores: Dict[int, float] = {}
+        results: Dict[int, Dict[str, Any]] = {}
+        for result_list in result_lists:
+            for rank, result in enumerate(result_list, 1):
+                chunk_id = result['metadata']['chunk_id']
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1 / (k + rank)
+                results.setdefault(chunk_id, result)
+        
+        ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        return [{**results[chunk_id], 'score': scores[chunk_id]} for chunk_id in ranked]
     
     async def add_document(self, file_path: str) -> None:
-        """Добавляет новый документ в систему."""
-        try:
-            text = self.document_processor.extract_text(Path(file_path))
-            chunks = list(self.document_processor.split_into_chunks(text))
-            await self.vector_store.add_documents(chunks, source=file_path)
-        except Exception as e:
-            raise Exception(f"Failed to add document {file_path}: {e}")
+        """Добавляет новый документ в систему.
+        
+        Бросает ``DocumentMetadataUnavailable``, если база недоступна,
+        и ``DocumentIngestionFailed``, если документ не удалось обработать.
+        """
+        documents = await self.load_document_metadata(Path(config.rag.documents_path))
+        if documents is None:
+            # Без признака доступности документ стал бы виден всем пользователям
+            raise DocumentMetadataUnavailable(f"Document metadata unavailable, {file_path} not added")
+        
+        async with self.vector_store.write_lock:
+            self.vector_store.reload_if_changed()
+            stats = await self.pipeline.run([Path(file_path)], documents=documents)
+        if stats.failed:
+            raise DocumentIngestionFailed(f"Failed to add document {file_path}")
@@ -0,0 +1,286 @@
+"""Клиентское управление нагрузкой на внешний API модели.
+
+Запросы проходят через ``RateGovernor`` перед отправкой: он ограничивает
+частоту запросов и расход токенов в минуту (token bucket), число
+одновременных запросов (AIMD: медленный рост при успехах, резкое снижение
+при 429 и росте задержки) и ставит избыточные запросы в ограниченную
+очередь с приоритетом. При всплеске нагрузки запросы ждут своей очереди
+вместо того, чтобы одновременно повторяться после ошибок 429.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+from app.monitoring.metrics import (
+    RATE_GOVERNOR_LIMIT,
+    RATE_GOVERNOR_REJECTED,
+    RATE_GOVERNOR_WAIT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты очереди: меньшее значение обслуживается раньше
+PRIORITY_MEMBER = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2
+
+_request_priority: ContextVar[int] = ContextVar("llm_request_priority", default=PRIORITY_DEFAULT)
+
+
+def set_request_priority(priority: int) -> None:
+    """Задаёт приоритет запросов к модели для текущей задачи (обработки апдейта)."""
+    _request_priority.set(priority)
+
+
+def get_request_priority() -> int:
+    return _request_priority.get()
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Экспоненциальная задержка перед повтором со случайным разбросом (full jitter).
+
+    Разброс не даёт клиентам, получившим ошибку одновременно, одновременно
+    же и повторить запрос.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбирает заголовок Retry-After: число секунд или HTTP-дата."""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class GovernorOverloaded(Exception):
+    """Очередь ожидания переполнена или ожидание превысило допустимое время."""
+    pass
+
+
+class TokenBucket:
+    """Ведро токенов, пополняемое с постоянной скоростью.
+
+    Уровень может уходить в минус: фактический расход (например, токены
+    из ``usage`` ответа) списывается после запроса, и перерасход
+    задерживает следующие запросы.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Через сколько секунд в ведре наберётся ``amount``."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self.rate
+
+    def take(self, amount: float) -> None:
+        """Списывает ``amount``; отрицательное значение возвращает излишек резерва."""
+        self._refill()
+        self._level = min(self.capacity, self._level - amount)
+
+
+class RateGovernor:
+    """Допускает запросы к API с учётом лимитов частоты, токенов и параллельности.
+
+    Перед запросом вызывается ``acquire``, после — ``release`` с его исходом.
+    Предел параллельности меняется по схеме AIMD: каждый успешный ответ
+    с задержкой не больше ``latency_target`` увеличивает его на ``1 / limit``,
+    ответ 429 или медленный ответ уменьшает в ``DECREASE_FACTOR`` раз, но не
+    чаще раза в ``DECREASE_COOLDOWN`` секунд — одна волна ошибок даёт одно
+    снижение. ``pause`` приостанавливает выдачу разрешений (Retry-After).
+    """
+
+    # Множитель снижения предела параллельности
+    DECREASE_FACTOR = 0.5
+
+    # Минимальный интервал между снижениями предела, секунд
+    DECREASE_COOLDOWN = 2.0
+
+    def __init__(
+        self,
+        name: str = "llm",
+        requests_per_minute: float = 120,
+        tokens_per_minute: float = 0,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 10,
+        latency_target: float = 20.0,
+        max_queue: int = 100,
+        max_queue_wait: float = 30.0
+    ):
+        self.name = name
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self._limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+        self._waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        RATE_GOVERNOR_LIMIT.labels(name=name).set(self.limit)
+
+    @property
+    def limit(self) -> int:
+        """Текущий предел одновременных запросов."""
+        return int(self._limit)
+
+    @property
+    def tracks_tokens(self) -> bool:
+        """Включён ли лимит токенов в минуту."""
+        return self._tokens is not None
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self, priority: Optional[int] = None, tokens: int = 0) -> None:
+        """Ожидает разрешения на запрос, резервирующий ``tokens`` токенов."""
+        priority = get_request_priority() if priority is None else priority
+        started = time.monotonic()
+
+        if not self._waiters and self._admission_delay(tokens) == 0:
+            self._admit(tokens)
+            RATE_GOVERNOR_WAIT.labels(name=self.name, priority=str(priority)).observe(0)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            RATE_GOVERNOR_REJECTED.labels(name=self.name, reason="queue_full").inc()
+            raise GovernorOverloaded(f"Rate governor '{self.name}': wait queue is full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), tokens, future))
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(future, timeout=self.max_queue_wait)
+        except asyncio.TimeoutError:
+            RATE_GOVERNOR_REJECTED.labels(name=self.name, reason="timeout").inc()
+            raise GovernorOverloaded(f"Rate governor '{self.name}': queue wait timed out")
+        except asyncio.CancelledError:
+            # Разрешение могло быть выдано одновременно с отменой: запрос
+            # не выполнялся, поэтому списанное при допуске возвращается целиком
+            if future.done() and not future.cancelled():
+                if self._requests is not None:
+                    self._requests.take(-1)
+                self.release(tokens_used=0, tokens_reserved=tokens)
+            raise
+
+        RATE_GOVERNOR_WAIT.labels(name=self.name, priority=str(priority)).observe(
+            time.monotonic() - started
+        )
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        throttled: bool = False,
+        tokens_used: Optional[int] = None,
+        tokens_reserved: int = 0
+    ) -> None:
+        """Возвращает разрешение и учитывает исход запроса.
+
+        Без ``latency`` (запрос не выполнялся) предел параллельности не меняется.
+        """
+        self._in_flight -= 1
+
+        if self._tokens is not None and tokens_used is not None:
+            self._tokens.take(tokens_used - tokens_reserved)
+
+        slow = latency is not None and latency > self.latency_target
+        if throttled or slow:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.DECREASE_COOLDOWN:
+                self._last_decrease = now
+                self._limit = max(float(self.min_concurrency), self._limit * self.DECREASE_FACTOR)
+                logger.info(
+                    f"Rate governor '{self.name}': concurrency limit lowered to {self.limit} "
+                    f"({'throttled' if throttled else f'latency {latency:.1f}s'})"
+                )
+        elif latency is not None:
+            self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+
+        RATE_GOVERNOR_LIMIT.labels(name=self.name).set(self.limit)
+        self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        """Приостанавливает выдачу разрешений на ``seconds`` секунд."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _admission_delay(self, tokens: int) -> float:
+        """Через сколько секунд можно допустить запрос; ``inf`` — ждать освобождения слота."""
+        if self._in_flight >= self.limit:
+            return float("inf")
+
+        delay = self._paused_until - time.monotonic()
+        if self._requests is not None:
+            delay = max(delay, self._requests.delay(1))
+        if self._tokens is not None and tokens:
+            delay = max(delay, self._tokens.delay(tokens))
+        return max(0.0, delay)
+
+    def _admit(self, tokens: int) -> None:
+        self._in_flight += 1
+        if self._requests is not None:
+            self._requests.take(1)
+        if self._tokens is not None and tokens:
+            self._tokens.take(tokens)
+
+    def _dispatch(self) -> None:
+        """Выдаёт разрешения ожидающим в порядке приоритета."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                # Ожидание отменено или истекло
+                heapq.heappop(self._waiters)
+                continue
+
+            delay = self._admission_delay(tokens)
+            if delay == float("inf"):
+                # Следующий вызов будет из release
+                return
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._waiters)
+            self._admit(tokens)
+            future.set_result(None)
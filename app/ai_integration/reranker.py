@@ -0,0 +1,98 @@
+"""Переранжирование найденных фрагментов кросс-энкодером.
+
+Векторный и лексический поиск дёшево отбирают несколько десятков
+кандидатов; кросс-энкодер оценивает каждую пару «вопрос — фрагмент»
+целиком и точнее выбирает несколько лучших. Пары всех конкурентных
+запросов объединяются в общие пачки и считаются в выделенном потоке.
+Если оценка не укладывается в бюджет времени, используется исходный
+порядок кандидатов.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.ai_integration.micro_batcher import MicroBatcher
+from app.monitoring.metrics import RERANK_FALLBACKS, RETRIEVAL_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """Переупорядочивает результаты поиска по оценке кросс-энкодера."""
+
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1",
+        max_length: int = 256,
+        max_batch_size: int = 64,
+        max_wait: float = 0.005,
+        timeout: float = 0.3
+    ):
+        # Импорт torch занимает секунды — модель загружается только при включённом переранжировании
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.timeout = timeout
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self._batcher = MicroBatcher(
+            self._score_pairs,
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            executor=self._executor
+        )
+
+    def _score_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """Синхронно оценивает пачку пар «вопрос — фрагмент»."""
+        scores = self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        return [float(score) for score in scores]
+
+    async def warm_up(self, query: str) -> None:
+        """Первый прямой проход модели, чтобы не задерживать первый запрос."""
+        await self._batcher.submit((query, query))
+
+    async def rerank(
+        self,
+        query: str,
+        results: List[Dict[str, Any]],
+        top_k: int,
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Возвращает ``top_k`` результатов, упорядоченных кросс-энкодером.
+
+        По истечении ``timeout`` (по умолчанию — бюджет из конструктора)
+        или при ошибке модели возвращаются первые ``top_k`` результатов
+        в исходном порядке.
+        """
+        if len(results) <= 1:
+            return results[:top_k]
+
+        started = time.perf_counter()
+        try:
+            scores = await asyncio.wait_for(
+                asyncio.gather(*(
+                    self._batcher.submit((query, result["content"])) for result in results
+                )),
+                timeout=self.timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            RERANK_FALLBACKS.labels(reason="timeout").inc()
+            logger.warning(f"Reranking of {len(results)} candidates exceeded the time budget")
+            return results[:top_k]
+        except Exception as e:
+            RERANK_FALLBACKS.labels(reason="error").inc()
+            logger.warning(f"Reranking failed: {e}")
+            return results[:top_k]
+        finally:
+            RETRIEVAL_LATENCY.labels(stage="rerank").observe(time.perf_counter() - started)
+
+        order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return [{**results[i], "rerank_score": scores[i]} for i in order]
+
+    async def close(self) -> None:
+        """Останавливает обработку пачек и освобождает поток модели."""
+        await self._batcher.close()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,228 @@
+"""Append-only хранилище фрагментов документов с отображением файлов в память."""
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Запись таблицы смещений: идентификатор фрагмента и положение текста
+# и метаданных внутри blob-файла
+OFFSET_DTYPE = np.dtype([
+    ("chunk_id", "<i8"),
+    ("text_offset", "<u8"),
+    ("text_length", "<u4"),
+    ("meta_offset", "<u8"),
+    ("meta_length", "<u4"),
+])
+
+
+class SegmentStore:
+    """Тексты и метаданные фрагментов в append-only файлах.
+
+    ``chunks.blob`` содержит подряд записанные UTF-8 тексты и JSON-метаданные,
+    ``chunks.idx`` — таблицу смещений с записями фиксированного размера.
+    Оба файла открываются через mmap, поэтому загрузка не зависит от размера
+    корпуса; дописанные записи отображаются заново только при первом чтении
+    после записи. Таблица смещений дописывается после blob: оборванная запись
+    не видна после перезапуска. Идентификаторы фрагментов строго возрастают,
+    что позволяет искать позицию по идентификатору бинарным поиском,
+    и никогда не выдаются повторно: при перезаписи без последних фрагментов
+    следующий идентификатор сохраняется в ``chunks.next``.
+    """
+
+    # Размер пачки записей при полной перезаписи хранилища
+    REWRITE_BATCH_SIZE = 1000
+
+    def __init__(self, path: Path, name: str = "chunks"):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.name = name
+        self.blob_file = self.path / f"{name}.blob"
+        self.offsets_file = self.path / f"{name}.idx"
+        self.next_id_file = self.path / f"{name}.next"
+
+        self._blob: Optional[mmap.mmap] = None
+        self._offsets: np.ndarray = np.empty(0, dtype=OFFSET_DTYPE)
+        # Число записей на диске и последний идентификатор: отображение
+        # может отставать от них до первого чтения после записи
+        self._count = 0
+        self._last_id: Optional[int] = None
+        # Нижняя граница следующего идентификатора после перезаписи
+        self._min_next_id = 0
+        self._open()
+
+    def _open(self) -> None:
+        """Открывает хранилище: проверяет файлы и отображает их в память."""
+        self.close()
+        self.blob_file.touch(exist_ok=True)
+        self.offsets_file.touch(exist_ok=True)
+
+        # Отбрасываем неполную запись в конце таблицы смещений
+        size = self.offsets_file.stat().st_size
+        if size % OFFSET_DTYPE.itemsize:
+            with open(self.offsets_file, "r+b") as f:
+                f.truncate(size - size % OFFSET_DTYPE.itemsize)
+            size -= size % OFFSET_DTYPE.itemsize
+
+        self._count = size // OFFSET_DTYPE.itemsize
+        self._map()
+        self._last_id = int(self._offsets["chunk_id"][-1]) if self._count else None
+
+        self._min_next_id = 0
+        if self.next_id_file.exists():
+            self._min_next_id = int(self.next_id_file.read_text().strip() or 0)
+
+    def _map(self) -> None:
+        """Отображает в память все записи, зафиксированные на диске."""
+        self.close()
+        if self._count:
+            self._offsets = np.memmap(
+                self.offsets_file, dtype=OFFSET_DTYPE, mode="r", shape=(self._count,)
+            )
+
+        if self.blob_file.stat().st_size:
+            with open(self.blob_file, "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def _entries(self) -> np.ndarray:
+        """Таблица смещений; записи, дописанные после отображения, отображаются при чтении."""
+        if len(self._offsets) < self._count:
+            self._map()
+        return self._offsets
+
+    def close(self) -> None:
+        """Закрывает отображения файлов."""
+        if self._blob is not None:
+            self._blob.close()
+            self._blob = None
+        self._offsets = np.empty(0, dtype=OFFSET_DTYPE)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def chunk_ids(self) -> np.ndarray:
+        """Идентификаторы всех фрагментов в порядке записи."""
+        return self._entries["chunk_id"]
+
+    @property
+    def next_id(self) -> int:
+        """Идентификатор, который получит следующий фрагмент."""
+        if self._last_id is None:
+            return self._min_next_id
+        return max(self._last_id + 1, self._min_next_id)
+
+    def append(self, records: Iterable[Tuple[int, str, Dict[str, Any]]]) -> int:
+        """Дописывает фрагменты ``(chunk_id, text, metadata)`` в конец хранилища."""
+        records = list(records)
+        if not records:
+            return 0
+
+        next_id = self.next_id
+        entries = np.zeros(len(records), dtype=OFFSET_DTYPE)
+        payload = bytearray()
+        base = self.blob_file.stat().st_size
+
+        for i, (chunk_id, text, metadata) in enumerate(records):
+            if chunk_id < next_id:
+                raise ValueError("Идентификаторы фрагментов должны возрастать")
+            next_id = chunk_id + 1
+
+            text_bytes = text.encode("utf-8")
+            meta_bytes = json.dumps(metadata, ensure_ascii=False, default=str).encode("utf-8")
+
+            entries[i] = (
+                chunk_id,
+                base + len(payload),
+                len(text_bytes),
+                base + len(payload) + len(text_bytes),
+                len(meta_bytes),
+            )
+            payload += text_bytes
+            payload += meta_bytes
+
+        # Сначала данные, затем таблица смещений — она фиксирует запись
+        self._write(self.blob_file, bytes(payload), mode="ab")
+        self._write(self.offsets_file, entries.tobytes(), mode="ab")
+        self._count += len(records)
+        self._last_id = next_id - 1
+
+        return len(records)
+
+    def rewrite(self, records: Iterable[Tuple[int, str, Dict[str, Any]]]) -> None:
+        """Атомарно заменяет содержимое хранилища переданными фрагментами.
+
+        Идентификаторы отброшенных фрагментов не выдаются повторно: на них
+        могут ссылаться сохранённые индексы и кеши ответов.
+        """
+        # Граница фиксируется до замены файлов — после сбоя она может
+        # только опережать хранилище
+        next_id_tmp = self.next_id_file.with_name(self.next_id_file.name + ".tmp")
+        self._write(next_id_tmp, str(self.next_id).encode("ascii"), mode="wb")
+        os.replace(next_id_tmp, self.next_id_file)
+
+        tmp_name = f"{self.name}.tmp"
+        for suffix in (".blob", ".idx"):
+            (self.path / f"{tmp_name}{suffix}").unlink(missing_ok=True)
+        tmp = SegmentStore(self.path, name=tmp_name)
+
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.REWRITE_BATCH_SIZE:
+                tmp.append(batch)
+                batch = []
+        tmp.append(batch)
+        tmp.close()
+
+        self.close()
+        os.replace(tmp.blob_file, self.blob_file)
+        os.replace(tmp.offsets_file, self.offsets_file)
+        self._open()
+
+    def position(self, chunk_id: int) -> Optional[int]:
+        """Возвращает позицию фрагмента по идентификатору."""
+        ids = self._entries["chunk_id"]
+        pos = int(np.searchsorted(ids, chunk_id))
+        if pos < len(ids) and ids[pos] == chunk_id:
+            return pos
+        return None
+
+    def get_text(self, position: int) -> str:
+        """Возвращает текст фрагмента по позиции."""
+        entry = self._entries[position]
+        start = int(entry["text_offset"])
+        return self._blob[start:start + int(entry["text_length"])].decode("utf-8")
+
+    def get_metadata(self, position: int) -> Dict[str, Any]:
+        """Возвращает метаданные фрагмента по позиции."""
+        entry = self._entries[position]
+        start = int(entry["meta_offset"])
+        return json.loads(self._blob[start:start + int(entry["meta_length"])])
+
+    def get(self, chunk_id: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Возвращает текст и метаданные фрагмента по идентификатору."""
+        pos = self.position(chunk_id)
+        if pos is None:
+            return None
+        return self.get_text(pos), self.get_metadata(pos)
+
+    def iter_records(self) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+        """Итерирует по всем фрагментам хранилища."""
+        for pos in range(self._count):
+            yield int(self._entries[pos]["chunk_id"]), self.get_text(pos), self.get_metadata(pos)
+
+    def get_texts(self, chunk_ids: List[int]) -> List[str]:
+        """Возвращает тексты фрагментов по идентификаторам."""
+        return [self.get_text(self.position(chunk_id)) for chunk_id in chunk_ids]
+
+    @staticmethod
+    def _write(path: Path, data: bytes, mode: str) -> None:
+        """Записывает данные в файл и сбрасывает их на диск."""
+        with open(path, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
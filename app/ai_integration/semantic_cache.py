@@ -0,0 +1,240 @@
+"""Семантический кеш ответов консультанта.
+
+Ответ на вопрос переиспользуется для других формулировок того же вопроса:
+поиск ближайшего ранее отвеченного вопроса выполняется по эмбеддингам.
+Запись действительна, пока не изменились документы, на которых основан
+ответ: вместе с ответом сохраняются хэши содержимого их источников,
+и переиндексация документа с другим содержимым делает связанные ответы
+недействительными, даже если идентификаторы фрагментов совпадают.
+"""
+import base64
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+import numpy as np
+import redis.asyncio as aioredis
+
+from app.ai_integration.cache import cache_key
+from app.monitoring.metrics import CACHE_REQUESTS
+
+if TYPE_CHECKING:
+    from app.ai_integration.embeddings import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    """Ранее сгенерированный ответ и фрагменты, на которых он основан."""
+    question: str
+    answer: str
+    source_ids: List[int]
+    # Хэши содержимого источников фрагментов на момент ответа
+    source_versions: Dict[str, str] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.monotonic)
+    similarity: float = 1.0
+
+
+class SemanticAnswerCache:
+    """Кеш ответов с поиском ближайшего вопроса по косинусному сходству.
+
+    Эмбеддинги вопросов хранятся в небольшой матрице в памяти; при числе
+    записей порядка тысяч полный перебор занимает доли миллисекунды.
+    Записи дублируются в Redis и загружаются оттуда после перезапуска.
+    """
+
+    # Префикс ключей записей в Redis
+    REDIS_PREFIX = "cache:answer:"
+
+    # Ограничение времени операций с Redis, секунд
+    REDIS_TIMEOUT = 0.5
+
+    def __init__(
+        self,
+        embedding_service: "EmbeddingService",
+        source_versions: Callable[[List[int]], Optional[Dict[str, str]]],
+        threshold: float = 0.92,
+        max_entries: int = 2000,
+        ttl: int = 7 * 24 * 3600,
+        redis_url: Optional[str] = None
+    ):
+        self.embedding_service = embedding_service
+        # Хэши источников фрагментов или None, если какой-то фрагмент удалён
+        self.source_versions = source_versions
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis_url = redis_url
+
+        self._keys: List[str] = []
+        self._entries: Dict[str, CachedAnswer] = {}
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._redis: Optional[aioredis.Redis] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        if not self.redis_url:
+            return None
+        if self._redis is None:
+            self._redis = aioredis.from_url(
+                self.redis_url,
+                socket_timeout=self.REDIS_TIMEOUT,
+                socket_connect_timeout=self.REDIS_TIMEOUT
+            )
+        return self._redis
+
+    async def _embed(self, question: str) -> np.ndarray:
+        embedding = np.asarray(
+            await self.embedding_service.encode_cached(question), dtype=np.float32
+        )
+        return embedding / np.linalg.norm(embedding)
+
+    async def load(self) -> int:
+        """Загружает записи из Redis; возвращает число загруженных записей."""
+        client = self._get_redis()
+        if client is None:
+            return 0
+
+        try:
+            async for redis_key in client.scan_iter(match=f"{self.REDIS_PREFIX}*", count=500):
+                raw = await client.get(redis_key)
+                if raw is None:
+                    continue
+
+                data = json.loads(raw)
+                if data.pop("model", None) != self.embedding_service.model_id:
+                    # Эмбеддинги другой модели несравнимы с текущими
+                    continue
+                embedding = np.frombuffer(base64.b64decode(data.pop("embedding")), dtype=np.float32)
+                key = redis_key.decode()[len(self.REDIS_PREFIX):]
+                self._add(key, CachedAnswer(**data), embedding)
+        except Exception as e:
+            logger.warning(f"Failed to load answer cache from Redis: {e}")
+
+        logger.info(f"Answer cache loaded: {len(self)} entries")
+        return len(self)
+
+    async def lookup(self, question: str) -> Optional[CachedAnswer]:
+        """Ищет ответ на вопрос, близкий к заданному."""
+        if not self._keys:
+            CACHE_REQUESTS.labels(cache="answer", tier="semantic", result="miss").inc()
+            return None
+
+        embedding = await self._embed(question)
+        scores = self._matrix @ embedding
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+
+        if similarity < self.threshold:
+            CACHE_REQUESTS.labels(cache="answer", tier="semantic", result="miss").inc()
+            return None
+
+        key = self._keys[best]
+        entry = self._entries[key]
+        if (
+            time.time() - entry.created_at > self.ttl
+            or self.source_versions(entry.source_ids) != entry.source_versions
+        ):
+            # Устаревший ответ: истёк срок или изменились исходные фрагменты
+            await self.invalidate(key)
+            CACHE_REQUESTS.labels(cache="answer", tier="semantic", result="stale").inc()
+            return None
+
+        entry.last_used = time.monotonic()
+        entry.similarity = similarity
+        CACHE_REQUESTS.labels(cache="answer", tier="semantic", result="hit").inc()
+        return entry
+
+    async def store(self, question: str, answer: str, source_ids: List[int]) -> None:
+        """Сохраняет ответ на вопрос."""
+        if not answer or not source_ids:
+            return
+
+        versions = self.source_versions(list(source_ids))
+        if versions is None:
+            # Фрагменты удалены переиндексацией, пока генерировался ответ
+            return
+
+        key = cache_key(question)
+        entry = CachedAnswer(
+            question=question,
+            answer=answer,
+            source_ids=list(source_ids),
+            source_versions=versions
+        )
+        embedding = await self._embed(question)
+        self._add(key, entry, embedding)
+
+        while len(self._keys) > self.max_entries:
+            # Вытесняется запись, которая дольше всех не использовалась
+            oldest = min(self._keys, key=lambda k: self._entries[k].last_used)
+            await self.invalidate(oldest)
+
+        client = self._get_redis()
+        if client is None:
+            return
+
+        data = {
+            "question": entry.question,
+            "answer": entry.answer,
+            "source_ids": entry.source_ids,
+            "source_versions": entry.source_versions,
+            "created_at": entry.created_at,
+            "model": self.embedding_service.model_id,
+            "embedding": base64.b64encode(embedding.astype(np.float32).tobytes()).decode(),
+        }
+        try:
+            await client.set(
+                f"{self.REDIS_PREFIX}{key}",
+                json.dumps(data, ensure_ascii=False),
+                ex=self.ttl
+            )
+        except Exception as e:
+            logger.warning(f"Failed to persist answer cache entry: {e}")
+
+    async def invalidate(self, key: str) -> None:
+        """Удаляет запись из памяти и Redis."""
+        if key in self._entries:
+            position = self._keys.index(key)
+            del self._keys[position]
+            del self._entries[key]
+            self._matrix = np.delete(self._matrix, position, axis=0)
+
+        client = self._get_redis()
+        if client is None:
+            return
+
+        try:
+            await client.delete(f"{self.REDIS_PREFIX}{key}")
+        except Exception as e:
+            logger.warning(f"Failed to delete answer cache entry: {e}")
+
+    def clear(self) -> None:
+        """Очищает записи в памяти процесса."""
+        self._keys = []
+        self._entries = {}
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    def _add(self, key: str, entry: CachedAnswer, embedding: np.ndarray) -> None:
+        """Добавляет или заменяет запись в матрице эмбеддингов."""
+        if key in self._entries:
+            position = self._keys.index(key)
+            self._entries[key] = entry
+            self._matrix[position] = embedding
+            return
+
+        self._keys.append(key)
+        self._entries[key] = entry
+        row = embedding.reshape(1, -1)
+        self._matrix = row.copy() if not self._matrix.size else np.vstack([self._matrix, row])
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
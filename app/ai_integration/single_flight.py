@@ -0,0 +1,196 @@
+"""Объединение одинаковых одновременных запросов (single-flight).
+
+Пока первый запрос с данным ключом выполняется, остальные такие же запросы
+не обращаются к внешнему API, а ждут его результата. Внутри процесса
+ожидающие разделяют одну задачу; между процессами бота ведущий запрос
+определяется блокировкой в Redis, а остальные ждут уведомления в канале
+pub/sub и читают результат из общего кеша.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import redis.asyncio as aioredis
+
+from app.monitoring.metrics import SINGLE_FLIGHT_CALLS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Снятие блокировки только её владельцем
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Выполняет не более одного вызова на ключ одновременно.
+
+    ``load`` читает результат, сохранённый ведущим вызовом в общий кеш:
+    через него получают ответ ожидающие в других процессах. Если ведущий
+    завершился ошибкой или не уложился в ``lock_ttl``, ожидающий процесс
+    выполняет вызов сам — объединение запросов никогда не отменяет ответ.
+    """
+
+    # Пауза перед повторным обращением к Redis после ошибки, секунд
+    REDIS_RETRY_INTERVAL = 30.0
+
+    # Ограничение времени операций с блокировкой, секунд
+    REDIS_TIMEOUT = 0.5
+
+    # Период проверки блокировки во время ожидания, секунд
+    POLL_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        name: str,
+        redis_url: Optional[str] = None,
+        lock_ttl: float = 120.0
+    ):
+        self.name = name
+        self.redis_url = redis_url
+        self.lock_ttl = lock_ttl
+
+        self._flights: Dict[str, asyncio.Future] = {}
+        self._redis: Optional[aioredis.Redis] = None
+        self._redis_disabled_until = 0.0
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        if not self.redis_url or time.monotonic() < self._redis_disabled_until:
+            return None
+
+        if self._redis is None:
+            self._redis = aioredis.from_url(
+                self.redis_url,
+                socket_connect_timeout=self.REDIS_TIMEOUT
+            )
+        return self._redis
+
+    def _redis_failed(self, error: Exception) -> None:
+        logger.warning(f"Single-flight '{self.name}': Redis unavailable, coalescing in-process only: {error}")
+        self._redis_disabled_until = time.monotonic() + self.REDIS_RETRY_INTERVAL
+
+    def _lock_key(self, key: str) -> str:
+        return f"singleflight:{self.name}:lock:{key}"
+
+    def _channel(self, key: str) -> str:
+        return f"singleflight:{self.name}:done:{key}"
+
+    async def do(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[T]],
+        load: Callable[[], Awaitable[Optional[T]]]
+    ) -> T:
+        """Выполняет ``call`` или дожидается уже идущего вызова с тем же ключом."""
+        flight = self._flights.get(key)
+        if flight is None:
+            # Вызов выполняется отдельной задачей: отмена одного из ожидающих
+            # (в том числе первого) не прерывает запрос для остальных
+            flight = asyncio.ensure_future(self._do_shared(key, call, load))
+            self._flights[key] = flight
+            flight.add_done_callback(lambda task: self._finish(key, task))
+        else:
+            SINGLE_FLIGHT_CALLS.labels(name=self.name, role="follower").inc()
+
+        return await asyncio.shield(flight)
+
+    def _finish(self, key: str, task: asyncio.Future) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Исключение получают ожидающие; если их не осталось — не шумим в лог
+            task.exception()
+
+    async def _do_shared(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[T]],
+        load: Callable[[], Awaitable[Optional[T]]]
+    ) -> T:
+        """Согласует вызов с другими процессами через блокировку в Redis."""
+        client = self._get_redis()
+        if client is None:
+            SINGLE_FLIGHT_CALLS.labels(name=self.name, role="leader").inc()
+            return await call()
+
+        token = uuid.uuid4().hex
+        try:
+            acquired = await asyncio.wait_for(
+                client.set(self._lock_key(key), token, nx=True, px=int(self.lock_ttl * 1000)),
+                self.REDIS_TIMEOUT
+            )
+        except Exception as e:
+            self._redis_failed(e)
+            SINGLE_FLIGHT_CALLS.labels(name=self.name, role="leader").inc()
+            return await call()
+
+        if acquired:
+            SINGLE_FLIGHT_CALLS.labels(name=self.name, role="leader").inc()
+            try:
+                return await call()
+            finally:
+                await self._release(client, key, token)
+
+        result = await self._wait_remote(client, key, load)
+        if result is not None:
+            SINGLE_FLIGHT_CALLS.labels(name=self.name, role="remote_follower").inc()
+            return result
+
+        # Ведущий процесс не сохранил результат: выполняем вызов сами
+        SINGLE_FLIGHT_CALLS.labels(name=self.name, role="fallback").inc()
+        return await call()
+
+    async def _wait_remote(
+        self,
+        client: aioredis.Redis,
+        key: str,
+        load: Callable[[], Awaitable[Optional[T]]]
+    ) -> Optional[T]:
+        """Ждёт завершения вызова в другом процессе и читает его результат."""
+        deadline = time.monotonic() + self.lock_ttl
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(self._channel(key))
+
+            # Ведущий мог завершиться до подписки на канал
+            result = await load()
+            while result is None and time.monotonic() < deadline:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=self.POLL_INTERVAL
+                )
+                if message is not None or not await client.exists(self._lock_key(key)):
+                    # Уведомление получено или блокировка снята без уведомления
+                    return await load()
+            return result
+        except Exception as e:
+            self._redis_failed(e)
+            return await load()
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+    async def _release(self, client: aioredis.Redis, key: str, token: str) -> None:
+        """Снимает блокировку и уведомляет ожидающие процессы."""
+        try:
+            await asyncio.wait_for(
+                client.eval(_RELEASE_SCRIPT, 1, self._lock_key(key), token),
+                self.REDIS_TIMEOUT
+            )
+            await asyncio.wait_for(client.publish(self._channel(key), b"1"), self.REDIS_TIMEOUT)
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def close(self) -> None:
+        """Закрывает соединение с Redis."""
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
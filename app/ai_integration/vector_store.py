@@ -1,224 +1,765 @@
-from typing import List, Dict, Optional, Any
+from typing import Iterable, Iterator, List, Dict, Optional, Any, Set, Tuple
+import json
+import logging
 import numpy as np
 import faiss
 import pickle
 import os
 from pathlib import Path
 
+from app.ai_integration.ann_index import (
+    INDEX_TIERS,
+    ANNParams,
+    build_index,
+    create_index,
+    index_type_of,
+    needs_retrain,
+    search_params,
+    supports_removal,
+)
 from app.ai_integration.embeddings import EmbeddingService
+from app.ai_integration.index_lock import IndexLock, IndexLockedError
+from app.ai_integration.lexical_index import LexicalIndex
+from app.ai_integration.segment_store import SegmentStore
+
+logger = logging.getLogger(__name__)
 
 
 class VectorStore:
-    """Векторное хранилище для поиска похожих документов."""
-    
-    def __init__(self, dimension: int = 384, index_path: str = "data/vector_index"):
+    """Векторное хранилище для поиска похожих документов.
+
+    Тексты и метаданные фрагментов хранятся в append-only ``SegmentStore``,
+    векторы — в FAISS-индексе с идентификаторами фрагментов (``IndexIDMap2``).
+    Тип индекса (точный, HNSW или IVF-PQ) выбирается по числу векторов
+    и повышается по мере роста корпуса (см. ``ann_index``).
+    Параллельно ведётся лексический BM25-индекс тех же фрагментов
+    (``LexicalIndex``), который обновляется и сохраняется вместе с FAISS.
+
+    Поля документа (категория, тип, доступность) хранятся в манифесте по
+    источникам. Поиск с фильтром по ним отбирает фрагменты до поиска:
+    битовые карты допустимых идентификаторов строятся по диапазонам
+    манифеста, кешируются по значениям полей и передаются в FAISS
+    как ``IDSelectorBitmap``.
+
+    Каталог индекса может обновлять и другой процесс (ночная
+    переиндексация): изменения выполняются под ``write_lock``, а перед
+    ними состояние перечитывается с диска через ``reload_if_changed``.
+    """
+
+    INDEX_FILE = "faiss_index.bin"
+    MANIFEST_FILE = "manifest.json"
+    TOMBSTONES_FILE = "tombstones.ids"
+    LOCK_FILE = "index.lock"
+
+    # Значения полей для файлов, не зарегистрированных в базе, — как у модели Document
+    DOCUMENT_DEFAULTS: Dict[str, Any] = {'is_public': True}
+
+    def __init__(
+        self,
+        dimension: int = 384,
+        index_path: str = "data/vector_index",
+        embedding_service: Optional[EmbeddingService] = None,
+        compaction_threshold: float = 0.2,
+        ann_params: Optional[ANNParams] = None
+    ):
         self.dimension = dimension
         self.index_path = Path(index_path)
         self.index_path.mkdir(parents=True, exist_ok=True)
-        
-        self.embedding_service = EmbeddingService()
+        self.compaction_threshold = compaction_threshold
+        self.ann_params = ann_params or ANNParams()
+
+        self.embedding_service = embedding_service or EmbeddingService()
+        self.tombstones_file = self.index_path / self.TOMBSTONES_FILE
+        self.write_lock = IndexLock(self.index_path / self.LOCK_FILE)
+        self.segments: Optional[SegmentStore] = None
+
+        # Пока каталог обновляет другой процесс, хранилище загружается только
+        # для чтения, а недостающее достраивается в памяти
+        with self.write_lock.hold(wait=False) as locked:
+            self._load(writable=locked)
+
+    def _load(self, writable: bool = True) -> None:
+        """Загружает индекс, фрагменты, лексический индекс и манифест с диска.
+
+        Миграция старого формата и досохранение лексического индекса
+        и манифеста выполняются только с ``writable`` — под ``write_lock``.
+        """
+        if self.segments is not None:
+            self.segments.close()
+
         self.index: Optional[faiss.Index] = None
-        self.documents: List[Dict[str, Any]] = []
-        self.metadata: List[Dict[str, Any]] = []
-        
-        self._load_index()
-    
-    def _load_index(self) -> None:
+        self.segments = SegmentStore(self.index_path)
+        self.lexical = LexicalIndex(self.index_path)
+        self._needs_recovery = False
+
+        # Удалённые, но ещё не вычищенные компактизацией фрагменты
+        self._tombstones: Set[int] = self._load_tombstones()
+
+        # Манифест источников: диапазоны идентификаторов фрагментов по файлам
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+        # Битовые карты фрагментов по значениям полей документа
+        self._filter_bitmaps: Dict[Tuple[str, Any], np.ndarray] = {}
+
+        self._load_index(writable)
+        self._load_manifest(writable)
+        self._sync_lexical(writable)
+        self._disk_state = self._read_disk_state()
+
+    def _read_disk_state(self) -> Tuple[Tuple[int, int], ...]:
+        """Время изменения и размер сохранённых индекса и манифеста."""
+        state = []
+        for name in (self.INDEX_FILE, self.MANIFEST_FILE):
+            path = self.index_path / name
+            if path.exists():
+                stat = path.stat()
+                state.append((stat.st_mtime_ns, stat.st_size))
+            else:
+                state.append((0, 0))
+        return tuple(state)
+
+    def reload_if_changed(self) -> bool:
+        """Перечитывает хранилище, если другой процесс сохранил его после нас.
+
+        Вызывается под ``write_lock`` перед изменениями, чтобы сохранение
+        не затёрло чужие результаты устаревшим состоянием из памяти.
+        """
+        if self._read_disk_state() == self._disk_state:
+            return False
+
+        self._load()
+        logger.info("Reloaded vector store changed by another process")
+        return True
+
+    def _load_index(self, writable: bool = True) -> None:
         """Загружает индекс из файла."""
-        index_file = self.index_path / "faiss_index.bin"
-        docs_file = self.index_path / "documents.pkl"
-        meta_file = self.index_path / "metadata.pkl"
-        
-        if index_file.exists() and docs_file.exists() and meta_file.exists():
+        index_file = self.index_path / self.INDEX_FILE
+
+        if (self.index_path / "documents.pkl").exists() and not len(self.segments):
+            if writable:
+                self._migrate_legacy_index()
+            else:
+                # Индекс переносит процесс, владеющий блокировкой
+                logger.info("Legacy index migration postponed: index is locked by another process")
+                self._create_new_index()
+            return
+
+        if index_file.exists():
             try:
-                # Загружаем FAISS индекс
+                # Индекс читается в память целиком: с IO_FLAG_MMAP векторы
+                # точного и HNSW-индексов всё равно копируются, а списки IVF
+                # открываются только для чтения и не принимают новые векторы
                 self.index = faiss.read_index(str(index_file))
-                
-                # Загружаем документы
-                with open(docs_file, 'rb') as f:
-                    self.documents = pickle.load(f)
-                
-                # Загружаем метаданные
-                with open(meta_file, 'rb') as f:
-                    self.metadata = pickle.load(f)
-                
-                print(f"Loaded vector index with {len(self.documents)} documents")
-                
+                if self._tombstones and supports_removal(self.index):
+                    # Индекс мог быть сохранён до фиксации удаления
+                    self.index.remove_ids(np.fromiter(self._tombstones, dtype='int64'))
+                # Фрагменты, дописанные после последнего сохранения индекса,
+                # доиндексируются при первом обращении
+                self._needs_recovery = self.index.ntotal < len(self.segments)
+                print(f"Loaded vector index with {len(self.segments)} documents")
+                return
+
             except Exception as e:
                 print(f"Error loading index: {e}")
-                self._create_new_index()
-        else:
+
+        self._create_new_index()
+        self._needs_recovery = len(self.segments) > len(self._tombstones)
+
+    async def _recover_missing(self) -> None:
+        """Добавляет в индекс фрагменты, отсутствующие в сохранённом индексе."""
+        self._needs_recovery = False
+        indexed = faiss.vector_to_array(self.index.id_map)
+        missing = np.setdiff1d(np.asarray(self.segments.chunk_ids), indexed)
+        if self._tombstones:
+            missing = np.setdiff1d(missing, np.fromiter(self._tombstones, dtype='int64'))
+        if not len(missing):
+            return
+
+        texts = self.segments.get_texts(missing.tolist())
+        embeddings = await self.embedding_service.encode_batch(texts)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        self.index.add_with_ids(embeddings.astype('float32'), missing.astype('int64'))
+        self._maybe_upgrade_index()
+
+        # Манифест сохраняется вместе с индексом — восстанавливаем и его
+        known = {chunk_id for entry in self.manifest for chunk_id in self._source_chunk_ids(entry)}
+        for chunk_id in missing.tolist():
+            if chunk_id not in known:
+                self._manifest_add(self.segments.get(chunk_id)[1].get('source'), [chunk_id])
+        print(f"Recovered {len(missing)} documents missing from vector index")
+
+        # Занятая блокировка означает, что индекс сохранит её владелец
+        try:
+            await self.write_lock.acquire(wait=False)
+        except IndexLockedError:
+            return
+        try:
+            if self._read_disk_state() == self._disk_state:
+                self._save_index()
+        finally:
+            self.write_lock.release()
+
+    def _sync_lexical(self, writable: bool = True) -> None:
+        """Доиндексирует в лексическом индексе фрагменты, записанные после его сохранения.
+
+        Лексический индекс строится по текстам без эмбеддингов, поэтому
+        для существующих хранилищ он создаётся при первой загрузке.
+        """
+        if self._tombstones:
+            self.lexical.remove(self._tombstones)
+
+        start = int(np.searchsorted(self.segments.chunk_ids, self.lexical.next_id))
+        if start < len(self.segments):
+            self.lexical.add(
+                (chunk_id, self.segments.get_text(pos))
+                for pos, chunk_id in enumerate(self.segments.chunk_ids[start:].tolist(), start)
+                if chunk_id not in self._tombstones
+            )
+            print(f"Added {len(self.segments) - start} documents to lexical index")
+
+        if self.lexical.is_dirty and writable:
+            self.lexical.save()
+
+    def _migrate_legacy_index(self) -> None:
+        """Переносит индекс из старого формата (pickle-списки) в сегментное хранилище."""
+        index_file = self.index_path / self.INDEX_FILE
+        docs_file = self.index_path / "documents.pkl"
+        meta_file = self.index_path / "metadata.pkl"
+
+        try:
+            legacy_index = faiss.read_index(str(index_file))
+            with open(docs_file, 'rb') as f:
+                documents = pickle.load(f)
+            with open(meta_file, 'rb') as f:
+                metadata = pickle.load(f)
+
+            # Векторы берём из старого плоского индекса — повторный расчёт не нужен
+            vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal)
+            ids = np.arange(len(documents), dtype='int64')
+
+            self.index = build_index(vectors, ids, self.dimension, self.ann_params)
+            self.segments.append(
+                (int(chunk_id), text, self._strip_legacy_metadata(meta))
+                for chunk_id, text, meta in zip(ids, documents, metadata)
+            )
+            for chunk_id, meta in zip(ids.tolist(), metadata):
+                self._manifest_add(meta.get('source'), [chunk_id])
+            self._save_index()
+
+            docs_file.unlink()
+            meta_file.unlink()
+            print(f"Migrated legacy vector index with {len(documents)} documents")
+
+        except Exception as e:
+            print(f"Error migrating legacy index: {e}")
             self._create_new_index()
-    
+
+    @staticmethod
+    def _strip_legacy_metadata(meta: Dict[str, Any]) -> Dict[str, Any]:
+        """Убирает из старых метаданных текст и позицию, хранимые теперь отдельно."""
+        return {k: v for k, v in meta.items() if k not in ('text', 'index')}
+
     def _create_new_index(self) -> None:
         """Создает новый индекс."""
-        # Используем IndexFlatIP для косинусного сходства
-        self.index = faiss.IndexFlatIP(self.dimension)
-        self.documents = []
-        self.metadata = []
-        print("Created new vector index")
-    
+        # Скалярное произведение нормированных векторов — косинусное сходство;
+        # векторы адресуются идентификаторами фрагментов из сегментного хранилища
+        index_type = self.ann_params.select_type(0)
+        self.index = create_index(index_type, self.dimension, self.ann_params)
+        print(f"Created new vector index ({index_type})")
+
+    def _live_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Векторы и идентификаторы индекса без удалённых фрагментов."""
+        ids = faiss.vector_to_array(self.index.id_map).astype('int64')
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        if self._tombstones:
+            live = ~np.isin(ids, np.fromiter(self._tombstones, dtype='int64'))
+            ids, vectors = ids[live], vectors[live]
+        return vectors, ids
+
+    def _maybe_upgrade_index(self) -> bool:
+        """Переводит индекс на следующий уровень, когда корпус перерос текущий.
+
+        Точный и HNSW-индексы хранят векторы без потерь, поэтому новый индекс
+        строится (и обучается) по ним без повторного расчёта эмбеддингов.
+        """
+        current = index_type_of(self.index)
+        vector_count = self.index.ntotal
+        if not supports_removal(self.index):
+            vector_count -= len(self._tombstones)
+        target = self.ann_params.select_type(vector_count)
+        if INDEX_TIERS.index(target) <= INDEX_TIERS.index(current):
+            return False
+
+        vectors, ids = self._live_vectors()
+        self.index = build_index(vectors, ids, self.dimension, self.ann_params, index_type=target)
+        print(f"Vector index upgraded from {current} to {target} ({len(ids)} vectors)")
+        return True
+
+    @property
+    def needs_retrain(self) -> bool:
+        """IVF-индекс обучен на корпусе, многократно меньшем текущего."""
+        return needs_retrain(self.index)
+
+    async def retrain(self) -> None:
+        """Переобучает индекс на пересчитанных эмбеддингах всего корпуса.
+
+        Векторы IVF-PQ хранятся сжатыми, поэтому для нового обучения
+        эмбеддинги рассчитываются заново.
+        """
+        await self._rebuild_index()
+
     def _save_index(self) -> None:
         """Сохраняет индекс в файл."""
         try:
-            index_file = self.index_path / "faiss_index.bin"
-            docs_file = self.index_path / "documents.pkl"
-            meta_file = self.index_path / "metadata.pkl"
-            
-            # Сохраняем FAISS индекс
-            faiss.write_index(self.index, str(index_file))
-            
-            # Сохраняем документы
-            with open(docs_file, 'wb') as f:
-                pickle.dump(self.documents, f)
-            
-            # Сохраняем метаданные
-            with open(meta_file, 'wb') as f:
-                pickle.dump(self.metadata, f)
-            
-            print(f"Saved vector index with {len(self.documents)} documents")
-            
+            index_file = self.index_path / self.INDEX_FILE
+            tmp_file = self.index_path / (self.INDEX_FILE + ".tmp")
+
+            # Записываем во временный файл и атомарно подменяем
+            faiss.write_index(self.index, str(tmp_file))
+            os.replace(tmp_file, index_file)
+            self.lexical.save()
+            self._save_manifest()
+            self._disk_state = self._read_disk_state()
+
+            print(f"Saved vector index with {len(self.segments)} documents")
+
         except Exception as e:
             print(f"Error saving index: {e}")
-    
+
+    def save(self) -> None:
+        """Фиксирует изменения индекса на диске и при необходимости компактизирует хранилище."""
+        if not self.maybe_compact():
+            self._save_index()
+
+    def _load_tombstones(self) -> Set[int]:
+        """Загружает идентификаторы удалённых фрагментов."""
+        if not self.tombstones_file.exists():
+            return set()
+        return set(np.fromfile(self.tombstones_file, dtype='<i8').tolist())
+
+    def _append_tombstones(self, ids: np.ndarray) -> None:
+        """Дописывает идентификаторы удалённых фрагментов."""
+        with open(self.tombstones_file, 'ab') as f:
+            f.write(ids.astype('<i8').tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._tombstones.update(ids.tolist())
+
+    def _load_manifest(self, writable: bool = True) -> None:
+        """Загружает манифест источников или строит его по сегментам."""
+        manifest_file = self.index_path / self.MANIFEST_FILE
+        if manifest_file.exists():
+            try:
+                with open(manifest_file, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)['sources']
+                return
+            except Exception as e:
+                print(f"Error loading manifest: {e}")
+
+        # Однократный проход по сегментам для хранилищ без манифеста
+        self.manifest = {}
+        for chunk_id, _, meta in self.segments.iter_records():
+            if chunk_id not in self._tombstones:
+                self._manifest_add(meta.get('source'), [chunk_id])
+        if writable:
+            self._save_manifest()
+
+    def _save_manifest(self) -> None:
+        """Атомарно сохраняет манифест источников."""
+        manifest_file = self.index_path / self.MANIFEST_FILE
+        tmp_file = self.index_path / (self.MANIFEST_FILE + ".tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'sources': self.manifest}, f, ensure_ascii=False)
+        os.replace(tmp_file, manifest_file)
+
+    def _manifest_add(self, source: Optional[str], chunk_ids: List[int]) -> None:
+        """Добавляет идентификаторы фрагментов источника в манифест."""
+        self._filter_bitmaps.clear()
+        ranges = self.manifest.setdefault(source or "", {}).setdefault('ranges', [])
+        for chunk_id in chunk_ids:
+            # Фрагменты источника добавляются подряд — храним их диапазонами
+            if ranges and ranges[-1][1] == chunk_id:
+                ranges[-1][1] = chunk_id + 1
+            else:
+                ranges.append([chunk_id, chunk_id + 1])
+
+    def get_source_hash(self, source: str) -> Optional[str]:
+        """Возвращает хэш содержимого, с которым источник был проиндексирован."""
+        return self.manifest.get(source, {}).get('content_hash')
+
+    def set_source_hash(self, source: str, content_hash: str) -> None:
+        """Запоминает хэш содержимого проиндексированного источника."""
+        self.manifest.setdefault(source, {}).setdefault('ranges', [])
+        self.manifest[source]['content_hash'] = content_hash
+
+    def get_source_document(self, source: str) -> Optional[Dict[str, Any]]:
+        """Возвращает поля документа, с которыми источник проиндексирован."""
+        return self.manifest.get(source, {}).get('document')
+
+    def set_source_document(self, source: str, document: Dict[str, Any]) -> None:
+        """Запоминает поля документа источника (id, категория, тип, доступность, версия)."""
+        self.manifest.setdefault(source, {}).setdefault('ranges', [])
+        self.manifest[source]['document'] = document
+        self._filter_bitmaps.clear()
+
+    def filter_bitmap(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Битовая карта фрагментов, документы которых подходят под фильтр.
+
+        ``filters`` сопоставляет полю документа допустимое значение или список
+        значений: значения одного поля объединяются, поля — пересекаются.
+        """
+        bitmap = np.ones(self.segments.next_id, dtype=bool)
+        for field, values in filters.items():
+            if not isinstance(values, (list, tuple, set, frozenset)):
+                values = [values]
+            allowed = np.zeros(self.segments.next_id, dtype=bool)
+            for value in values:
+                allowed |= self._field_bitmap(field, value)
+            bitmap &= allowed
+        return bitmap
+
+    def _field_bitmap(self, field: str, value: Any) -> np.ndarray:
+        """Фрагменты документов, у которых поле ``field`` равно ``value``."""
+        key = (field, value)
+        bitmap = self._filter_bitmaps.get(key)
+        if bitmap is not None and len(bitmap) == self.segments.next_id:
+            return bitmap
+
+        bitmap = np.zeros(self.segments.next_id, dtype=bool)
+        for entry in self.manifest.values():
+            document = {**self.DOCUMENT_DEFAULTS, **entry.get('document', {})}
+            if document.get(field) == value:
+                for start, end in entry.get('ranges', []):
+                    bitmap[start:end] = True
+        self._filter_bitmaps[key] = bitmap
+        return bitmap
+
+    def chunks_match(self, chunk_ids: List[int], filters: Optional[Dict[str, Any]]) -> bool:
+        """Проверяет, что все фрагменты проходят фильтр."""
+        if not filters:
+            return True
+        bitmap = self.filter_bitmap(filters)
+        return all(0 <= chunk_id < len(bitmap) and bitmap[chunk_id] for chunk_id in chunk_ids)
+
+    def source_versions(self, chunk_ids: List[int]) -> Optional[Dict[str, str]]:
+        """Хэши содержимого источников фрагментов; ``None``, если фрагмент удалён.
+
+        По ним проверяется, что документы, на которых основан ответ из кеша,
+        не переиндексированы с другим содержимым.
+        """
+        versions = {}
+        for chunk_id in chunk_ids:
+            position = None if chunk_id in self._tombstones else self.segments.position(chunk_id)
+            if position is None:
+                return None
+            source = self.segments.get_metadata(position).get('source') or ""
+            versions[source] = self.get_source_hash(source) or ""
+        return versions
+
+    def _source_chunk_ids(self, source: Optional[str]) -> Iterator[int]:
+        """Идентификаторы фрагментов источника по манифесту."""
+        for start, end in self.manifest.get(source or "", {}).get('ranges', []):
+            yield from range(start, end)
+
     async def add_documents(
-        self, 
-        texts: List[str], 
+        self,
+        texts: List[str],
         metadata: List[Dict[str, Any]] = None,
-        source: str = None
-    ) -> None:
-        """Добавляет документы в векторное хранилище."""
+        source: str = None,
+        commit: bool = True
+    ) -> List[int]:
+        """Добавляет документы в векторное хранилище.
+
+        Тексты и метаданные дописываются в сегментное хранилище; при
+        ``commit=False`` индекс не сохраняется на диск до вызова ``save()``.
+        Возвращает идентификаторы добавленных фрагментов.
+        """
         if not texts:
-            return
-        
+            return []
+
         if metadata is None:
             metadata = [{}] * len(texts)
-        
+
         if len(texts) != len(metadata):
             raise ValueError("Количество текстов и метаданных должно совпадать")
-        
+
+        if self._needs_recovery:
+            await self._recover_missing()
+
         # Генерируем эмбеддинги
         embeddings = await self.embedding_service.encode_batch(texts)
-        
+
         # Нормализуем эмбеддинги для косинусного сходства
         embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-        
-        # Добавляем в индекс
-        self.index.add(embeddings.astype('float32'))
-        
-        # Сохраняем документы и метаданные
-        for i, (text, meta) in enumerate(zip(texts, metadata)):
-            doc_meta = {
-                'text': text,
-                'source': source,
-                'index': len(self.documents),
-                **meta
-            }
-            
-            self.documents.append(text)
-            self.metadata.append(doc_meta)
-        
-        # Сохраняем индекс
-        self._save_index()
-        
+
+        start_id = self.segments.next_id
+        ids = np.arange(start_id, start_id + len(texts), dtype='int64')
+
+        # Сначала дописываем фрагменты, затем добавляем векторы в индекс
+        self.segments.append(
+            (int(chunk_id), text, {'source': source, **meta})
+            for chunk_id, text, meta in zip(ids, texts, metadata)
+        )
+        self.index.add_with_ids(embeddings.astype('float32'), ids)
+        self._maybe_upgrade_index()
+        self.lexical.add(zip(ids.tolist(), texts))
+        for chunk_id, meta in zip(ids.tolist(), metadata):
+            self._manifest_add(meta.get('source', source), [chunk_id])
+
+        if commit:
+            self._save_index()
+
         print(f"Added {len(texts)} documents to vector store")
-    
+        return ids.tolist()
+
     async def search(
-        self, 
-        query: str, 
+        self,
+        query: str,
         top_k: int = 5,
-        score_threshold: float = 0.5
+        score_threshold: float = 0.5,
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
-        """Ищет похожие документы."""
-        if not self.index or len(self.documents) == 0:
+        """Ищет похожие документы; ``filters`` ограничивает поиск полями документа."""
+        if self._needs_recovery:
+            await self._recover_missing()
+
+        if not self.index or self.index.ntotal == 0:
+            return []
+
+        if filters and not self.filter_bitmap(filters).any():
             return []
-        
+
         # Генерируем эмбеддинг для запроса
-        query_embedding = await self.embedding_service.encode(query)
+        query_embedding = await self.embedding_service.encode_cached(query)
         query_embedding = query_embedding / np.linalg.norm(query_embedding)
-        
-        # Поиск в индексе
-        scores, indices = self.index.search(
-            query_embedding.reshape(1, -1).astype('float32'), 
-            min(top_k, len(self.documents))
+
+        return self._search_vectors(
+            query_embedding.reshape(1, -1), top_k, score_threshold, filters
+        )[0]
+
+    async def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        score_threshold: float = 0.5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Ищет похожие документы для списка запросов.
+
+        Эмбеддинги всех запросов считаются одной пачкой, поиск выполняется
+        одним вызовом ``index.search`` по матрице запросов — FAISS
+        распараллеливает его по запросам. Результаты — в порядке ``queries``.
+        """
+        if self._needs_recovery:
+            await self._recover_missing()
+
+        if not queries:
+            return []
+        if not self.index or self.index.ntotal == 0:
+            return [[] for _ in queries]
+        if filters and not self.filter_bitmap(filters).any():
+            return [[] for _ in queries]
+
+        embeddings = await self.embedding_service.encode_batch(queries)
+        embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+        return self._search_vectors(embeddings, top_k, score_threshold, filters)
+
+    def _search_vectors(
+        self,
+        embeddings: np.ndarray,
+        top_k: int,
+        score_threshold: float,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Поиск по нормированным эмбеддингам запросов — по списку результатов на строку."""
+        # Фильтр применяется внутри поиска: FAISS обходит только допустимые
+        # фрагменты и возвращает k лучших из них
+        selector = None
+        if filters:
+            selector = self._bitmap_selector(self.filter_bitmap(filters))
+        elif self._tombstones and not supports_removal(self.index):
+            # Векторы удалённых фрагментов остаются в графе HNSW до компактизации
+            selector = faiss.IDSelectorNot(
+                faiss.IDSelectorBatch(np.fromiter(self._tombstones, dtype='int64'))
+            )
+
+        k = min(top_k, self.index.ntotal)
+        scores, ids = self.index.search(
+            np.ascontiguousarray(embeddings, dtype='float32'),
+            k,
+            params=search_params(self.index, self.ann_params, k, selector=selector)
         )
-        
+
+        return [
+            self._build_results(
+                (int(chunk_id), float(score))
+                for score, chunk_id in zip(row_scores, row_ids)
+                if chunk_id != -1 and score >= score_threshold
+            )
+            for row_scores, row_ids in zip(scores, ids)
+        ]
+
+    def lexical_search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Ищет фрагменты по совпадению терминов запроса (BM25)."""
+        allowed = self.filter_bitmap(filters) if filters else None
+        return self._build_results(self.lexical.search(query, top_k=top_k, allowed=allowed))
+
+    @staticmethod
+    def _bitmap_selector(bitmap: np.ndarray) -> faiss.IDSelector:
+        """Селектор FAISS по битовой карте идентификаторов."""
+        packed = np.packbits(bitmap, bitorder='little')
+        # Размер карты передаётся в байтах: идентификаторы за её концом не допускаются
+        selector = faiss.IDSelectorBitmap(len(packed), faiss.swig_ptr(packed))
+        # Селектор хранит указатель на массив — массив должен жить вместе с ним
+        selector.bitmap_ref = packed
+        return selector
+
+    def _build_results(self, hits: Iterable[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Дополняет найденные идентификаторы текстами и метаданными фрагментов."""
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx != -1 and score >= score_threshold:
-                result = {
-                    'content': self.documents[idx],
-                    'score': float(score),
-                    'metadata': self.metadata[idx]
-                }
-                results.append(result)
-        
+        for chunk_id, score in hits:
+            record = self.segments.get(chunk_id)
+            if record is None:
+                continue
+            text, meta = record
+            # Поля документа из манифеста актуальнее записанных при индексации
+            document = self.get_source_document(meta.get('source') or "") or {}
+            results.append({
+                'content': text,
+                'score': score,
+                'metadata': {**meta, **document, 'chunk_id': chunk_id}
+            })
+
         return results
-    
+
     async def add_document(self, text: str, metadata: Dict[str, Any] = None) -> None:
         """Добавляет один документ."""
         await self.add_documents([text], [metadata or {}])
-    
-    async def delete_documents_by_source(self, source: str) -> int:
-        """Удаляет документы по источнику."""
-        indices_to_remove = []
-        
-        for i, meta in enumerate(self.metadata):
-            if meta.get('source') == source:
-                indices_to_remove.append(i)
-        
-        if not indices_to_remove:
+
+    async def delete_documents_by_source(self, source: str, commit: bool = True) -> int:
+        """Удаляет документы по источнику.
+
+        Векторы удаляются из индекса по идентификаторам, фрагменты помечаются
+        удалёнными (tombstone) — повторный расчёт эмбеддингов не требуется.
+        """
+        removed = [
+            chunk_id for chunk_id in self._source_chunk_ids(source)
+            if chunk_id not in self._tombstones
+        ]
+        self.manifest.pop(source or "", None)
+        self._filter_bitmaps.clear()
+
+        if not removed:
             return 0
-        
-        # Удаляем из списков (в обратном порядке для сохранения индексов)
-        for i in sorted(indices_to_remove, reverse=True):
-            del self.documents[i]
-            del self.metadata[i]
-        
-        # Пересоздаем индекс
-        await self._rebuild_index()
-        
-        return len(indices_to_remove)
-    
+
+        ids = np.asarray(removed, dtype='int64')
+
+        # Сначала фиксируем tombstone-записи, затем удаляем векторы из индекса
+        self._append_tombstones(ids)
+        if supports_removal(self.index):
+            self.index.remove_ids(ids)
+        self.lexical.remove(removed)
+
+        # Компактизация переписывает сегменты — только вместе с сохранением индекса
+        if commit:
+            self.save()
+
+        return len(removed)
+
+    def maybe_compact(self) -> bool:
+        """Запускает компактизацию, если доля удалённых фрагментов превышает порог."""
+        if not self._tombstones or not len(self.segments):
+            return False
+
+        if len(self._tombstones) / len(self.segments) < self.compaction_threshold:
+            return False
+
+        self.compact()
+        return True
+
+    def compact(self) -> None:
+        """Переписывает сегментное хранилище без удалённых фрагментов.
+
+        Идентификаторы живых фрагментов сохраняются, поэтому FAISS-индекс
+        не перестраивается; граф HNSW, не умеющий удалять векторы,
+        пересобирается из оставшихся векторов.
+
+        Индекс, лексический индекс и манифест сохраняются до перезаписи
+        сегментов и удаления tombstone-записей: после сбоя на любом шаге
+        на диске нет векторов, указывающих на отсутствующие фрагменты.
+        """
+        removed = len(self._tombstones)
+        tombstones = self._tombstones
+        if not supports_removal(self.index):
+            vectors, ids = self._live_vectors()
+            self.index = build_index(
+                vectors, ids, self.dimension, self.ann_params,
+                index_type=index_type_of(self.index)
+            )
+        self._save_index()
+        self.segments.rewrite(
+            record for record in self.segments.iter_records()
+            if record[0] not in tombstones
+        )
+
+        self._tombstones = set()
+        self.tombstones_file.unlink(missing_ok=True)
+
+        print(f"Compacted vector store, dropped {removed} deleted documents")
+
     async def _rebuild_index(self) -> None:
         """Пересоздает индекс из существующих документов."""
-        if not self.documents:
-            self._create_new_index()
+        # Старый индекс не нужен — компактизация не должна пересобирать его граф
+        self._create_new_index()
+        self.compact()
+
+        if not len(self.segments):
             self._save_index()
             return
-        
-        # Генерируем эмбеддинги для всех документов
-        embeddings = await self.embedding_service.encode_batch(self.documents)
+
+        # Генерируем эмбеддинги для всех документов; тип индекса выбирается
+        # по размеру корпуса, IVF-PQ обучается на новых векторах
+        ids = np.asarray(self.segments.chunk_ids, dtype='int64')
+        texts = [text for _, text, _ in self.segments.iter_records()]
+        embeddings = await self.embedding_service.encode_batch(texts)
         embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-        
-        # Создаем новый индекс
-        self._create_new_index()
-        self.index.add(embeddings.astype('float32'))
-        
-        # Обновляем индексы в метаданных
-        for i, meta in enumerate(self.metadata):
-            meta['index'] = i
-        
+
+        self.index = build_index(embeddings, ids, self.dimension, self.ann_params)
+
         self._save_index()
-        print(f"Rebuilt index with {len(self.documents)} documents")
-    
+        print(f"Rebuilt index with {len(self.segments)} documents")
+
     def get_stats(self) -> Dict[str, Any]:
         """Возвращает статистику векторного хранилища."""
         return {
-            'total_documents': len(self.documents),
+            'total_documents': len(self.segments) - len(self._tombstones),
+            'deleted_documents': len(self._tombstones),
             'dimension': self.dimension,
             'index_size': self.index.ntotal if self.index else 0,
-            'sources': list(set(meta.get('source', 'unknown') for meta in self.metadata))
+            'index_type': index_type_of(self.index) if self.index else None,
+            'lexical_index_size': len(self.lexical),
+            'sources': [source or 'unknown' for source in self.manifest]
         }
-    
+
     async def update_embeddings(self) -> None:
         """Обновляет эмбеддинги для всех документов."""
-        if self.documents:
+        if len(self.segments):
             await self._rebuild_index()
             print("Updated embeddings for all documents")
-    
+
     def clear(self) -> None:
         """Очищает векторное хранилище."""
+        self.segments.rewrite([])
+        self._tombstones = set()
+        self.tombstones_file.unlink(missing_ok=True)
+        self.manifest = {}
+        self._filter_bitmaps.clear()
+        self.lexical.clear()
         self._create_new_index()
         self._save_index()
         print("Cleared vector store")
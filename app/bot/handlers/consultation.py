@@ -1,14 +1,33 @@
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
 from aiogram import Router, types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters import Command
 
-from app.services.ai_service import AIService
-from app.services.document_service import DocumentService
+from config.settings import config
+from app.ai_integration.rate_governor import PRIORITY_DEFAULT, PRIORITY_MEMBER, set_request_priority
+from app.services.ai_runtime import AIRuntime
 
 router = Router()
 
+# Максимальная длина текста сообщения в Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Маркер, показывающий, что ответ ещё генерируется
+STREAM_CURSOR = " ▌"
+# Попыток отправить итоговый текст при превышении лимита Telegram
+FINAL_SEND_ATTEMPTS = 3
+# Документы, доступные не членам СРО
+PUBLIC_DOCUMENTS = {"is_public": True}
+
 
 @router.message(Command(commands=['question']))
-async def cmd_question(message: types.Message) -> None:
+async def cmd_question(
+    message: types.Message,
+    ai_runtime: AIRuntime,
+    is_member: bool = False
+) -> None:
     """Обработчик консультационных вопросов."""
     if not message.text or len(message.text.split()) < 2:
         await message.answer(
@@ -16,31 +35,75 @@ async def cmd_question(message: types.Message) -> None:
             "Пример: /question Какие требования к членству в СРО?"
         )
         return
-    
+
     question = " ".join(message.text.split()[1:])
-    
+
+    # При очереди к DeepSeek члены СРО обслуживаются первыми
+    set_request_priority(PRIORITY_MEMBER if is_member else PRIORITY_DEFAULT)
+    # Документы только для членов СРО в ответах остальным не используются
+    filters = None if is_member else PUBLIC_DOCUMENTS
+
     # Показываем, что бот думает
     typing_message = await message.answer("🤔 Ищу информацию...")
-    
+
+    # Сразу после запуска модель и индекс ещё могут загружаться
+    if not await ai_runtime.wait_ready(timeout=config.ai.warmup_wait):
+        await typing_message.edit_text(
+            "⏳ ИИ-консультант ещё запускается. Повторите вопрос через минуту."
+        )
+        return
+
     try:
-        ai_service = AIService()
-        document_service = DocumentService()
-        
-        # Поиск релевантных документов
-        context = await document_service.search_relevant_content(question)
+        # Сервисы общие для процесса и создаются при старте приложения
+        ai_service = ai_runtime.ai_service
+        document_service = ai_runtime.document_service
+
+        # Ответ на близкий по смыслу вопрос из семантического кеша — без поиска
+        cached = await ai_service.cached_consultation_response(
+            user_question=question,
+            user_id=message.from_user.id,
+            filters=filters
+        )
+        if cached is not None:
+            await _show_final_text(message, typing_message, cached)
+            return
+
+        # Поиск релевантных документов; найденные фрагменты связывают
+        # кешированный ответ с его источниками
+        results = await document_service.search_relevant_chunks(question, filters=filters)
+        context = document_service.build_context(results)
         if not context:
             await typing_message.edit_text("📭 Не удалось найти релевантные документы.")
             return
-            
+
+        if config.ai.streaming:
+            # Ответ показывается по мере генерации
+            await _stream_to_message(
+                message,
+                typing_message,
+                ai_service.stream_consultation_response(
+                    user_question=question,
+                    user_id=message.from_user.id,
+                    context=context,
+                    chunks=results,
+                    filters=filters,
+                    check_cache=False
+                )
+            )
+            return
+
         # Генерация ответа с помощью ИИ
         response = await ai_service.generate_consultation_response(
             user_question=question,
             user_id=message.from_user.id,
-            context=context
+            context=context,
+            chunks=results,
+            filters=filters,
+            check_cache=False
         )
-        
+
         await typing_message.edit_text(response)
-        
+
     except Exception as e:
         await typing_message.edit_text(
             "❌ Произошла ошибка при обработке запроса. "
@@ -48,9 +111,91 @@ async def cmd_question(message: types.Message) -> None:
         )
 
 
+async def _stream_to_message(
+    message: types.Message,
+    typing_message: types.Message,
+    chunks: AsyncIterator[str]
+) -> None:
+    """Показывает потоковый ответ, редактируя сообщение с ограничением частоты.
+
+    Telegram ограничивает частоту правок сообщений в чате, поэтому промежуточные
+    правки выполняются не чаще, чем раз в ``config.ai.stream_edit_interval``
+    секунд. Первая правка делается сразу после получения первого фрагмента.
+    """
+    parts = []
+    shown = ""
+    next_edit_at = 0.0
+
+    async for delta in chunks:
+        parts.append(delta)
+        if time.monotonic() < next_edit_at:
+            continue
+
+        text = "".join(parts)
+        preview = text[:TELEGRAM_MESSAGE_LIMIT - len(STREAM_CURSOR)] + STREAM_CURSOR
+        next_edit_at = time.monotonic() + config.ai.stream_edit_interval
+        try:
+            await typing_message.edit_text(preview)
+            shown = preview
+        except TelegramRetryAfter as e:
+            # Превышен лимит правок — ждём указанное Telegram время
+            next_edit_at = time.monotonic() + e.retry_after
+        except TelegramBadRequest:
+            # "message is not modified" и подобные ошибки не критичны
+            pass
+
+    text = "".join(parts)
+    if not text:
+        await _retry_after_flood(
+            lambda: typing_message.edit_text("📭 Не удалось получить ответ. Попробуйте позже.")
+        )
+        return
+
+    await _show_final_text(message, typing_message, text, shown)
+
+
+async def _show_final_text(
+    message: types.Message,
+    typing_message: types.Message,
+    text: str,
+    shown: str = ""
+) -> None:
+    """Итоговая правка сообщения; длинный ответ досылается отдельными сообщениями."""
+    head, tail = text[:TELEGRAM_MESSAGE_LIMIT], text[TELEGRAM_MESSAGE_LIMIT:]
+    if head != shown:
+        await _retry_after_flood(lambda: typing_message.edit_text(head))
+    while tail:
+        part = tail[:TELEGRAM_MESSAGE_LIMIT]
+        await _retry_after_flood(lambda: message.answer(part))
+        tail = tail[TELEGRAM_MESSAGE_LIMIT:]
+
+
+async def _retry_after_flood(send: Callable[[], Awaitable]) -> None:
+    """Отправляет итоговый текст, выжидая паузу, которую требует Telegram.
+
+    Промежуточную правку можно пропустить, итоговую — нет: иначе у
+    пользователя останется оборванный ответ.
+    """
+    for attempt in range(FINAL_SEND_ATTEMPTS):
+        try:
+            await send()
+            return
+        except TelegramRetryAfter as e:
+            if attempt == FINAL_SEND_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(e.retry_after)
+        except TelegramBadRequest:
+            # "message is not modified": текст уже показан
+            return
+
+
 @router.message()
-async def handle_free_text(message: types.Message) -> None:
+async def handle_free_text(
+    message: types.Message,
+    ai_runtime: AIRuntime,
+    is_member: bool = False
+) -> None:
     """Обработчик свободного текста как консультационного вопроса."""
     if message.text and len(message.text) > 10:
         # Передаем в консультационный сервис
-        await cmd_question(message)
+        await cmd_question(message, ai_runtime, is_member)
@@ -31,6 +31,12 @@ class DocumentRepository:
         result = await self._session.execute(stmt)
         return result.scalar_one_or_none()
     
+    async def get_by_file_path(self, file_path: str) -> Optional[Document]:
+        """Получает документ по относительному пути к файлу."""
+        stmt = select(Document).where(Document.file_path == file_path)
+        result = await self._session.execute(stmt)
+        return result.scalars().first()
+    
     async def get_active_documents(self, limit: int = 100) -> List[Document]:
         """Получает активные документы."""
         stmt = (
@@ -42,6 +48,20 @@ class DocumentRepository:
         result = await self._session.execute(stmt)
         return list(result.scalars().all())
     
+    async def get_indexable_documents(self) -> List[Document]:
+        """Получает все активные документы, у которых есть файл."""
+        stmt = (
+            select(Document)
+            .where(
+                and_(
+                    Document.is_active == True,
+                    Document.file_path.is_not(None)
+                )
+            )
+        )
+        result = await self._session.execute(stmt)
+        return list(result.scalars().all())
+    
     async def get_public_documents(self, limit: int = 100) -> List[Document]:
         """Получает публичные документы."""
         stmt = (
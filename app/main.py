@@ -22,6 +22,7 @@ from app.database.connection import (
     close_database, 
     close_redis
 )
+from app.services.ai_runtime import init_ai_runtime, start_ai_warm_up, close_ai_runtime
 from app.utils.logging_config import setup_logging
 from app.monitoring.health_check import setup_health_check
 from app.monitoring.metrics import setup_metrics
@@ -75,7 +76,13 @@ async def startup_sequence():
     # 4. Создание бота и диспетчера
     # bot и dispatcher уже созданы глобально и роутеры зарегистрированы
     
-    # 5. Настройка мониторинга
+    # 5. Общий ИИ-рантайм (модель эмбеддингов, индекс, клиент DeepSeek)
+    #    передаётся обработчикам через workflow data диспетчера;
+    #    компоненты загружаются в фоне после запуска приёма обновлений
+    ai_runtime = await init_ai_runtime()
+    dispatcher.workflow_data["ai_runtime"] = ai_runtime
+    
+    # 6. Настройка мониторинга
     setup_metrics()
     
     logger.info("Startup sequence completed successfully")
@@ -106,6 +113,9 @@ async def shutdown_sequence():
         # 4. Закрываем Redis
         await close_redis()
         
+        # 5. Закрываем ИИ-рантайм
+        await close_ai_runtime()
+        
         logger.info("Shutdown sequence completed")
         
     except Exception as e:
@@ -132,6 +142,9 @@ async def start_polling():
         # Сохраняем задачу для graceful shutdown
         dispatcher.workflow_data["polling_task"] = polling_task
         
+        # Бот уже отвечает на команды — загружаем ИИ-компоненты в фоне
+        start_ai_warm_up()
+        
         # Ожидаем сигнал завершения или завершение polling
         done, pending = await asyncio.wait(
             [polling_task, asyncio.create_task(shutdown_event.wait())],
@@ -180,6 +193,12 @@ async def create_app() -> web.Application:
     app['bot'] = bot
     app['dispatcher'] = dispatcher
     
+    # Прогрев ИИ-рантайма в event loop веб-сервера после его запуска
+    async def warm_up_ai(app):
+        start_ai_warm_up()
+    
+    app.on_startup.append(warm_up_ai)
+    
     # Обработчик shutdown для веб-приложения
     async def cleanup_app(app):
         await shutdown_sequence()
@@ -31,7 +31,8 @@ async def check_system_health() -> Dict[str, Any]:
     checks = {
         "database": await check_database_health(),
         "redis": await check_redis_health(),
-        "api": await check_api_health()
+        "api": await check_api_health(),
+        "ai": check_ai_health()
     }
     
     all_healthy = all(check["status"] == "ok" for check in checks.values())
@@ -79,6 +80,21 @@ async def check_api_health() -> Dict[str, str]:
         return {"status": "error", "message": f"API error: {str(e)}"}
 
 
+def check_ai_health() -> Dict[str, str]:
+    """Проверяет готовность ИИ-рантайма (модель и индекс загружены)."""
+    try:
+        from app.services.ai_runtime import get_ai_runtime
+        runtime = get_ai_runtime()
+        
+        if runtime.is_ready:
+            return {"status": "ok", "message": "AI runtime ready"}
+        if runtime.error:
+            return {"status": "error", "message": f"AI runtime error: {runtime.error}"}
+        return {"status": runtime.status, "message": f"AI runtime {runtime.status.replace('_', ' ')}"}
+    except Exception as e:
+        return {"status": "error", "message": f"AI runtime error: {str(e)}"}
+
+
 def setup_health_check(app: web.Application) -> None:
     """Настраивает маршруты для проверки здоровья."""
     app.router.add_get('/health', health_check_handler)
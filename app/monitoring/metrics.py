@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
 
 from prometheus_client import REGISTRY
 
@@ -14,6 +14,80 @@ RESPONSE_TIME = Histogram(
     ["event_type", "status"],           # ← добавлено имя лейбла
     registry=REGISTRY
 )
+CACHE_REQUESTS = Counter(
+    "ai_cache_requests_total",
+    "Lookups in AI caches",
+    ["cache", "tier", "result"],
+    registry=REGISTRY
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "ai_single_flight_calls_total",
+    "Calls passed through request coalescing, by role",
+    ["name", "role"],
+    registry=REGISTRY
+)
+RATE_GOVERNOR_LIMIT = Gauge(
+    "ai_rate_governor_concurrency_limit",
+    "Current adaptive concurrency limit for external model API",
+    ["name"],
+    registry=REGISTRY
+)
+RATE_GOVERNOR_WAIT = Histogram(
+    "ai_rate_governor_wait_seconds",
+    "Time requests waited for admission to external model API",
+    ["name", "priority"],
+    registry=REGISTRY
+)
+RATE_GOVERNOR_REJECTED = Counter(
+    "ai_rate_governor_rejected_total",
+    "Requests rejected by the rate governor queue",
+    ["name", "reason"],
+    registry=REGISTRY
+)
+CIRCUIT_STATE = Gauge(
+    "ai_circuit_state",
+    "Circuit breaker state: 0 closed, 1 half-open, 2 open",
+    ["name"],
+    registry=REGISTRY
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "ai_circuit_transitions_total",
+    "Circuit breaker state transitions",
+    ["name", "state"],
+    registry=REGISTRY
+)
+PROMPT_TOKENS = Histogram(
+    "ai_prompt_tokens",
+    "Estimated prompt tokens sent to the model, by prompt part",
+    ["part"],
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000),
+    registry=REGISTRY
+)
+LLM_TOKENS = Counter(
+    "ai_llm_tokens_total",
+    "Tokens billed by the model API: prompt cache hits/misses and completion",
+    ["model", "kind"],
+    registry=REGISTRY
+)
+RETRIEVAL_LATENCY = Histogram(
+    "rag_retrieval_stage_seconds",
+    "Document retrieval latency by stage: dense, lexical, fusion, rerank",
+    ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    registry=REGISTRY
+)
+RERANK_FALLBACKS = Counter(
+    "rag_rerank_fallbacks_total",
+    "Searches that kept the unreranked order: time budget exceeded or model error",
+    ["reason"],
+    registry=REGISTRY
+)
+CACHE_EVICTIONS = Counter(
+    "ai_cache_evictions_total",
+    "Entries evicted from in-process AI caches",
+    ["cache", "reason"],
+    registry=REGISTRY
+)
 
 _metrics_initialized = False
 
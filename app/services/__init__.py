@@ -3,5 +3,6 @@ from .ai_service import AIService
 from .user_service import UserService
 from .document_service import DocumentService
 from .auth_service import AuthService
+from .ai_runtime import AIRuntime
 
-__all__ = ["AIService", "UserService", "DocumentService", "AuthService"]
+__all__ = ["AIService", "UserService", "DocumentService", "AuthService", "AIRuntime"]
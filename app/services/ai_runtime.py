@@ -0,0 +1,210 @@
+"""Общий ИИ-рантайм приложения.
+
+Создаётся один раз при старте и разделяется всеми обработчиками: одна модель
+эмбеддингов, один векторный индекс и один пул соединений к DeepSeek.
+Тяжёлые компоненты (модель, FAISS) загружаются фоновой задачей прогрева
+после того, как бот начал принимать обновления, поэтому команды без ИИ
+работают сразу после запуска процесса.
+"""
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from app.ai_integration.deepseek_client import DeepSeekClient
+    from app.ai_integration.embeddings import EmbeddingService
+    from app.ai_integration.rag_system import RAGSystem
+    from app.ai_integration.reranker import CrossEncoderReranker
+    from app.ai_integration.semantic_cache import SemanticAnswerCache
+    from app.ai_integration.vector_store import VectorStore
+    from app.services.ai_service import AIService
+    from app.services.document_service import DocumentService
+
+logger = logging.getLogger(__name__)
+
+# Глобальный экземпляр рантайма
+_ai_runtime: Optional["AIRuntime"] = None
+
+
+class AIRuntime:
+    """Владеет тяжёлыми ИИ-компонентами, общими для всего процесса."""
+
+    # Запрос для первого прохода модели при прогреве
+    WARMUP_QUERY = "Порядок вступления в СРО"
+
+    def __init__(self) -> None:
+        self.embedding_service: Optional["EmbeddingService"] = None
+        self.vector_store: Optional["VectorStore"] = None
+        self.rag_system: Optional["RAGSystem"] = None
+        self.reranker: Optional["CrossEncoderReranker"] = None
+        self.deepseek_client: Optional["DeepSeekClient"] = None
+        self.answer_cache: Optional["SemanticAnswerCache"] = None
+        self.ai_service: Optional["AIService"] = None
+        self.document_service: Optional["DocumentService"] = None
+
+        self.error: Optional[str] = None
+        self._ready = False
+        self._warmup_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        """Компоненты загружены и прогреты."""
+        return self._ready
+
+    @property
+    def status(self) -> str:
+        """Состояние рантайма для проверок здоровья."""
+        if self._ready:
+            return "ready"
+        if self.error:
+            return "error"
+        if self._warmup_task is not None:
+            return "warming_up"
+        return "not_started"
+
+    def _build(self) -> None:
+        """Создаёт компоненты; выполняется в потоке, вне event loop."""
+        # Импорты модели и FAISS занимают секунды — только при прогреве
+        from config.settings import config
+        from app.ai_integration.ann_index import ANNParams
+        from app.ai_integration.deepseek_client import DeepSeekClient
+        from app.ai_integration.embeddings import EmbeddingService
+        from app.ai_integration.rag_system import RAGSystem
+        from app.ai_integration.semantic_cache import SemanticAnswerCache
+        from app.ai_integration.vector_store import VectorStore
+        from app.services.ai_service import AIService
+        from app.services.document_service import DocumentService
+
+        embedding_service = EmbeddingService()
+        vector_store = VectorStore(
+            index_path=config.rag.index_path,
+            embedding_service=embedding_service,
+            ann_params=ANNParams.from_config(config.rag)
+        )
+        reranker = None
+        if config.rag.rerank_enabled:
+            from app.ai_integration.reranker import CrossEncoderReranker
+            reranker = CrossEncoderReranker(
+                model_name=config.rag.rerank_model,
+                max_length=config.rag.rerank_max_length,
+                max_batch_size=config.rag.rerank_batch_size,
+                timeout=config.rag.rerank_timeout_ms / 1000
+            )
+        rag_system = RAGSystem(vector_store=vector_store, reranker=reranker)
+        deepseek_client = DeepSeekClient()
+
+        answer_cache = None
+        if config.ai.answer_cache:
+            answer_cache = SemanticAnswerCache(
+                embedding_service,
+                source_versions=vector_store.source_versions,
+                threshold=config.ai.answer_cache_threshold,
+                max_entries=config.ai.answer_cache_size,
+                ttl=config.ai.answer_cache_ttl,
+                redis_url=config.redis.url
+            )
+
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.rag_system = rag_system
+        self.reranker = reranker
+        self.deepseek_client = deepseek_client
+        self.answer_cache = answer_cache
+        self.ai_service = AIService(
+            rag_system=rag_system,
+            deepseek_client=deepseek_client,
+            answer_cache=answer_cache
+        )
+        self.document_service = DocumentService(rag_system=rag_system)
+
+    async def warm_up(self) -> None:
+        """Загружает компоненты, выполняет первый проход модели и синхронизацию индекса."""
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+
+        try:
+            if self.rag_system is None:
+                await loop.run_in_executor(None, self._build)
+            await self.embedding_service.encode(self.WARMUP_QUERY)
+            if self.reranker is not None:
+                await self.reranker.warm_up(self.WARMUP_QUERY)
+            await self.rag_system.initialize()
+            if self.answer_cache is not None:
+                await self.answer_cache.load()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            logger.error(f"AI runtime warm-up failed: {e}", exc_info=True)
+            return
+
+        self._ready = True
+        logger.info(f"AI runtime ready in {time.perf_counter() - started:.1f}s")
+
+    def start_warm_up(self) -> asyncio.Task:
+        """Запускает прогрев в фоне; после ошибки повторный вызов начинает его заново."""
+        if self._warmup_task is None or (self._warmup_task.done() and not self._ready):
+            self.error = None
+            self._warmup_task = asyncio.create_task(self.warm_up())
+        return self._warmup_task
+
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Ожидает готовности рантайма не дольше ``timeout`` секунд."""
+        if self._ready:
+            return True
+
+        task = self.start_warm_up()
+        await asyncio.wait({task}, timeout=timeout)
+        return self._ready
+
+    async def close(self) -> None:
+        """Останавливает прогрев и освобождает ресурсы рантайма."""
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+            try:
+                await self._warmup_task
+            except asyncio.CancelledError:
+                pass
+
+        if self.ai_service is not None:
+            await self.ai_service.close()
+        if self.deepseek_client is not None:
+            await self.deepseek_client.close()
+        if self.answer_cache is not None:
+            await self.answer_cache.close()
+        if self.reranker is not None:
+            await self.reranker.close()
+        if self.embedding_service is not None:
+            await self.embedding_service.close()
+        self._ready = False
+
+
+async def init_ai_runtime() -> AIRuntime:
+    """Создаёт общий ИИ-рантайм; компоненты загружаются при прогреве."""
+    global _ai_runtime
+
+    if _ai_runtime is None:
+        _ai_runtime = AIRuntime()
+        logger.info("AI runtime created")
+
+    return _ai_runtime
+
+
+def get_ai_runtime() -> AIRuntime:
+    """Возвращает общий ИИ-рантайм."""
+    if _ai_runtime is None:
+        raise RuntimeError("AI runtime not initialized. Call init_ai_runtime() first.")
+    return _ai_runtime
+
+
+def start_ai_warm_up() -> None:
+    """Запускает фоновый прогрев общего ИИ-рантайма."""
+    get_ai_runtime().start_warm_up()
+
+
+async def close_ai_runtime() -> None:
+    """Закрывает общий ИИ-рантайм."""
+    global _ai_runtime
+    if _ai_runtime:
+        await _ai_runtime.close()
+        _ai_runtime = None
+        logger.info("AI runtime closed")
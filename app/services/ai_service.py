@@ -1,67 +1,310 @@
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, List, Dict, Optional
 import asyncio
+import logging
+import time
+from pathlib import Path
+from config.settings import config
 from app.ai_integration.deepseek_client import DeepSeekClient
-from app.ai_integration.rag_system import RAGSystem
+from app.ai_integration.deepseek_sdk import DeepSeekUnavailable
+from app.ai_integration.prompt_builder import PromptBuilder
+from app.services.conversation_summarizer import ConversationSummarizer
 from app.services.session_service import SessionService
-from app.monitoring.metrics import RESPONSE_TIME
+from app.monitoring.metrics import REQUEST_COUNT, RESPONSE_TIME
+
+if TYPE_CHECKING:
+    from app.ai_integration.rag_system import RAGSystem
+    from app.ai_integration.semantic_cache import SemanticAnswerCache
+
+logger = logging.getLogger(__name__)
 
 
 class AIService:
     """Сервис для работы с искусственным интеллектом."""
     
-    def __init__(self):
-        self.deepseek_client = DeepSeekClient()
-        self.rag_system = RAGSystem()
-        self.session_service = SessionService()
+    # Режим деградации: число фрагментов и длина выдержки из каждого
+    DEGRADED_TOP_K = 3
+    DEGRADED_EXCERPT_CHARS = 700
+    
+    def __init__(
+        self,
+        rag_system: Optional["RAGSystem"] = None,
+        deepseek_client: Optional[DeepSeekClient] = None,
+        answer_cache: Optional["SemanticAnswerCache"] = None
+    ):
+        if rag_system is None:
+            # Загрузка модели и FAISS — только когда RAG-система действительно нужна
+            from app.ai_integration.rag_system import RAGSystem
+            rag_system = RAGSystem()
+        
+        self.deepseek_client = deepseek_client or DeepSeekClient()
+        self.rag_system = rag_system
+        self.answer_cache = answer_cache
+        self.session_service = SessionService(summarizer=self._create_summarizer())
+        self.prompt_builder = PromptBuilder(
+            max_prompt_tokens=config.ai.max_prompt_tokens,
+            history_share=config.ai.history_share,
+            max_history_turns=config.ai.history_turns
+        )
+    
+    def _create_summarizer(self) -> Optional[ConversationSummarizer]:
+        """Создаёт фоновый сжиматель длинной истории диалога."""
+        if not config.ai.summary_enabled:
+            return None
+        
+        return ConversationSummarizer(
+            self.deepseek_client,
+            threshold_tokens=config.ai.summary_threshold_tokens,
+            keep_turns=config.ai.summary_keep_turns,
+            max_summary_tokens=config.ai.summary_max_tokens
+        )
+    
+    async def close(self) -> None:
+        """Останавливает фоновые задачи сервиса."""
+        if self.session_service.summarizer is not None:
+            await self.session_service.summarizer.close()
     
     async def generate_consultation_response(
         self, 
         user_question: str, 
         user_id: int,
-        context: Optional[str] = None
+        context: Optional[str] = None,
+        chunks: Optional[List[Dict[str, Any]]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        check_cache: bool = True
     ) -> str:
-        """Генерирует консультационный ответ."""
-        with RESPONSE_TIME.labels(service="ai_consultation").time():
+        """Генерирует консультационный ответ.
+        
+        Если переданы ``chunks`` (результаты поиска, из которых собран контекст),
+        ответ попадает в семантический кеш и переиспользуется для близких
+        по смыслу вопросов, пока эти фрагменты не изменятся. ``filters`` —
+        документы, доступные пользователю: по ним ищутся фрагменты
+        и проверяются источники ответа из кеша. Без ``check_cache`` кеш
+        не проверяется — вызывающий уже сделал это через
+        ``cached_consultation_response`` до поиска.
+        """
+        # Статус в метрике — по итогу: успех, кеш, режим деградации или ошибка
+        started = time.perf_counter()
+        status = "error"
+        try:
+            if check_cache:
+                cached = await self.cached_consultation_response(user_question, user_id, filters)
+                if cached is not None:
+                    status = "cached"
+                    return cached
+            
+            # Получаем контекст из документов через RAG
+            if not context:
+                context = await self._get_document_context(user_question, filters)
+            
+            # Формируем сообщения для ИИ в пределах бюджета токенов
+            messages = await self._prepare_messages(user_question, user_id, context, chunks)
+            
+            # Генерируем ответ; пока API недоступно — выдержки из документов
             try:
-                # Получаем контекст из документов через RAG
+                response = await self.deepseek_client.chat_completion(messages)
+            except DeepSeekUnavailable:
+                response = await self._degraded_answer(user_question, filters)
+                outcome = "degraded"
+            else:
+                await self.store_answer(user_question, response, chunks)
+                outcome = "success"
+            
+            # Сохраняем в историю
+            await self.session_service.save_interaction(
+                user_id=user_id,
+                user_message=user_question,
+                bot_response=response,
+                context_used=context[:500] if context else None
+            )
+            
+            status = outcome
+            return response
+            
+        except Exception as e:
+            return f"❌ Извините, произошла ошибка при обработке вашего запроса: {str(e)}"
+        finally:
+            RESPONSE_TIME.labels(event_type="ai_consultation", status=status).observe(
+                time.perf_counter() - started
+            )
+    
+    async def stream_consultation_response(
+        self,
+        user_question: str,
+        user_id: int,
+        context: Optional[str] = None,
+        chunks: Optional[List[Dict[str, Any]]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        check_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """Генерирует консультационный ответ в потоковом режиме.
+        
+        Отдаёт фрагменты ответа по мере генерации; взаимодействие сохраняется
+        в историю после получения ответа целиком. Ответ из семантического
+        кеша отдаётся одним фрагментом; ``check_cache`` — как
+        в ``generate_consultation_response``.
+        """
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = None
+            if check_cache:
+                response = await self._lookup_cached_answer(user_question, filters)
+            if response is not None:
+                outcome = "cached"
+                yield response
+            else:
                 if not context:
-                    context = await self._get_document_context(user_question)
-                
-                # Получаем историю диалога
-                conversation_history = await self.session_service.get_conversation_history(user_id)
-                
-                # Формируем системный промпт
-                system_prompt = self._create_system_prompt()
-                
-                # Формируем сообщения для ИИ
-                messages = self._prepare_messages(
-                    user_question=user_question,
-                    context=context,
-                    conversation_history=conversation_history,
-                    system_prompt=system_prompt
-                )
+                    context = await self._get_document_context(user_question, filters)
                 
-                # Генерируем ответ
-                response = await self.deepseek_client.generate_response(
-                    user_question=user_question,
-                    context=context,
-                    system_prompt=system_prompt
-                )
+                messages = await self._prepare_messages(user_question, user_id, context, chunks)
                 
-                # Сохраняем в историю
-                await self.session_service.save_interaction(
-                    user_id=user_id,
-                    user_message=user_question,
-                    bot_response=response,
-                    context_used=context[:500] if context else None
-                )
-                
-                return response
-                
-            except Exception as e:
-                return f"❌ Извините, произошла ошибка при обработке вашего запроса: {str(e)}"
+                parts = []
+                try:
+                    async for delta in self.deepseek_client.stream_chat_completion(messages):
+                        parts.append(delta)
+                        yield delta
+                except DeepSeekUnavailable:
+                    # Выключатель разомкнут до начала генерации
+                    response = await self._degraded_answer(user_question, filters)
+                    outcome = "degraded"
+                    yield response
+                else:
+                    response = "".join(parts)
+                    outcome = "success"
+                    await self.store_answer(user_question, response, chunks)
+            
+            await self.session_service.save_interaction(
+                user_id=user_id,
+                user_message=user_question,
+                bot_response=response,
+                context_used=context[:500] if context else None
+            )
+            status = outcome
+        finally:
+            # Прерванный или завершившийся ошибкой поток учитывается как ошибка
+            RESPONSE_TIME.labels(event_type="ai_consultation_stream", status=status).observe(
+                time.perf_counter() - started
+            )
+    
+    async def cached_consultation_response(
+        self,
+        user_question: str,
+        user_id: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """Ответ из семантического кеша с сохранением в историю; ``None`` при промахе.
+        
+        Проверяется до поиска по документам: при попадании эмбеддинг вопроса
+        уже посчитан, а поиск и переранжирование не нужны.
+        """
+        cached = await self._lookup_cached_answer(user_question, filters)
+        if cached is not None:
+            await self.session_service.save_interaction(
+                user_id=user_id,
+                user_message=user_question,
+                bot_response=cached
+            )
+        return cached
     
-    async def _get_document_context(self, question: str) -> str:
+    async def _lookup_cached_answer(
+        self,
+        question: str,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """Ищет ответ на близкий по смыслу вопрос в семантическом кеше.
+        
+        Ответ, основанный на документах вне ``filters`` (например, только
+        для членов СРО), не выдаётся.
+        """
+        if self.answer_cache is None:
+            return None
+        
+        try:
+            cached = await self.answer_cache.lookup(question)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None
+        
+        if cached is None:
+            return None
+        if not self.rag_system.vector_store.chunks_match(cached.source_ids, filters):
+            return None
+        return cached.answer
+    
+    async def store_answer(
+        self,
+        question: str,
+        answer: str,
+        chunks: Optional[List[Dict[str, Any]]]
+    ) -> None:
+        """Сохраняет ответ в семантический кеш вместе с идентификаторами фрагментов."""
+        if self.answer_cache is None or not chunks:
+            return
+        
+        source_ids = [chunk["metadata"]["chunk_id"] for chunk in chunks]
+        try:
+            await self.answer_cache.store(question, answer, source_ids)
+        except Exception as e:
+            logger.warning(f"Answer cache store failed: {e}")
+    
+    async def _degraded_answer(
+        self,
+        question: str,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Формирует ответ из найденных фрагментов документов без обращения к модели.
+        
+        Используется, пока выключатель DeepSeek разомкнут: пользователь сразу
+        получает выдержки из документов вместо ожидания таймаутов.
+        """
+        REQUEST_COUNT.labels(event_type="ai_consultation", status="degraded").inc()
+        
+        try:
+            results = await self.rag_system.search(
+                question, top_k=self.DEGRADED_TOP_K, filters=filters
+            )
+        except Exception as e:
+            logger.warning(f"Degraded mode search failed: {e}")
+            results = []
+        
+        if not results:
+            return (
+                "⚠️ ИИ-консультант временно недоступен, а подходящих фрагментов "
+                "документов не нашлось. Попробуйте позже."
+            )
+        
+        parts = ["⚠️ ИИ-консультант временно недоступен. Наиболее подходящие фрагменты документов СРО:"]
+        for number, result in enumerate(results, 1):
+            title = self._format_source(result.get("metadata", {}))
+            parts.append(f"{number}. {title}\n{self._excerpt(result['content'])}")
+        
+        return "\n\n".join(parts)
+    
+    @staticmethod
+    def _format_source(metadata: Dict[str, Any]) -> str:
+        """Подпись фрагмента: документ, раздел и страница."""
+        parts = []
+        if metadata.get("source"):
+            parts.append(f"«{Path(metadata['source']).stem}»")
+        if metadata.get("section"):
+            parts.append(metadata["section"])
+        if metadata.get("page_start"):
+            parts.append(f"с. {metadata['page_start']}")
+        return ", ".join(parts) or "Документ СРО"
+    
+    @classmethod
+    def _excerpt(cls, text: str) -> str:
+        """Обрезает фрагмент по границе слова."""
+        text = " ".join(text.split())
+        if len(text) <= cls.DEGRADED_EXCERPT_CHARS:
+            return text
+        return text[:cls.DEGRADED_EXCERPT_CHARS].rsplit(" ", 1)[0] + "…"
+    
+    async def _get_document_context(
+        self,
+        question: str,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> str:
         """Получает релевантный контекст из документов."""
         try:
             # Инициализируем RAG систему если необходимо
@@ -69,7 +312,7 @@ class AIService:
                 await self.rag_system.initialize()
             
             # Ищем релевантные документы
-            search_results = await self.rag_system.search(question, top_k=3)
+            search_results = await self.rag_system.search(question, top_k=3, filters=filters)
             
             if not search_results:
                 return ""
@@ -85,7 +328,11 @@ class AIService:
             return ""
     
     def _create_system_prompt(self) -> str:
-        """Создает системный промпт для ИИ."""
+        """Создает системный промпт для ИИ.
+        
+        Промпт — общее начало всех запросов и кешируется на стороне API,
+        поэтому в нём не должно быть изменяющихся данных (дат, имён).
+        """
         return (
             "Ты — профессиональный консультант СРО «Нижегородское объединение строительных организаций» (НОСО). "
             "Твоя задача — предоставлять точные, профессиональные и полезные ответы на вопросы о:\n"
@@ -103,35 +350,56 @@ class AIService:
             "6. Избегай юридических консультаций, рекомендуй обратиться к юристам"
         )
     
-    def _prepare_messages(
+    async def _prepare_messages(
         self,
         user_question: str,
-        context: str,
-        conversation_history: List[Dict],
-        system_prompt: str
+        user_id: int,
+        context: Optional[str],
+        chunks: Optional[List[Dict[str, Any]]] = None
     ) -> List[Dict[str, str]]:
-        """Подготавливает сообщения для отправки в ИИ."""
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ]
+        """Подготавливает сообщения для отправки в ИИ.
         
-        # Добавляем контекст из документов
-        if context:
-            messages.append({
-                "role": "system",
-                "content": f"Информация из документов СРО:\n{context}"
-            })
-        
-        # Добавляем историю диалога (последние 5 сообщений)
-        for interaction in conversation_history[-5:]:
-            messages.append({"role": "user", "content": interaction["user_message"]})
-            messages.append({"role": "assistant", "content": interaction["bot_response"]})
+        Системный промпт, фрагменты документов, резюме ранней части диалога
+        и последние реплики собираются так, чтобы запрос не превышал
+        ``config.ai.max_prompt_tokens``, а его начало совпадало у запросов
+        с одинаковыми фрагментами (кеш префикса DeepSeek).
+        """
+        summary, conversation_history = await self.session_service.get_conversation_state(
+            user_id, limit=self.prompt_builder.max_history_turns
+        )
         
-        # Добавляем текущий вопрос
-        messages.append({"role": "user", "content": user_question})
+        prompt = self.prompt_builder.build(
+            system_prompt=self._create_system_prompt(),
+            question=user_question,
+            context=context,
+            history=conversation_history,
+            summary=summary,
+            chunks=chunks
+        )
+        if prompt.dropped_chunks or prompt.dropped_turns:
+            logger.debug(
+                f"Prompt trimmed to {prompt.total_tokens} tokens: "
+                f"{prompt.dropped_chunks} chunks, {prompt.dropped_turns} turns dropped"
+            )
         
-        return messages
-    
+        return prompt.messages
+
+    def prepare_standalone_messages(
+        self,
+        question: str,
+        chunks: List[Dict[str, Any]]
+    ) -> List[Dict[str, str]]:
+        """Сообщения для вопроса вне диалога — без истории и резюме.
+
+        Используется пакетной обработкой вопросов: тот же системный промпт
+        и тот же порядок фрагментов, что и в консультации.
+        """
+        return self.prompt_builder.build(
+            system_prompt=self._create_system_prompt(),
+            question=question,
+            chunks=chunks
+        ).messages
+
     async def generate_document_summary(self, document_content: str) -> str:
         """Генерирует краткое содержание документа."""
         try:
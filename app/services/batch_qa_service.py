@@ -0,0 +1,171 @@
+"""Пакетные ответы на вопросы: оценка поиска и подготовка ответов на частые вопросы.
+
+Вопросы обрабатываются пачками: эмбеддинги и векторный поиск — одним
+вызовом на пачку, запросы к модели — параллельно, не больше
+``concurrency`` одновременно и с фоновым приоритетом, чтобы пакетная
+обработка в процессе бота не занимала очередь к API раньше пользователей.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.ai_integration.deepseek_sdk import DeepSeekUnavailable
+from app.ai_integration.rate_governor import PRIORITY_BACKGROUND, set_request_priority
+
+if TYPE_CHECKING:
+    from app.services.ai_service import AIService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchQuestion:
+    """Вопрос пакета; ``question_id`` переносится в результат без изменений."""
+    question: str
+    question_id: Optional[str] = None
+
+
+@dataclass
+class BatchAnswer:
+    """Ответ на вопрос пакета с найденными фрагментами и временем этапов."""
+    question: str
+    question_id: Optional[str] = None
+    answer: Optional[str] = None
+    chunk_ids: List[int] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    scores: List[float] = field(default_factory=list)
+    # Поиск выполняется на всю пачку — время делится поровну между её вопросами
+    retrieval_ms: float = 0.0
+    generation_ms: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.question_id,
+            "question": self.question,
+            "answer": self.answer,
+            "chunk_ids": self.chunk_ids,
+            "sources": self.sources,
+            "scores": [round(score, 4) for score in self.scores],
+            "timings": {
+                "retrieval_ms": round(self.retrieval_ms, 1),
+                "generation_ms": round(self.generation_ms, 1),
+            },
+            "error": self.error,
+        }
+
+
+class BatchQAService:
+    """Отвечает на список вопросов тем же поиском и промптом, что и консультация."""
+
+    def __init__(
+        self,
+        ai_service: "AIService",
+        top_k: int = 3,
+        concurrency: int = 4,
+        batch_size: int = 256,
+        store_answers: bool = False
+    ):
+        self.ai_service = ai_service
+        self.top_k = top_k
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        # Ответы попадают в семантический кеш и выдаются пользователям на близкие вопросы
+        self.store_answers = store_answers
+
+    async def answer(
+        self,
+        questions: List[BatchQuestion],
+        filters: Optional[Dict[str, Any]] = None,
+        retrieval_only: bool = False
+    ) -> AsyncIterator[BatchAnswer]:
+        """Отдаёт ответы по мере готовности — порядок не совпадает с ``questions``.
+
+        ``filters`` ограничивает поиск полями документа, как в консультации;
+        с ``retrieval_only`` модель не вызывается — только найденные фрагменты.
+        """
+        set_request_priority(PRIORITY_BACKGROUND)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        for start in range(0, len(questions), self.batch_size):
+            batch = questions[start:start + self.batch_size]
+            answers = await self._retrieve(batch, filters)
+            if retrieval_only:
+                for answer, _ in answers:
+                    yield answer
+                continue
+
+            tasks = [
+                asyncio.create_task(self._generate(answer, chunks, semaphore))
+                for answer, chunks in answers
+            ]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    yield await task
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+    async def _retrieve(
+        self,
+        batch: List[BatchQuestion],
+        filters: Optional[Dict[str, Any]]
+    ) -> List[Tuple[BatchAnswer, List[Dict[str, Any]]]]:
+        """Ищет фрагменты для пачки вопросов одним пакетным поиском."""
+        started = time.perf_counter()
+        try:
+            results = await self.ai_service.rag_system.search_batch(
+                [item.question for item in batch], top_k=self.top_k, filters=filters
+            )
+            error = None
+        except Exception as e:
+            logger.error(f"Batch retrieval failed: {e}", exc_info=True)
+            results = [[] for _ in batch]
+            error = f"retrieval: {e}"
+        retrieval_ms = (time.perf_counter() - started) * 1000 / len(batch)
+
+        return [
+            (
+                BatchAnswer(
+                    question=item.question,
+                    question_id=item.question_id,
+                    chunk_ids=[chunk["metadata"]["chunk_id"] for chunk in chunks],
+                    sources=[chunk["metadata"].get("source") or "" for chunk in chunks],
+                    scores=[chunk["score"] for chunk in chunks],
+                    retrieval_ms=retrieval_ms,
+                    error=error
+                ),
+                chunks
+            )
+            for item, chunks in zip(batch, results)
+        ]
+
+    async def _generate(
+        self,
+        answer: BatchAnswer,
+        chunks: List[Dict[str, Any]],
+        semaphore: asyncio.Semaphore
+    ) -> BatchAnswer:
+        """Запрашивает ответ модели по найденным фрагментам."""
+        if answer.error:
+            return answer
+
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                messages = self.ai_service.prepare_standalone_messages(answer.question, chunks)
+                answer.answer = await self.ai_service.deepseek_client.chat_completion(messages)
+            except DeepSeekUnavailable as e:
+                # Выдержки режима деградации не годятся для заготовленных ответов
+                answer.error = f"unavailable: {e}"
+            except Exception as e:
+                logger.warning(f"Batch answer failed for {answer.question_id or answer.question!r}: {e}")
+                answer.error = str(e)
+            finally:
+                answer.generation_ms = (time.perf_counter() - started) * 1000
+
+        if answer.answer is not None and self.store_answers:
+            await self.ai_service.store_answer(answer.question, answer.answer, chunks)
+        return answer
@@ -0,0 +1,118 @@
+"""Фоновое сжатие длинной истории диалога в краткое резюме."""
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from app.ai_integration.prompt_builder import estimate_llm_tokens
+from app.ai_integration.rate_governor import PRIORITY_BACKGROUND, set_request_priority
+
+if TYPE_CHECKING:
+    from app.ai_integration.deepseek_client import DeepSeekClient
+    from app.services.session_service import SessionService
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Ты ведёшь краткий конспект консультации СРО НОСО. Объедини предыдущий "
+    "конспект (если он есть) и новые реплики в одно резюме: о чём спрашивал "
+    "пользователь, какие документы, требования, сроки и выводы прозвучали. "
+    "Пиши сжато, без вступлений, не более {words} слов."
+)
+
+
+class ConversationSummarizer:
+    """Сворачивает старые реплики сессии в резюме, когда история становится длинной.
+
+    Сжатие запускается в фоне после сохранения реплики и не задерживает
+    ответ пользователю — по числу токенов истории или когда реплик больше,
+    чем сессия хранит дословно. Последние ``keep_turns`` реплик остаются
+    дословными.
+    """
+
+    def __init__(
+        self,
+        deepseek_client: "DeepSeekClient",
+        threshold_tokens: int = 1500,
+        keep_turns: int = 2,
+        max_summary_tokens: int = 300
+    ):
+        self.deepseek_client = deepseek_client
+        self.threshold_tokens = threshold_tokens
+        self.keep_turns = keep_turns
+        self.max_summary_tokens = max_summary_tokens
+
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def needs_summary(self, session: Dict, max_turns: Optional[int] = None) -> bool:
+        """История длиннее порога токенов или ``max_turns`` реплик и есть что сворачивать."""
+        history = session.get("conversation_history", [])
+        if len(history) <= self.keep_turns:
+            return False
+        if max_turns is not None and len(history) > max_turns:
+            return True
+        return self.history_tokens(history) > self.threshold_tokens
+
+    @staticmethod
+    def history_tokens(history: List[Dict]) -> int:
+        return sum(
+            estimate_llm_tokens(turn["user_message"]) + estimate_llm_tokens(turn["bot_response"])
+            for turn in history
+        )
+
+    def schedule(self, user_id: int, session_service: "SessionService") -> None:
+        """Запускает сжатие истории пользователя, если оно ещё не идёт."""
+        task = self._tasks.get(user_id)
+        if task is not None and not task.done():
+            return
+
+        task = asyncio.create_task(self._summarize_session(user_id, session_service))
+        self._tasks[user_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(user_id, None))
+
+    async def _summarize_session(self, user_id: int, session_service: "SessionService") -> None:
+        # Сжатие не должно занимать очередь к API раньше вопросов пользователей
+        set_request_priority(PRIORITY_BACKGROUND)
+
+        try:
+            session = await session_service.get_or_create_session(user_id)
+            history = session.get("conversation_history", [])
+            turns = history[:-self.keep_turns]
+            if not turns:
+                return
+
+            summary = await self.summarize(session.get("summary"), turns)
+
+            # Пока шло сжатие, могли добавиться новые реплики: удаляем только свёрнутые
+            summarized = {turn["timestamp"] for turn in turns}
+            await session_service.apply_summary(user_id, summary, summarized)
+            logger.debug(f"Conversation of user {user_id}: {len(turns)} turns summarized")
+        except Exception as e:
+            logger.warning(f"Conversation summarization failed for user {user_id}: {e}")
+
+    async def summarize(self, previous_summary: Optional[str], turns: List[Dict]) -> str:
+        """Объединяет предыдущее резюме и реплики в новое резюме."""
+        dialogue = "\n\n".join(
+            f"Пользователь: {turn['user_message']}\nКонсультант: {turn['bot_response']}"
+            for turn in turns
+        )
+        if previous_summary:
+            dialogue = f"Предыдущий конспект:\n{previous_summary}\n\nНовые реплики:\n{dialogue}"
+
+        return await self.deepseek_client.chat_completion(
+            [
+                {
+                    "role": "system",
+                    "content": SUMMARY_PROMPT.format(words=self.max_summary_tokens // 2)
+                },
+                {"role": "user", "content": dialogue}
+            ],
+            max_tokens=self.max_summary_tokens,
+            temperature=0.2
+        )
+
+    async def close(self) -> None:
+        """Отменяет незавершённые задачи сжатия."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
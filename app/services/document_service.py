@@ -1,19 +1,30 @@
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 import os
 from pathlib import Path
 
+from config.settings import config
 from app.database.connection import get_async_session
 from app.database.repositories.document_repository import DocumentRepository
 from app.models.document import Document
-from app.ai_integration.rag_system import RAGSystem
+
+if TYPE_CHECKING:
+    from app.ai_integration.rag_system import RAGSystem
 
 
 class DocumentService:
     """Сервис для работы с документами СРО."""
     
-    def __init__(self):
-        self.rag_system = RAGSystem()
-        self.documents_base_path = Path("data/documents")
+    def __init__(self, rag_system: Optional["RAGSystem"] = None):
+        self._rag_system = rag_system
+        self.documents_base_path = Path(config.rag.documents_path)
+    
+    @property
+    def rag_system(self) -> "RAGSystem":
+        """RAG-система; создаётся лениво, если не передана явно."""
+        if self._rag_system is None:
+            from app.ai_integration.rag_system import RAGSystem
+            self._rag_system = RAGSystem()
+        return self._rag_system
     
     async def get_active_documents(self) -> List[Document]:
         """Возвращает список активных документов."""
@@ -25,17 +36,36 @@ class DocumentService:
         """Ищет релевантный контент в документах."""
         try:
             results = await self.rag_system.search(query, top_k=3)
-            
-            if not results:
-                return "Релевантная информация не найдена."
-            
-            context = "\n\n".join([result["content"] for result in results])
-            return context
+            return self.build_context(results)
             
         except Exception as e:
             # Логируем ошибку
             return "Ошибка поиска в документах."
     
+    async def search_relevant_chunks(
+        self,
+        query: str,
+        top_k: int = 3,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Ищет релевантные фрагменты документов вместе с их метаданными.
+        
+        ``filters`` ограничивает поиск полями документа (см. ``RAGSystem.search``).
+        """
+        try:
+            return await self.rag_system.search(query, top_k=top_k, filters=filters)
+        except Exception as e:
+            # Логируем ошибку
+            return []
+    
+    @staticmethod
+    def build_context(results: List[Dict[str, Any]]) -> str:
+        """Формирует контекст для ИИ из найденных фрагментов."""
+        if not results:
+            return "Релевантная информация не найдена."
+        
+        return "\n\n".join([result["content"] for result in results])
+    
     async def get_document_by_id(self, doc_id: int) -> Optional[Document]:
         """Получает документ по ID."""
         async with get_async_session() as session:
@@ -1,5 +1,6 @@
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, Callable, Iterable, List, Dict, Optional, Tuple
 import json
+import logging
 import redis
 from datetime import datetime, timedelta
 
@@ -10,14 +11,24 @@ from app.database.repositories.session_repository import SessionRepository
 from app.models.message import Message
 from app.models.session import Session
 
+if TYPE_CHECKING:
+    from app.services.conversation_summarizer import ConversationSummarizer
+
+logger = logging.getLogger(__name__)
+
 
 class SessionService:
     """Сервис для управления сессиями пользователей."""
     
-    def __init__(self):
+    def __init__(self, summarizer: Optional["ConversationSummarizer"] = None):
         self.redis_client = redis.from_url(config.redis.url)
         self.session_ttl = 3600  # 1 час
         self.conversation_history_limit = 10
+        # Сворачивает старые реплики длинной истории в резюме
+        self.summarizer = summarizer
+        # С резюме история сокращается сжатием; если оно не удаётся, старые
+        # реплики отбрасываются после этого предела
+        self.conversation_history_hard_limit = self.conversation_history_limit * 3
     
     async def get_or_create_session(self, user_id: int) -> Dict:
         """Получает или создает сессию для пользователя."""
@@ -27,11 +38,8 @@ class SessionService:
         session_data = self.redis_client.get(session_key)
         
         if session_data:
-            session = json.loads(session_data)
             # Обновляем время последней активности
-            session["last_activity"] = datetime.now().isoformat()
-            await self._save_session_to_redis(user_id, session)
-            return session
+            return await self._update_session(user_id, lambda session: None)
         
         # Создаем новую сессию
         session = {
@@ -44,19 +52,51 @@ class SessionService:
         }
         
         # Сохраняем в Redis и базе данных
-        await self._save_session_to_redis(user_id, session)
+        if not await self._save_session_to_redis(user_id, session):
+            # Сессию одновременно создал параллельный запрос
+            return await self._update_session(user_id, lambda session: None)
         await self._save_session_to_db(session)
         
         return session
     
-    async def _save_session_to_redis(self, user_id: int, session: Dict) -> None:
-        """Сохраняет сессию в Redis."""
+    async def _save_session_to_redis(self, user_id: int, session: Dict) -> bool:
+        """Сохраняет новую сессию в Redis; ``False``, если сессия уже существует."""
         session_key = f"session:{user_id}"
-        self.redis_client.setex(
+        return bool(self.redis_client.set(
             session_key,
-            self.session_ttl,
-            json.dumps(session, default=str)
-        )
+            json.dumps(session, default=str),
+            ex=self.session_ttl,
+            nx=True
+        ))
+    
+    async def _update_session(self, user_id: int, update: Callable[[Dict], None]) -> Dict:
+        """Атомарно изменяет сессию в Redis и возвращает её новое состояние.
+        
+        Чтение и запись выполняются в транзакции под WATCH: если сессию
+        изменил параллельный запрос, ``update`` повторяется по её новому
+        состоянию, и ничьи изменения не теряются.
+        """
+        session_key = f"session:{user_id}"
+        with self.redis_client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(session_key)
+                    session_data = pipe.get(session_key)
+                    if not session_data:
+                        pipe.unwatch()
+                        await self.get_or_create_session(user_id)
+                        continue
+                    
+                    session = json.loads(session_data)
+                    update(session)
+                    session["last_activity"] = datetime.now().isoformat()
+                    
+                    pipe.multi()
+                    pipe.set(session_key, json.dumps(session, default=str), ex=self.session_ttl)
+                    pipe.execute()
+                    return session
+                except redis.WatchError:
+                    continue
     
     async def _save_session_to_db(self, session: Dict) -> None:
         """Сохраняет сессию в базе данных."""
@@ -76,11 +116,10 @@ class SessionService:
     
     async def update_session_context(self, user_id: int, context_key: str, context_value: any) -> None:
         """Обновляет контекст сессии."""
-        session = await self.get_or_create_session(user_id)
-        session["context"][context_key] = context_value
-        session["last_activity"] = datetime.now().isoformat()
+        def update(session: Dict) -> None:
+            session["context"][context_key] = context_value
         
-        await self._save_session_to_redis(user_id, session)
+        await self._update_session(user_id, update)
     
     async def get_session_context(self, user_id: int, context_key: str) -> any:
         """Получает значение из контекста сессии."""
@@ -126,23 +165,71 @@ class SessionService:
             await message_repo.save(message)
         
         # Обновляем историю в Redis
-        session = await self.get_or_create_session(user_id)
-        
-        interaction = {
+        await self.add_to_history(user_id, {
             "user_message": user_message,
             "bot_response": bot_response,
             "timestamp": datetime.now().isoformat(),
             "context_used": context_used
-        }
+        })
+    
+    async def add_to_history(self, user_id: int, interaction: Dict) -> None:
+        """Добавляет реплику в историю сессии и при необходимости запускает сжатие.
         
-        session["conversation_history"].append(interaction)
+        Без резюме история ограничена ``conversation_history_limit`` репликами.
+        С резюме реплики сверх предела сначала сворачиваются в резюме и только
+        при неудачном сжатии отбрасываются после ``conversation_history_hard_limit``.
+        """
+        if self.summarizer is None:
+            limit = self.conversation_history_limit
+        else:
+            limit = self.conversation_history_hard_limit
+        dropped: List[Dict] = []
         
-        # Ограничиваем размер истории
-        if len(session["conversation_history"]) > self.conversation_history_limit:
-            session["conversation_history"] = session["conversation_history"][-self.conversation_history_limit:]
+        def append(session: Dict) -> None:
+            history = session["conversation_history"]
+            history.append(interaction)
+            # Ограничиваем размер истории
+            dropped[:] = history[:-limit]
+            session["conversation_history"] = history[-limit:]
         
-        session["last_activity"] = datetime.now().isoformat()
-        await self._save_session_to_redis(user_id, session)
+        session = await self._update_session(user_id, append)
+        
+        if dropped and self.summarizer is not None:
+            logger.warning(f"Conversation of user {user_id}: {len(dropped)} turns dropped without summary")
+        
+        if self.summarizer is not None and self.summarizer.needs_summary(
+            session, max_turns=self.conversation_history_limit
+        ):
+            self.summarizer.schedule(user_id, self)
+    
+    async def apply_summary(
+        self,
+        user_id: int,
+        summary: str,
+        summarized: Iterable[str]
+    ) -> None:
+        """Заменяет свёрнутые реплики (по меткам времени) резюме диалога."""
+        summarized = set(summarized)
+        
+        def replace(session: Dict) -> None:
+            session["conversation_history"] = [
+                interaction for interaction in session["conversation_history"]
+                if interaction["timestamp"] not in summarized
+            ]
+            session["summary"] = summary
+        
+        await self._update_session(user_id, replace)
+    
+    async def get_conversation_state(
+        self,
+        user_id: int,
+        limit: int = 5
+    ) -> Tuple[Optional[str], List[Dict]]:
+        """Возвращает резюме ранней части диалога и последние N реплик."""
+        session = await self.get_or_create_session(user_id)
+        history = session.get("conversation_history", [])
+        
+        return session.get("summary"), history[-limit:] if history else []
     
     async def get_conversation_history(self, user_id: int, limit: int = 5) -> List[Dict]:
         """Получает историю диалога пользователя."""
@@ -154,11 +241,11 @@ class SessionService:
     
     async def clear_conversation_history(self, user_id: int) -> None:
         """Очищает историю диалога."""
-        session = await self.get_or_create_session(user_id)
-        session["conversation_history"] = []
-        session["last_activity"] = datetime.now().isoformat()
+        def clear(session: Dict) -> None:
+            session["conversation_history"] = []
+            session.pop("summary", None)
         
-        await self._save_session_to_redis(user_id, session)
+        await self._update_session(user_id, clear)
     
     async def close_session(self, user_id: int) -> None:
         """Закрывает активную сессию пользователя."""
@@ -3,7 +3,7 @@ from .logging_config import setup_logging
 from .security import hash_password, verify_password, generate_token
 from .validators import validate_username, ensure_not_none
 from .formatters import format_datetime, format_file_size, format_duration
-from .helpers import chunked
+from .helpers import chunked, file_sha256
 
 __all__ = [
     "setup_logging",
@@ -15,5 +15,6 @@ __all__ = [
     "format_datetime",
     "format_file_size",
     "format_duration",
-    "chunked"
+    "chunked",
+    "file_sha256"
 ]
@@ -1,4 +1,6 @@
-from typing import Iterable, List, TypeVar
+import hashlib
+from pathlib import Path
+from typing import Iterable, List, TypeVar, Union
 
 T = TypeVar("T")
 
@@ -14,3 +16,12 @@ def chunked(iterable: Iterable[T], n: int) -> List[List[T]]:
     if buf:
         result.append(buf)
     return result
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = 1024 * 1024) -> str:
+    """Вычисляет SHA-256 файла, читая его блоками фиксированного размера."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
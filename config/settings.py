@@ -82,6 +82,44 @@ class AIConfig:
     model: str = "deepseek-chat"
     max_tokens: int = 2000
     temperature: float = 0.7
+    streaming: bool = True
+    stream_edit_interval: float = 1.5
+    # Сколько вопрос ждёт прогрева ИИ-рантайма после запуска бота, секунд
+    warmup_wait: float = 10.0
+    # Семантический кеш ответов: порог косинусного сходства вопросов
+    answer_cache: bool = True
+    answer_cache_threshold: float = 0.92
+    answer_cache_size: int = 2000
+    answer_cache_ttl: int = 7 * 24 * 3600
+    # Кеш ответов DeepSeek по точному совпадению запроса
+    response_cache_size: int = 1000
+    response_cache_max_bytes: int = 32 * 1024 * 1024
+    response_cache_ttl: int = 3600
+    response_cache_redis: bool = True
+    # Сколько одинаковые запросы ждут ответа на первый из них, секунд
+    single_flight_timeout: float = 120.0
+    # Регулятор нагрузки на DeepSeek API: лимиты в минуту (0 — без лимита),
+    # адаптивная параллельность и очередь ожидания
+    rate_requests_per_minute: int = 120
+    rate_tokens_per_minute: int = 0
+    concurrency_initial: int = 4
+    concurrency_max: int = 10
+    latency_target: float = 20.0
+    queue_size: int = 100
+    queue_timeout: float = 30.0
+    # Выключатель: число отказов подряд и пауза до пробного запроса, секунд
+    circuit_failure_threshold: int = 5
+    circuit_recovery_timeout: float = 30.0
+    # Бюджет запроса к модели: всего токенов, доля истории, число реплик истории
+    max_prompt_tokens: int = 6000
+    history_share: float = 0.25
+    history_turns: int = 5
+    # Сжатие длинной истории: порог в токенах, сколько последних реплик
+    # оставлять дословно и предельная длина резюме
+    summary_enabled: bool = True
+    summary_threshold_tokens: int = 1500
+    summary_keep_turns: int = 2
+    summary_max_tokens: int = 300
     
     @classmethod
     def from_env(cls) -> 'AIConfig':
@@ -90,7 +128,37 @@ class AIConfig:
             base_url=os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com'),
             model=os.getenv('DEEPSEEK_MODEL', 'deepseek-chat'),
             max_tokens=int(os.getenv('AI_MAX_TOKENS', '2000')),
-            temperature=float(os.getenv('AI_TEMPERATURE', '0.7'))
+            temperature=float(os.getenv('AI_TEMPERATURE', '0.7')),
+            streaming=os.getenv('AI_STREAMING', 'true').lower() == 'true',
+            stream_edit_interval=float(os.getenv('AI_STREAM_EDIT_INTERVAL', '1.5')),
+            warmup_wait=float(os.getenv('AI_WARMUP_WAIT', '10')),
+            answer_cache=os.getenv('AI_ANSWER_CACHE', 'true').lower() == 'true',
+            answer_cache_threshold=float(os.getenv('AI_ANSWER_CACHE_THRESHOLD', '0.92')),
+            answer_cache_size=int(os.getenv('AI_ANSWER_CACHE_SIZE', '2000')),
+            answer_cache_ttl=int(os.getenv('AI_ANSWER_CACHE_TTL', str(7 * 24 * 3600))),
+            response_cache_size=int(os.getenv('AI_RESPONSE_CACHE_SIZE', '1000')),
+            response_cache_max_bytes=int(
+                os.getenv('AI_RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024))
+            ),
+            response_cache_ttl=int(os.getenv('AI_RESPONSE_CACHE_TTL', '3600')),
+            response_cache_redis=os.getenv('AI_RESPONSE_CACHE_REDIS', 'true').lower() == 'true',
+            single_flight_timeout=float(os.getenv('AI_SINGLE_FLIGHT_TIMEOUT', '120')),
+            rate_requests_per_minute=int(os.getenv('AI_RATE_REQUESTS_PER_MINUTE', '120')),
+            rate_tokens_per_minute=int(os.getenv('AI_RATE_TOKENS_PER_MINUTE', '0')),
+            concurrency_initial=int(os.getenv('AI_CONCURRENCY_INITIAL', '4')),
+            concurrency_max=int(os.getenv('AI_CONCURRENCY_MAX', '10')),
+            latency_target=float(os.getenv('AI_LATENCY_TARGET', '20')),
+            queue_size=int(os.getenv('AI_QUEUE_SIZE', '100')),
+            queue_timeout=float(os.getenv('AI_QUEUE_TIMEOUT', '30')),
+            circuit_failure_threshold=int(os.getenv('AI_CIRCUIT_FAILURE_THRESHOLD', '5')),
+            circuit_recovery_timeout=float(os.getenv('AI_CIRCUIT_RECOVERY_TIMEOUT', '30')),
+            max_prompt_tokens=int(os.getenv('AI_MAX_PROMPT_TOKENS', '6000')),
+            history_share=float(os.getenv('AI_HISTORY_SHARE', '0.25')),
+            history_turns=int(os.getenv('AI_HISTORY_TURNS', '5')),
+            summary_enabled=os.getenv('AI_SUMMARY', 'true').lower() == 'true',
+            summary_threshold_tokens=int(os.getenv('AI_SUMMARY_THRESHOLD_TOKENS', '1500')),
+            summary_keep_turns=int(os.getenv('AI_SUMMARY_KEEP_TURNS', '2')),
+            summary_max_tokens=int(os.getenv('AI_SUMMARY_MAX_TOKENS', '300'))
         )
     
     @staticmethod
@@ -100,6 +168,102 @@ class AIConfig:
             raise ValueError(f"Required environment variable {key} is not set")
         return value
 
+@dataclass
+class RAGConfig:
+    """Конфигурация поиска по документам"""
+    documents_path: str = "data/documents"
+    index_path: str = "data/vector_index"
+    ingestion_workers: int = 0
+    embed_batch_size: int = 256
+    # Размер фрагмента в токенах модели эмбеддингов (окно MiniLM — 128 с учётом служебных токенов)
+    chunk_max_tokens: int = 126
+    chunk_overlap_tokens: int = 24
+    # Гибридный поиск: векторный и BM25, объединённые reciprocal rank fusion
+    hybrid_search: bool = True
+    dense_score_threshold: float = 0.5
+    # Кандидатов от каждого поиска на один возвращаемый фрагмент
+    hybrid_candidates: int = 4
+    rrf_k: int = 60
+    # Тип FAISS-индекса: auto (по числу векторов), flat, hnsw или ivfpq
+    index_type: str = "auto"
+    hnsw_min_vectors: int = 20000
+    ivfpq_min_vectors: int = 500000
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 200
+    hnsw_ef_search: int = 128
+    ivf_nprobe: int = 32
+    pq_m: int = 48
+    # Переранжирование кандидатов кросс-энкодером
+    rerank_enabled: bool = False
+    rerank_model: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+    rerank_candidates: int = 30
+    rerank_timeout_ms: float = 300.0
+    rerank_max_length: int = 256
+    rerank_batch_size: int = 64
+    
+    @classmethod
+    def from_env(cls) -> 'RAGConfig':
+        return cls(
+            documents_path=os.getenv('RAG_DOCUMENTS_PATH', 'data/documents'),
+            index_path=os.getenv('RAG_INDEX_PATH', 'data/vector_index'),
+            ingestion_workers=int(os.getenv('RAG_INGESTION_WORKERS', '0')),
+            embed_batch_size=int(os.getenv('RAG_EMBED_BATCH_SIZE', '256')),
+            chunk_max_tokens=int(os.getenv('RAG_CHUNK_MAX_TOKENS', '126')),
+            chunk_overlap_tokens=int(os.getenv('RAG_CHUNK_OVERLAP_TOKENS', '24')),
+            hybrid_search=os.getenv('RAG_HYBRID_SEARCH', 'true').lower() == 'true',
+            dense_score_threshold=float(os.getenv('RAG_DENSE_SCORE_THRESHOLD', '0.5')),
+            hybrid_candidates=int(os.getenv('RAG_HYBRID_CANDIDATES', '4')),
+            rrf_k=int(os.getenv('RAG_RRF_K', '60')),
+            index_type=os.getenv('RAG_INDEX_TYPE', 'auto'),
+            hnsw_min_vectors=int(os.getenv('RAG_HNSW_MIN_VECTORS', '20000')),
+            ivfpq_min_vectors=int(os.getenv('RAG_IVFPQ_MIN_VECTORS', '500000')),
+            hnsw_m=int(os.getenv('RAG_HNSW_M', '32')),
+            hnsw_ef_construction=int(os.getenv('RAG_HNSW_EF_CONSTRUCTION', '200')),
+            hnsw_ef_search=int(os.getenv('RAG_HNSW_EF_SEARCH', '128')),
+            ivf_nprobe=int(os.getenv('RAG_IVF_NPROBE', '32')),
+            pq_m=int(os.getenv('RAG_PQ_M', '48')),
+            rerank_enabled=os.getenv('RAG_RERANK_ENABLED', 'false').lower() == 'true',
+            rerank_model=os.getenv('RAG_RERANK_MODEL', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'),
+            rerank_candidates=int(os.getenv('RAG_RERANK_CANDIDATES', '30')),
+            rerank_timeout_ms=float(os.getenv('RAG_RERANK_TIMEOUT_MS', '300')),
+            rerank_max_length=int(os.getenv('RAG_RERANK_MAX_LENGTH', '256')),
+            rerank_batch_size=int(os.getenv('RAG_RERANK_BATCH_SIZE', '64'))
+        )
+
+@dataclass
+class EmbeddingConfig:
+    """Конфигурация модели эмбеддингов"""
+    model_name: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    # Бэкенд вычислений: torch или onnx (модель из scripts/export_onnx_model.py)
+    backend: str = "torch"
+    onnx_path: str = "data/models/onnx"
+    onnx_quantized: bool = True
+    onnx_threads: int = 0
+    # Объединение конкурентных запросов в пачки
+    max_batch_size: int = 32
+    max_wait_ms: float = 5.0
+    # Кеш эмбеддингов запросов
+    cache_size: int = 10000
+    cache_ttl: int = 7 * 24 * 3600
+    cache_redis: bool = True
+    
+    @classmethod
+    def from_env(cls) -> 'EmbeddingConfig':
+        return cls(
+            model_name=os.getenv(
+                'EMBEDDING_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+            ),
+            backend=os.getenv('EMBEDDING_BACKEND', 'torch'),
+            onnx_path=os.getenv('EMBEDDING_ONNX_PATH', 'data/models/onnx'),
+            onnx_quantized=os.getenv('EMBEDDING_ONNX_QUANTIZED', 'true').lower() == 'true',
+            onnx_threads=int(os.getenv('EMBEDDING_ONNX_THREADS', '0')),
+            max_batch_size=int(os.getenv('EMBEDDING_MAX_BATCH_SIZE', '32')),
+            max_wait_ms=float(os.getenv('EMBEDDING_MAX_WAIT_MS', '5')),
+            cache_size=int(os.getenv('EMBEDDING_CACHE_SIZE', '10000')),
+            cache_ttl=int(os.getenv('EMBEDDING_CACHE_TTL', str(7 * 24 * 3600))),
+            cache_redis=os.getenv('EMBEDDING_CACHE_REDIS', 'true').lower() == 'true'
+        )
+
 @dataclass
 class SecurityConfig:
     """Конфигурация безопасности"""
@@ -134,6 +298,8 @@ class AppConfig:
     database: DatabaseConfig
     bot: BotConfig
     ai: AIConfig
+    rag: RAGConfig
+    embedding: EmbeddingConfig
     security: SecurityConfig
     redis: RedisConfig
     
@@ -150,6 +316,8 @@ class AppConfig:
             database=DatabaseConfig.from_env(),
             bot=BotConfig.from_env(),
             ai=AIConfig.from_env(),
+            rag=RAGConfig.from_env(),
+            embedding=EmbeddingConfig.from_env(),
             security=SecurityConfig.from_env(),
             redis=RedisConfig.from_env()
         )
@@ -0,0 +1,131 @@
+"""Пакетные ответы на вопросы из JSONL.
+
+Каждая строка входного файла — объект с полем ``question`` и необязательными
+``id`` и ``expected_sources`` (имена файлов документов, в которых должен
+найтись ответ). В выходной JSONL для каждого вопроса пишутся ответ,
+идентификаторы и источники найденных фрагментов, время поиска и генерации.
+Если у вопросов есть ``expected_sources``, в конце печатается доля вопросов,
+для которых нашёлся хотя бы один ожидаемый источник, — проверка качества
+поиска после переиндексации.
+
+    python -m scripts.batch_answer questions.jsonl answers.jsonl
+        [--top-k 3] [--concurrency 4] [--retrieval-only] [--public-only]
+        [--category Положения] [--store-cache]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.services.ai_runtime import AIRuntime
+from app.services.batch_qa_service import BatchAnswer, BatchQAService, BatchQuestion
+
+
+def load_questions(path: Path) -> List[Dict[str, Any]]:
+    """Читает вопросы; строкам без ``id`` присваивается номер строки."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not record.get("question"):
+                raise ValueError(f"Строка {line_number}: нет поля question")
+            record.setdefault("id", str(line_number))
+            records.append(record)
+    return records
+
+
+def source_matches(sources: List[str], expected: List[str]) -> bool:
+    """Среди найденных фрагментов есть фрагмент одного из ожидаемых документов."""
+    names = {Path(source).name for source in sources}
+    return any(Path(name).name in names for name in expected)
+
+
+def build_filters(args: argparse.Namespace) -> Optional[Dict[str, Any]]:
+    filters: Dict[str, Any] = {}
+    if args.public_only:
+        filters["is_public"] = True
+    if args.category:
+        filters["category"] = args.category
+    return filters or None
+
+
+async def run(args: argparse.Namespace) -> int:
+    records = load_questions(Path(args.input))
+    if not records:
+        print("Нет вопросов.")
+        return 0
+    expected = {record["id"]: record.get("expected_sources") or [] for record in records}
+
+    runtime = AIRuntime()
+    await runtime.warm_up()
+    if not runtime.is_ready:
+        print(f"Не удалось загрузить компоненты: {runtime.error}")
+        return 1
+
+    service = BatchQAService(
+        runtime.ai_service,
+        top_k=args.top_k,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        store_answers=args.store_cache
+    )
+    questions = [BatchQuestion(question=record["question"], question_id=record["id"]) for record in records]
+
+    answers: List[BatchAnswer] = []
+    hits = checked = 0
+    started = time.perf_counter()
+    try:
+        with open(args.output, "w", encoding="utf-8") as out:
+            async for answer in service.answer(
+                questions, filters=build_filters(args), retrieval_only=args.retrieval_only
+            ):
+                record = answer.to_dict()
+                if expected[answer.question_id]:
+                    record["hit"] = source_matches(answer.sources, expected[answer.question_id])
+                    checked += 1
+                    hits += record["hit"]
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+
+                answers.append(answer)
+                if len(answers) % 50 == 0:
+                    print(f"Обработано {len(answers)}/{len(questions)}")
+    finally:
+        await runtime.close()
+
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for answer in answers if answer.error)
+    print(f"Вопросов: {len(answers)}, ошибок: {failed}, за {elapsed:.1f} с")
+    print(f"Поиск: {statistics.mean(answer.retrieval_ms for answer in answers):.1f} мс на вопрос")
+    generated = [answer.generation_ms for answer in answers if answer.answer is not None]
+    if generated:
+        print(f"Генерация: медиана {statistics.median(generated):.0f} мс")
+    if checked:
+        print(f"Ожидаемый источник найден: {hits}/{checked} ({hits / checked:.1%})")
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Пакетные ответы на вопросы из JSONL")
+    parser.add_argument("input", help="JSONL с вопросами")
+    parser.add_argument("output", help="JSONL с ответами")
+    parser.add_argument("--top-k", type=int, default=3, help="фрагментов в контексте ответа")
+    parser.add_argument("--concurrency", type=int, default=4, help="одновременных запросов к модели")
+    parser.add_argument("--batch-size", type=int, default=256, help="вопросов в одном пакетном поиске")
+    parser.add_argument("--retrieval-only", action="store_true", help="только поиск, без ответов модели")
+    parser.add_argument("--public-only", action="store_true", help="только общедоступные документы")
+    parser.add_argument("--category", action="append", help="категория документов (можно несколько)")
+    parser.add_argument("--store-cache", action="store_true", help="сохранить ответы в семантический кеш")
+    args = parser.parse_args()
+
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Сравнение приближённых индексов с точным: recall@k и задержка поиска.
+
+Векторы берутся из текущего FAISS-индекса хранилища или генерируются
+синтетически (кластеры на единичной сфере). Эталонные соседи считаются
+точным перебором (``flat``); для HNSW перебираются значения ``efSearch``,
+для IVF-PQ — ``nprobe``. По результату выбираются значения
+``RAG_HNSW_EF_SEARCH`` и ``RAG_IVF_NPROBE``.
+
+    python -m scripts.benchmark_ann [--synthetic 200000] [--k 10]
+        [--ef-search 16,32,64,128,256] [--nprobe 4,8,16,32,64]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from config.settings import config
+from app.ai_integration.ann_index import (
+    INDEX_FLAT,
+    INDEX_HNSW,
+    INDEX_IVFPQ,
+    ANNParams,
+    build_index,
+    index_type_of,
+    min_training_vectors,
+    search_params,
+)
+from app.ai_integration.vector_store import VectorStore
+
+
+def load_vectors(limit: int) -> Optional[np.ndarray]:
+    """Векторы из сохранённого индекса хранилища (кроме сжатого IVF-PQ)."""
+    index_file = Path(config.rag.index_path) / VectorStore.INDEX_FILE
+    if not index_file.exists():
+        return None
+
+    index = faiss.read_index(str(index_file), faiss.IO_FLAG_MMAP)
+    if index_type_of(index) == INDEX_IVFPQ or not index.ntotal:
+        return None
+    count = min(limit, index.ntotal) if limit else index.ntotal
+    return index.index.reconstruct_n(0, count)
+
+
+def synthetic_vectors(count: int, dimension: int, clusters: int = 200) -> np.ndarray:
+    """Кластеризованные нормированные векторы — ближе к эмбеддингам, чем шум."""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((clusters, dimension)).astype('float32')
+    vectors = centers[rng.integers(0, clusters, count)]
+    vectors += 0.6 * rng.standard_normal((count, dimension)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int) -> np.ndarray:
+    """Запросы — зашумлённые векторы корпуса."""
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), count)].copy()
+    queries += 0.1 * rng.standard_normal(queries.shape).astype('float32')
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def measure(
+    index: faiss.Index,
+    params: ANNParams,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    k: int
+) -> Tuple[float, float, float]:
+    """Recall@k и задержка одиночных запросов (p50, p95) в миллисекундах."""
+    search = search_params(index, params, k)
+    index.search(queries[:1], k, params=search)  # прогрев
+
+    latencies = []
+    found = []
+    for query in queries:
+        started = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k, params=search)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append(ids[0])
+
+    hits = sum(len(np.intersect1d(ids, expected)) for ids, expected in zip(found, truth))
+    latencies.sort()
+    return (
+        hits / truth.size,
+        statistics.median(latencies),
+        latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+    )
+
+
+def parse_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Recall и задержка приближённых FAISS-индексов")
+    parser.add_argument("--synthetic", type=int, default=0, help="число синтетических векторов вместо индекса")
+    parser.add_argument("--limit", type=int, default=0, help="предел числа векторов из индекса")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", default="16,32,64,128,256")
+    parser.add_argument("--nprobe", default="4,8,16,32,64")
+    args = parser.parse_args()
+
+    vectors = None if args.synthetic else load_vectors(args.limit)
+    if vectors is None:
+        count = args.synthetic or 100000
+        print(f"Синтетический корпус: {count} векторов")
+        vectors = synthetic_vectors(count, args.dimension)
+    else:
+        print(f"Векторы из индекса хранилища: {len(vectors)}")
+
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    ids = np.arange(len(vectors), dtype='int64')
+    queries = make_queries(vectors, args.queries)
+    base = ANNParams.from_config(config.rag)
+    dimension = vectors.shape[1]
+
+    indexes: Dict[str, faiss.Index] = {}
+    for index_type in (INDEX_FLAT, INDEX_HNSW, INDEX_IVFPQ):
+        if index_type == INDEX_IVFPQ and len(vectors) < min_training_vectors(len(vectors)):
+            print(f"{index_type}: пропущен — нужно не меньше {min_training_vectors(len(vectors))} векторов")
+            continue
+        started = time.perf_counter()
+        indexes[index_type] = build_index(vectors, ids, dimension, base, index_type=index_type)
+        print(f"{index_type}: построен за {time.perf_counter() - started:.1f} с")
+
+    _, truth = indexes[INDEX_FLAT].search(queries, args.k)
+
+    print(f"\n{'index':<8} {'param':<14} {f'recall@{args.k}':>10} {'p50, ms':>8} {'p95, ms':>8}")
+    recall, p50, p95 = measure(indexes[INDEX_FLAT], base, queries, truth, args.k)
+    print(f"{INDEX_FLAT:<8} {'-':<14} {recall:>10.4f} {p50:>8.3f} {p95:>8.3f}")
+
+    for ef_search in parse_list(args.ef_search):
+        params = ANNParams(**{**base.__dict__, "hnsw_ef_search": ef_search})
+        recall, p50, p95 = measure(indexes[INDEX_HNSW], params, queries, truth, args.k)
+        print(f"{INDEX_HNSW:<8} {f'efSearch={ef_search}':<14} {recall:>10.4f} {p50:>8.3f} {p95:>8.3f}")
+
+    if INDEX_IVFPQ in indexes:
+        for nprobe in parse_list(args.nprobe):
+            params = ANNParams(**{**base.__dict__, "ivf_nprobe": nprobe})
+            recall, p50, p95 = measure(indexes[INDEX_IVFPQ], params, queries, truth, args.k)
+            print(f"{INDEX_IVFPQ:<8} {f'nprobe={nprobe}':<14} {recall:>10.4f} {p50:>8.3f} {p95:>8.3f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
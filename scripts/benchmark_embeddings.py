@@ -0,0 +1,176 @@
+"""Сравнение бэкендов эмбеддингов: совпадение векторов, задержка и память.
+
+Каждый бэкенд запускается в отдельном процессе, чтобы пиковая память
+(RSS) и время загрузки измерялись независимо. Для эмбеддингов ONNX
+печатается косинусное сходство с эталонными эмбеддингами PyTorch; порог
+совпадения проверяет тест ``tests/test_embedding_backends.py``. Пиковая
+память измеряется только в POSIX.
+
+    python -m scripts.benchmark_embeddings [--texts 200] [--queries 100]
+"""
+import argparse
+import multiprocessing
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config.settings import config
+from app.ai_integration.embedding_backends import cosine_parity
+
+try:
+    import resource
+except ImportError:
+    # Windows: модуля resource нет, пиковая память не измеряется
+    resource = None
+
+SAMPLE_QUERIES = [
+    "Как вступить в СРО?",
+    "Какой размер взноса в компенсационный фонд возмещения вреда?",
+    "Какие документы нужны для вступления в саморегулируемую организацию?",
+    "Кто может быть специалистом по организации строительства?",
+    "Как часто проводится проверка членов СРО?",
+    "Что грозит за нарушение требований стандартов СРО?",
+    "Как получить выписку из реестра членов СРО?",
+    "Требования к квалификации руководителя строительной организации",
+    "Порядок уплаты членских взносов",
+    "Можно ли выйти из СРО добровольно и вернуть взнос?",
+]
+
+# (название, бэкенд, квантование) в порядке запуска; первый — эталон
+VARIANTS = [
+    ("torch", "torch", False),
+    ("onnx-fp32", "onnx", False),
+    ("onnx-int8", "onnx", True),
+]
+
+
+def load_texts(limit: int) -> List[str]:
+    """Берёт тексты фрагментов из индекса, а при его отсутствии — примеры вопросов."""
+    from app.ai_integration.segment_store import SegmentStore
+
+    texts: List[str] = []
+    index_path = Path(config.rag.index_path)
+    if (index_path / "chunks.idx").exists():
+        store = SegmentStore(index_path)
+        for _, text, _ in store.iter_records():
+            texts.append(text)
+            if len(texts) >= limit:
+                break
+        store.close()
+
+    while len(texts) < limit:
+        texts.extend(SAMPLE_QUERIES)
+    return texts[:limit]
+
+
+def run_variant(
+    backend_name: str,
+    quantized: bool,
+    texts: List[str],
+    queries: List[str],
+    batch_size: int
+) -> Dict[str, Any]:
+    """Загружает бэкенд в текущем (дочернем) процессе и измеряет его."""
+    from app.ai_integration.embedding_backends import load_backend
+
+    started = time.perf_counter()
+    backend = load_backend(
+        backend_name,
+        config.embedding.model_name,
+        onnx_path=config.embedding.onnx_path,
+        onnx_quantized=quantized,
+        onnx_threads=config.embedding.onnx_threads
+    )
+    load_time = time.perf_counter() - started
+
+    backend.encode(queries[:1])  # прогрев
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        backend.encode([query])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    embeddings = []
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embeddings.append(backend.encode(texts[i:i + batch_size]))
+    batch_time = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "load_time": load_time,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0],
+        "texts_per_second": len(texts) / batch_time if batch_time else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "embeddings": np.vstack(embeddings).astype(np.float32),
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковая память текущего процесса; ``None``, где её не измерить."""
+    if resource is None:
+        return None
+    # ru_maxrss в Linux измеряется в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Сравнение бэкендов эмбеддингов")
+    parser.add_argument("--texts", type=int, default=200, help="число текстов для проверки совпадения")
+    parser.add_argument("--queries", type=int, default=100, help="число одиночных запросов")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    texts = load_texts(args.texts)
+    queries = [SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)] for i in range(args.queries)]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for label, backend_name, quantized in VARIANTS:
+        # Новый процесс на каждый бэкенд: память и импорты не смешиваются
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            try:
+                results[label] = executor.submit(
+                    run_variant, backend_name, quantized, texts, queries, args.batch_size
+                ).result()
+            except Exception as e:
+                print(f"{label}: пропущен ({type(e).__name__}: {e})")
+
+    if "torch" not in results:
+        print("Эталонный бэкенд torch недоступен")
+        return 1
+
+    reference = results["torch"]["embeddings"]
+    print(
+        f"{'backend':<10} {'load, s':>8} {'p50, ms':>8} {'p95, ms':>8} "
+        f"{'texts/s':>8} {'RSS, MB':>8} {'cos min':>8} {'cos mean':>8}"
+    )
+
+    for label, result in results.items():
+        cos_min: Optional[float] = None
+        cos_mean: Optional[float] = None
+        if label != "torch":
+            cos_min, cos_mean = cosine_parity(reference, result["embeddings"])
+        rss = result["peak_rss_mb"]
+
+        print(
+            f"{label:<10} {result['load_time']:>8.2f} {result['p50_ms']:>8.2f} "
+            f"{result['p95_ms']:>8.2f} {result['texts_per_second']:>8.1f} "
+            f"{'-' if rss is None else f'{rss:.0f}':>8} "
+            f"{'-' if cos_min is None else f'{cos_min:.4f}':>8} "
+            f"{'-' if cos_mean is None else f'{cos_mean:.4f}':>8}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Экспорт модели эмбеддингов в ONNX для бэкенда EMBEDDING_BACKEND=onnx.
+
+Сохраняет в каталог ``config.embedding.onnx_path`` граф трансформера
+(``model.onnx``), его динамически квантованную int8-версию
+(``model_int8.onnx``), ``tokenizer.json`` и параметры пулинга.
+Требует torch и sentence-transformers; запускается один раз при смене модели.
+
+    python -m scripts.export_onnx_model [--no-quantize] [--output DIR]
+"""
+import argparse
+import json
+from pathlib import Path
+
+import torch
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.models import Normalize, Pooling
+
+from config.settings import config
+from app.ai_integration.embedding_backends import OnnxBackend
+
+OPSET_VERSION = 14
+
+
+class TokenEmbeddings(torch.nn.Module):
+    """Трансформер без пулинга: пулинг выполняется в OnnxBackend."""
+
+    def __init__(self, transformer: torch.nn.Module):
+        super().__init__()
+        self.transformer = transformer
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.transformer(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+
+def export_model(model_name: str, output: Path, quantize: bool = True) -> None:
+    output.mkdir(parents=True, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    model.eval()
+
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    if not pooling.pooling_mode_mean_tokens:
+        raise ValueError(f"Модель {model_name} использует не mean pooling")
+
+    tokenizer = model.tokenizer
+    sample = tokenizer(["Порядок вступления в СРО"], return_tensors="pt")
+
+    model_file = output / OnnxBackend.MODEL_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(model[0].auto_model),
+            (sample["input_ids"], sample["attention_mask"]),
+            str(model_file),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["token_embeddings"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_embeddings": {0: "batch", 1: "sequence"},
+            },
+            opset_version=OPSET_VERSION
+        )
+    print(f"Экспортирована модель: {model_file}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_file = output / OnnxBackend.QUANTIZED_MODEL_FILE
+        quantize_dynamic(str(model_file), str(quantized_file), weight_type=QuantType.QInt8)
+        print(f"Квантованная модель: {quantized_file}")
+
+    # save_pretrained быстрого токенизатора создаёт tokenizer.json
+    tokenizer.save_pretrained(str(output))
+
+    settings = {
+        "model_name": model_name,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "normalize": any(isinstance(module, Normalize) for module in model),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    }
+    (output / OnnxBackend.CONFIG_FILE).write_text(
+        json.dumps(settings, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    print(f"Параметры модели: {settings}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Экспорт модели эмбеддингов в ONNX")
+    parser.add_argument("--model", default=config.embedding.model_name)
+    parser.add_argument("--output", default=config.embedding.onnx_path)
+    parser.add_argument("--no-quantize", action="store_true", help="не создавать int8-версию")
+    args = parser.parse_args()
+
+    export_model(args.model, Path(args.output), quantize=not args.no_quantize)
+
+
+if __name__ == "__main__":
+    main()
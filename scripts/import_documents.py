@@ -6,6 +6,7 @@ from datetime import datetime
 from app.database.connection import get_async_session
 from app.database.repositories.document_repository import DocumentRepository
 from app.models.document import Document
+from app.utils.helpers import file_sha256
 
 DOCUMENTS_PATH = Path('data/documents')
 
@@ -26,7 +27,7 @@ def get_document_info(file_path: Path):
         'file_size': file_path.stat().st_size,
         'download_count': 0,
         'version': '1.0',
-        'content_hash': '',
+        'content_hash': file_sha256(file_path),
     }
 
 async def import_documents():
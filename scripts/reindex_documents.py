@@ -0,0 +1,61 @@
+"""Инкрементальная переиндексация каталога документов.
+
+Переиндексирует только изменившиеся файлы (по SHA-256), удаляет из индекса
+фрагменты удалённых файлов, обновляет поля документов (категория, тип,
+доступность) в индексе и хэши документов в базе данных.
+Предназначен для ночного запуска по расписанию; запущенный бот увидит
+изменения индекса после перезапуска. Пока бот синхронизирует индекс
+(блокировка ``index.lock`` в каталоге индекса), скрипт не запускается.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+from config.settings import config
+from app.ai_integration.index_lock import IndexLockedError
+from app.ai_integration.rag_system import RAGSystem
+from app.database.connection import get_async_session
+from app.database.repositories.document_repository import DocumentRepository
+
+DOCUMENTS_PATH = Path(config.rag.documents_path)
+
+
+async def reindex_documents() -> int:
+    rag_system = RAGSystem()
+    try:
+        return await _reindex(rag_system)
+    finally:
+        await rag_system.vector_store.embedding_service.close()
+
+
+async def _reindex(rag_system: RAGSystem) -> int:
+    try:
+        stats = await rag_system.sync_documents(DOCUMENTS_PATH, wait=False)
+    except IndexLockedError:
+        print("Индекс обновляется другим процессом, переиндексация пропущена.")
+        return 1
+    if stats is None:
+        print("База данных недоступна, переиндексация отложена.")
+        return 1
+    print(f"Индексация завершена: {stats.summary()}")
+
+    updated = 0
+    async with get_async_session() as session:
+        repo = DocumentRepository(session)
+        for source, entry in rag_system.vector_store.manifest.items():
+            content_hash = entry.get('content_hash')
+            if not content_hash or not source.startswith(str(DOCUMENTS_PATH)):
+                continue
+
+            rel_path = str(Path(source).relative_to(DOCUMENTS_PATH))
+            document = await repo.get_by_file_path(rel_path)
+            if document and document.content_hash != content_hash:
+                await repo.update_document_hash(document.id, content_hash)
+                updated += 1
+
+    print(f"Обновлены хэши документов в базе: {updated}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(reindex_documents()))
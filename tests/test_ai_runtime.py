@@ -0,0 +1,88 @@
+"""Тесты общего ИИ-рантайма."""
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.services import ai_runtime as runtime_module
+from app.services.ai_runtime import AIRuntime, close_ai_runtime, get_ai_runtime, init_ai_runtime
+
+
+def test_runtime_is_shared_by_the_process():
+    async def scenario():
+        runtime = await init_ai_runtime()
+        try:
+            assert await init_ai_runtime() is runtime
+            assert get_ai_runtime() is runtime
+        finally:
+            await close_ai_runtime()
+
+        with pytest.raises(RuntimeError):
+            get_ai_runtime()
+
+    asyncio.run(scenario())
+    assert runtime_module._ai_runtime is None
+
+
+def test_registering_handlers_does_not_import_ml_libraries():
+    code = (
+        "import sys\n"
+        "before = set(sys.modules)\n"
+        "import app.bot.handlers\n"
+        "heavy = {'faiss', 'torch', 'sentence_transformers', 'onnxruntime'} & (set(sys.modules) - before)\n"
+        "print(','.join(sorted(heavy)))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).resolve().parent.parent,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    assert result.stdout.strip() == ""
+
+
+def test_failed_warm_up_reports_error_and_can_be_restarted(monkeypatch):
+    attempts = []
+
+    def build(runtime):
+        attempts.append(runtime)
+        if len(attempts) == 1:
+            raise OSError("model files missing")
+        runtime.embedding_service = FakeEmbeddingService()
+        runtime.rag_system = FakeRAGSystem()
+
+    monkeypatch.setattr(AIRuntime, "_build", build)
+
+    async def scenario():
+        runtime = AIRuntime()
+        assert runtime.status == "not_started"
+
+        assert not await runtime.wait_ready()
+        assert runtime.status == "error"
+        assert runtime.error == "OSError: model files missing"
+
+        assert await runtime.wait_ready()
+        assert runtime.status == "ready"
+        assert runtime.rag_system.initialized
+        assert runtime.start_warm_up().done()
+
+    asyncio.run(scenario())
+    assert len(attempts) == 2
+
+
+class FakeEmbeddingService:
+    async def encode(self, text):
+        return [0.0]
+
+
+class FakeRAGSystem:
+    initialized = False
+
+    async def initialize(self):
+        self.initialized = True
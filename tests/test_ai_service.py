@@ -0,0 +1,87 @@
+"""Тесты консультационного сервиса."""
+import asyncio
+
+import pytest
+
+from app.ai_integration.deepseek_sdk import DeepSeekUnavailable
+from app.monitoring.metrics import REGISTRY
+from app.services.ai_service import AIService
+
+
+class FakeSessionService:
+    summarizer = None
+
+    def __init__(self):
+        self.saved = []
+
+    async def get_conversation_state(self, user_id, limit=5):
+        return None, []
+
+    async def save_interaction(self, **interaction):
+        self.saved.append(interaction)
+
+
+class FakeDeepSeek:
+    def __init__(self, error=None):
+        self.error = error
+
+    async def chat_completion(self, messages):
+        if self.error is not None:
+            raise self.error
+        return "Ответ"
+
+
+class FakeRAG:
+    async def search(self, query, top_k=5, filters=None):
+        return []
+
+
+def make_service(error=None) -> AIService:
+    service = AIService(rag_system=FakeRAG(), deepseek_client=FakeDeepSeek(error))
+    service.session_service = FakeSessionService()
+    return service
+
+
+def observed(status: str) -> float:
+    value = REGISTRY.get_sample_value(
+        "bot_response_time_seconds_count", {"event_type": "ai_consultation", "status": status}
+    )
+    return value or 0.0
+
+
+@pytest.mark.parametrize("error, status", [
+    (None, "success"),
+    (DeepSeekUnavailable("circuit open"), "degraded"),
+    (RuntimeError("boom"), "error"),
+])
+def test_response_time_is_labelled_with_the_outcome(error, status):
+    service = make_service(error)
+    before = observed(status)
+
+    answer = asyncio.run(service.generate_consultation_response(
+        "Как вступить в СРО?", user_id=1, context="Контекст", check_cache=False
+    ))
+
+    assert observed(status) == before + 1
+    assert answer.startswith("❌") == (status == "error")
+
+
+class FoundRAG:
+    async def search(self, query, top_k=5, filters=None):
+        return [{
+            "content": "Для вступления в СРО   подаётся заявление " + "и пакет документов " * 40,
+            "metadata": {"source": "/docs/Положение о членстве.pdf", "section": "Раздел 2", "page_start": 3},
+        }]
+
+
+def test_degraded_answer_quotes_found_documents():
+    service = AIService(rag_system=FoundRAG(), deepseek_client=FakeDeepSeek(DeepSeekUnavailable("circuit open")))
+    service.session_service = FakeSessionService()
+
+    answer = asyncio.run(service.generate_consultation_response(
+        "Как вступить в СРО?", user_id=1, context="Контекст", check_cache=False
+    ))
+
+    assert answer.startswith("⚠️ ИИ-консультант временно недоступен")
+    assert "1. «Положение о членстве», Раздел 2, с. 3\nДля вступления в СРО подаётся заявление" in answer
+    assert answer.endswith("…")
@@ -0,0 +1,104 @@
+"""Тесты уровней FAISS-индекса и выбора между ними."""
+import asyncio
+
+import faiss
+import numpy as np
+
+from app.ai_integration.ann_index import (
+    INDEX_FLAT,
+    INDEX_HNSW,
+    INDEX_IVFPQ,
+    ANNParams,
+    build_index,
+    create_index,
+    index_type_of,
+    min_training_vectors,
+    needs_retrain,
+    search_params,
+)
+from app.ai_integration.vector_store import VectorStore
+from tests.test_vector_store import DIMENSION, HashEmbeddings, add_source
+
+
+def random_vectors(count: int, dimension: int = 16, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_select_type_follows_corpus_size():
+    params = ANNParams(hnsw_min_vectors=1000, ivfpq_min_vectors=100000)
+
+    assert params.select_type(999) == INDEX_FLAT
+    assert params.select_type(1000) == INDEX_HNSW
+    assert params.select_type(100000) == INDEX_IVFPQ
+    assert ANNParams(index_type=INDEX_HNSW).select_type(10) == INDEX_HNSW
+
+
+def test_ivfpq_falls_back_to_hnsw_without_enough_training_vectors():
+    params = ANNParams(index_type=INDEX_IVFPQ)
+
+    assert min_training_vectors(1000) > 1000
+    assert params.select_type(1000) == INDEX_HNSW
+    assert params.select_type(30000) == INDEX_IVFPQ
+
+
+def test_hnsw_finds_the_same_neighbours_as_exact_search():
+    vectors = random_vectors(2000)
+    ids = np.arange(100, 2100)
+    params = ANNParams(hnsw_m=16, hnsw_ef_search=64)
+    exact = build_index(vectors, ids, 16, params, index_type=INDEX_FLAT)
+    hnsw = build_index(vectors, ids, 16, params, index_type=INDEX_HNSW)
+    queries = vectors[:50]
+
+    _, exact_ids = exact.search(queries, 10)
+    _, hnsw_ids = hnsw.search(queries, 10, params=search_params(hnsw, params, 10))
+
+    assert index_type_of(hnsw) == INDEX_HNSW
+    assert (hnsw_ids[:, 0] == ids[:50]).all()
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(exact_ids, hnsw_ids)])
+    assert recall >= 0.95
+
+
+def test_search_params_apply_the_id_selector():
+    vectors = random_vectors(100)
+    index = build_index(vectors, np.arange(100), 16, ANNParams(), index_type=INDEX_FLAT)
+    selector = faiss.IDSelectorBatch(np.arange(50, 60, dtype="int64"))
+
+    _, found = index.search(vectors[:1], 5, params=search_params(index, ANNParams(), 5, selector))
+
+    assert set(found[0].tolist()) <= set(range(50, 60))
+    assert search_params(index, ANNParams(), 5) is None
+
+
+def test_ivfpq_index_asks_for_retraining_after_growth():
+    params = ANNParams(pq_m=4)
+    index = create_index(INDEX_IVFPQ, 16, params, vector_count=16)
+    index.train(random_vectors(min_training_vectors(16)))
+    index.add_with_ids(random_vectors(60, seed=1), np.arange(60))
+    assert not needs_retrain(index)
+
+    index.add_with_ids(random_vectors(10, seed=2), np.arange(60, 70))
+
+    assert needs_retrain(index)
+    assert not needs_retrain(build_index(random_vectors(70), np.arange(70), 16, params, index_type=INDEX_FLAT))
+
+
+def test_store_upgrades_flat_index_when_corpus_grows(tmp_path):
+    async def scenario():
+        store = VectorStore(
+            dimension=DIMENSION,
+            index_path=str(tmp_path),
+            embedding_service=HashEmbeddings(),
+            ann_params=ANNParams(hnsw_min_vectors=100)
+        )
+        await add_source(store, "a.pdf", count=60)
+        assert index_type_of(store.index) == INDEX_FLAT
+
+        await add_source(store, "b.pdf", count=60)
+        assert index_type_of(store.index) == INDEX_HNSW
+        assert store.index.ntotal == 120
+
+        results = await store.search("b.pdf text 7", top_k=1)
+        assert results[0]["content"] == "b.pdf text 7"
+
+    asyncio.run(scenario())
@@ -0,0 +1,129 @@
+"""Тесты пакетных ответов на вопросы."""
+import asyncio
+import json
+
+from app.ai_integration.deepseek_sdk import DeepSeekUnavailable
+from app.services.batch_qa_service import BatchQAService, BatchQuestion
+from scripts.batch_answer import load_questions, source_matches
+
+
+class FakeRAG:
+    def __init__(self, error=None):
+        self.error = error
+        self.batches = []
+
+    async def search_batch(self, queries, top_k=3, filters=None):
+        self.batches.append(list(queries))
+        if self.error is not None:
+            raise self.error
+        return [
+            [{"content": f"фрагмент {query}", "score": 0.9, "metadata": {"chunk_id": i, "source": "/docs/a.pdf"}}]
+            for i, query in enumerate(queries)
+        ]
+
+
+class FakeDeepSeek:
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.active = 0
+        self.max_active = 0
+
+    async def chat_completion(self, messages):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            question = messages[-1]["content"]
+            if question in self.failing:
+                raise self.failing[question]
+            return f"Ответ на {question}"
+        finally:
+            self.active -= 1
+
+
+class FakeAIService:
+    def __init__(self, rag=None, deepseek=None):
+        self.rag_system = rag or FakeRAG()
+        self.deepseek_client = deepseek or FakeDeepSeek()
+        self.stored = []
+
+    def prepare_standalone_messages(self, question, chunks):
+        return [{"role": "user", "content": question}]
+
+    async def store_answer(self, question, answer, chunks):
+        self.stored.append(question)
+
+
+def questions(count: int):
+    return [BatchQuestion(question=f"вопрос {i}", question_id=str(i)) for i in range(count)]
+
+
+def collect(service: BatchQAService, batch, **kwargs):
+    async def scenario():
+        return [answer async for answer in service.answer(batch, **kwargs)]
+    return asyncio.run(scenario())
+
+
+def test_questions_are_searched_in_batches_and_answered_with_bounded_concurrency():
+    ai_service = FakeAIService()
+    service = BatchQAService(ai_service, concurrency=2, batch_size=4, store_answers=True)
+
+    answers = collect(service, questions(10))
+
+    assert [len(batch) for batch in ai_service.rag_system.batches] == [4, 4, 2]
+    assert ai_service.deepseek_client.max_active == 2
+    assert sorted(answer.question_id for answer in answers) == [str(i) for i in range(10)]
+    for answer in answers:
+        assert answer.answer == f"Ответ на {answer.question}"
+        assert answer.sources == ["/docs/a.pdf"]
+        assert answer.error is None
+    assert len(ai_service.stored) == 10
+
+
+def test_retrieval_only_does_not_call_the_model():
+    ai_service = FakeAIService()
+    service = BatchQAService(ai_service)
+
+    answers = collect(service, questions(3), retrieval_only=True)
+
+    assert [answer.chunk_ids for answer in answers] == [[0], [1], [2]]
+    assert all(answer.answer is None for answer in answers)
+    assert ai_service.deepseek_client.max_active == 0
+
+
+def test_failures_are_reported_per_question():
+    deepseek = FakeDeepSeek(failing={
+        "вопрос 0": DeepSeekUnavailable("circuit open"),
+        "вопрос 1": RuntimeError("boom"),
+    })
+    service = BatchQAService(FakeAIService(deepseek=deepseek), store_answers=True)
+
+    answers = {answer.question_id: answer for answer in collect(service, questions(3))}
+
+    assert answers["0"].error == "unavailable: circuit open"
+    assert answers["1"].error == "boom"
+    assert answers["2"].answer == "Ответ на вопрос 2"
+    assert service.ai_service.stored == ["вопрос 2"]
+
+
+def test_failed_retrieval_marks_the_whole_batch():
+    ai_service = FakeAIService(rag=FakeRAG(error=RuntimeError("index missing")))
+    service = BatchQAService(ai_service)
+
+    answers = collect(service, questions(2))
+
+    assert [answer.error for answer in answers] == ["retrieval: index missing"] * 2
+    assert ai_service.deepseek_client.max_active == 0
+
+
+def test_load_questions_numbers_lines_without_id(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    path.write_text(
+        json.dumps({"question": "Как вступить?"}, ensure_ascii=False) + "\n\n"
+        + json.dumps({"question": "Какой взнос?", "id": "fee"}, ensure_ascii=False) + "\n",
+        encoding="utf-8"
+    )
+
+    assert [record["id"] for record in load_questions(path)] == ["1", "fee"]
+    assert source_matches(["/docs/Положение.pdf"], ["Положение.pdf"])
+    assert not source_matches(["/docs/Устав.pdf"], ["Положение.pdf"])
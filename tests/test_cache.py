@@ -0,0 +1,146 @@
+"""Тесты кешей ИИ-компонентов."""
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import numpy as np
+
+from app.ai_integration import cache as cache_module
+from app.ai_integration import embeddings
+from app.ai_integration.cache import LocalCache, TieredCache, cache_key
+from app.monitoring.metrics import REGISTRY
+from config.settings import config
+
+
+class Clock:
+    """Управляемое время для проверки TTL."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FailingRedis:
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+
+    async def set(self, key, value, ex=None):
+        raise ConnectionError("redis is down")
+
+
+def cache_requests(name: str, tier: str, result: str) -> float:
+    return REGISTRY.get_sample_value(
+        "ai_cache_requests_total", {"cache": name, "tier": tier, "result": result}
+    ) or 0.0
+
+
+def test_cache_key_ignores_case_whitespace_and_yo():
+    assert cache_key("model", "Как  вступить в СРО?") == cache_key("model", " как вступить\tв сро? ")
+    assert cache_key("model", "Ёлка") == cache_key("model", "елка")
+    assert cache_key("model", "вопрос") != cache_key("other-model", "вопрос")
+
+
+def test_local_cache_evicts_least_recently_used():
+    local = LocalCache(max_size=2, name="test-lru")
+    local.set("a", b"1")
+    local.set("b", b"2")
+    assert local.get("a") == b"1"
+
+    local.set("c", b"3")
+
+    assert local.get("b") is None
+    assert (local.get("a"), local.get("c")) == (b"1", b"3")
+
+
+def test_local_cache_expires_entries_by_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    local = LocalCache(ttl=10, name="test-ttl")
+    local.set("default", b"1")
+    local.set("long", b"2", ttl=100)
+
+    clock.now += 11
+
+    assert local.get("default") is None
+    assert local.get("long") == b"2"
+    assert len(local) == 1
+
+
+def test_local_cache_limits_total_bytes():
+    local = LocalCache(max_bytes=10, name="test-bytes")
+    local.set("a", b"12345")
+    local.set("b", b"12345")
+    local.set("c", b"123")
+    local.set("huge", b"x" * 11)
+
+    assert local.get("a") is None
+    assert local.get("huge") is None
+    assert local.size_bytes == 8
+
+
+def test_tiered_cache_shares_values_between_processes_through_redis():
+    server = fakeredis.FakeServer()
+
+    async def scenario():
+        first = TieredCache("test-shared", redis_url="redis://cache")
+        second = TieredCache("test-shared", redis_url="redis://cache")
+        first._redis = fakeredis.aioredis.FakeRedis(server=server)
+        second._redis = fakeredis.aioredis.FakeRedis(server=server)
+
+        await first.set("key", b"value")
+        redis_hits = cache_requests("test-shared", "redis", "hit")
+        assert await second.get("key") == b"value"
+        assert cache_requests("test-shared", "redis", "hit") == redis_hits + 1
+
+        # Повторный запрос отвечает локальный уровень второго процесса
+        await first._redis.flushall()
+        assert await second.get("key") == b"value"
+
+    asyncio.run(scenario())
+
+
+def test_tiered_cache_works_locally_while_redis_is_down():
+    async def scenario():
+        tiered = TieredCache("test-down", redis_url="redis://cache")
+        tiered._redis = FailingRedis()
+
+        await tiered.set("key", b"value")
+        assert tiered._get_redis() is None
+        assert await tiered.get("key") == b"value"
+        assert await tiered.get("missing") is None
+
+    asyncio.run(scenario())
+
+
+class CountingBackend:
+    name = "fake"
+    model_name = "fake-model"
+    device = "cpu"
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+def test_repeated_query_embedding_skips_the_model(monkeypatch):
+    backend = CountingBackend()
+    monkeypatch.setattr(embeddings, "load_backend", lambda *args, **kwargs: backend)
+    monkeypatch.setattr(config.embedding, "cache_redis", False)
+
+    async def scenario():
+        service = embeddings.EmbeddingService()
+        try:
+            first = await service.encode_cached("Как вступить в СРО?")
+            second = await service.encode_cached("как  вступить в сро?")
+        finally:
+            await service.close()
+        np.testing.assert_array_equal(first, second)
+        assert second.dtype == np.float32
+
+    asyncio.run(scenario())
+    assert backend.calls == 1
@@ -0,0 +1,41 @@
+"""Тесты разбиения документов на фрагменты."""
+from app.ai_integration.chunker import StructuredChunker
+
+
+def test_offsets_of_split_lines_point_into_source_text():
+    page1 = "Статья 1. Общие\n" + "слово  другое\tтретье " * 30 + "\nКонец. Предложение два;  три."
+    page2 = "Раздел 2\n" + "Длинное предложение номер один с   двойными пробелами. " * 8
+    text = page1 + "\n" + page2
+
+    chunks = StructuredChunker(max_tokens=20, overlap_tokens=4).chunk([page1, page2])
+
+    assert chunks
+    for chunk in chunks:
+        lines = chunk.text.split("\n")
+        start, end = chunk.metadata["char_start"], chunk.metadata["char_end"]
+        assert 0 <= start < end <= len(text)
+        assert text[start:end].startswith(lines[0])
+        assert text[start:end].endswith(lines[-1])
+
+
+def test_stream_emits_chunks_as_pages_arrive():
+    chunker = StructuredChunker(
+        count_tokens=lambda texts: [len(text.split()) for text in texts],
+        max_tokens=30,
+        overlap_tokens=5
+    )
+    stream = chunker.stream()
+    pages = [f"Страница {number}. " + "текст положения о членстве " * 12 for number in range(1, 501)]
+
+    emitted = []
+    for number, page in enumerate(pages, 1):
+        chunks = stream.feed(page)
+        assert chunks, f"page {number} produced no finished chunks"
+        # Незавершённым остаётся не больше одного фрагмента
+        assert chunker._tokens(stream._buffer) <= chunker.max_tokens
+        emitted.extend(chunks)
+    emitted.extend(stream.finish())
+
+    assert emitted[0].metadata["page_start"] == 1
+    assert emitted[-1].metadata["page_end"] == len(pages)
+    assert [chunk.text for chunk in emitted] == [chunk.text for chunk in chunker.chunk(pages)]
@@ -0,0 +1,110 @@
+"""Тесты автоматического выключателя DeepSeek API."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.ai_integration import circuit_breaker as breaker_module
+from app.ai_integration.circuit_breaker import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+)
+from app.ai_integration import deepseek_sdk
+from app.ai_integration.deepseek_sdk import DeepSeekError, DeepSeekUnavailable
+from tests.test_deepseek_sdk import MESSAGES, make_client
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(breaker_module.time, "monotonic", clock)
+    return clock
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test-open", failure_threshold=3, recovery_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+
+    breaker.record_failure()
+
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = CircuitBreaker("test-probe", failure_threshold=2, recovery_timeout=10)
+    open_breaker(breaker)
+
+    clock.now += 10
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    # Проба не сообщила исход — следующая разрешается через recovery_timeout
+    clock.now += 10
+    assert breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_opens_the_circuit_again(clock):
+    breaker = CircuitBreaker("test-reopen", failure_threshold=2, recovery_timeout=10)
+    open_breaker(breaker)
+    clock.now += 10
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == STATE_OPEN
+    clock.now += 9
+    assert not breaker.allow_request()
+    clock.now += 1
+    assert breaker.allow_request()
+
+
+def test_open_circuit_rejects_requests_without_calling_the_api(monkeypatch):
+    monkeypatch.setattr(deepseek_sdk, "backoff_delay", lambda attempt: 0.0)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(503)
+
+    async def scenario():
+        client = make_client(handler)
+        client._breaker = CircuitBreaker("test-client", failure_threshold=2, recovery_timeout=60)
+        client.max_retries = 2
+        try:
+            with pytest.raises(DeepSeekError, match="Server error 503"):
+                await client.chat_completion(MESSAGES, temperature=0.1)
+            assert not client.is_available
+
+            with pytest.raises(DeepSeekUnavailable):
+                await client.chat_completion(MESSAGES, temperature=0.2)
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
+    assert len(requests) == 2
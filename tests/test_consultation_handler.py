@@ -0,0 +1,91 @@
+"""Тесты обработчика консультационных вопросов."""
+import asyncio
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from config.settings import config
+from app.bot.handlers.consultation import (
+    STREAM_CURSOR,
+    TELEGRAM_MESSAGE_LIMIT,
+    _stream_to_message,
+    cmd_question,
+)
+
+
+class FakeMessage:
+    def __init__(self, text: str = ""):
+        self.text = text
+        self.from_user = SimpleNamespace(id=42)
+        self.edits = []
+        self.replies = []
+
+    async def answer(self, text: str) -> "FakeMessage":
+        reply = FakeMessage(text)
+        self.replies.append(reply)
+        return reply
+
+    async def edit_text(self, text: str) -> None:
+        self.edits.append(text)
+
+
+class FakeRuntime:
+    def __init__(self, ai_service, document_service):
+        self.ai_service = ai_service
+        self.document_service = document_service
+
+    async def wait_ready(self, timeout=None) -> bool:
+        return True
+
+
+def test_cache_hit_skips_document_search():
+    class CachedAIService:
+        async def cached_consultation_response(self, user_question, user_id, filters=None):
+            return "Ответ из кеша"
+
+    class FailingDocumentService:
+        async def search_relevant_chunks(self, *args, **kwargs):
+            raise AssertionError("search must not run on a cache hit")
+
+    message = FakeMessage("/question Как вступить в СРО?")
+    runtime = FakeRuntime(CachedAIService(), FailingDocumentService())
+
+    asyncio.run(cmd_question(message, runtime))
+
+    assert message.replies[0].edits == ["Ответ из кеша"]
+
+
+async def deltas(*parts):
+    for part in parts:
+        yield part
+
+
+def test_stream_shows_the_full_answer_and_continues_long_text():
+    message = FakeMessage()
+    typing_message = FakeMessage()
+    text = "а" * TELEGRAM_MESSAGE_LIMIT + "б" * 10
+
+    asyncio.run(_stream_to_message(message, typing_message, deltas(text[:100], text[100:])))
+
+    # Первая правка — сразу после первого фрагмента, с курсором
+    assert typing_message.edits[0] == text[:100] + STREAM_CURSOR
+    assert typing_message.edits[-1] == text[:TELEGRAM_MESSAGE_LIMIT]
+    assert [reply.text for reply in message.replies] == ["б" * 10]
+
+
+def test_final_edit_is_retried_after_flood_limit(monkeypatch):
+    monkeypatch.setattr(config.ai, "stream_edit_interval", 60.0)
+
+    class FloodedMessage(FakeMessage):
+        floods = 1
+
+        async def edit_text(self, text):
+            if text == "Ответ целиком" and self.floods:
+                self.floods -= 1
+                raise TelegramRetryAfter(method=None, message="flood", retry_after=0)
+            await super().edit_text(text)
+
+    typing_message = FloodedMessage()
+    asyncio.run(_stream_to_message(FakeMessage(), typing_message, deltas("Ответ", " целиком")))
+
+    assert typing_message.edits == ["Ответ" + STREAM_CURSOR, "Ответ целиком"]
@@ -0,0 +1,149 @@
+"""Тесты клиента DeepSeek API на подменённом HTTP-транспорте."""
+import asyncio
+import json
+
+import fakeredis
+import fakeredis.aioredis
+import httpx
+import pytest
+
+from app.ai_integration.cache import TieredCache
+from app.ai_integration.deepseek_sdk import DeepSeekClient, DeepSeekError
+from app.monitoring.metrics import REGISTRY
+
+MESSAGES = [{"role": "user", "content": "Как вступить в СРО?"}]
+
+
+def make_client(handler, cache=None) -> DeepSeekClient:
+    client = DeepSeekClient(api_key="sk-test-0123456789", cache=cache)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def completion(content: str, usage=None) -> httpx.Response:
+    return httpx.Response(200, json={
+        "model": "deepseek-chat",
+        "choices": [{"message": {"content": content}, "finish_reason": "stop"}],
+        "usage": usage or {"total_tokens": 10},
+    })
+
+
+def billed_tokens(kind: str) -> float:
+    return REGISTRY.get_sample_value(
+        "ai_llm_tokens_total", {"model": "deepseek-chat", "kind": kind}
+    ) or 0.0
+
+
+def sse(*events) -> bytes:
+    return "".join(f"data: {event}\n\n" for event in events).encode()
+
+
+def test_stream_yields_content_deltas_until_done():
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        body = sse(
+            json.dumps({"choices": [{"delta": {"role": "assistant"}}]}),
+            json.dumps({"choices": [{"delta": {"content": "Подайте "}}]}),
+            json.dumps({"choices": [{"delta": {"content": "заявление."}}]}),
+            json.dumps({"choices": [], "usage": {"total_tokens": 12}}),
+            "[DONE]",
+        )
+        return httpx.Response(200, content=body, headers={"content-type": "text/event-stream"})
+
+    async def scenario():
+        client = make_client(handler)
+        try:
+            return [delta async for delta in client.chat_completion_stream(MESSAGES)]
+        finally:
+            await client.close()
+
+    assert asyncio.run(scenario()) == ["Подайте ", "заявление."]
+
+
+def test_repeated_request_is_answered_from_cache():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return completion("Подайте заявление.")
+
+    async def scenario():
+        client = make_client(handler)
+        try:
+            first = await client.chat_completion(MESSAGES)
+            second = await client.chat_completion(MESSAGES)
+            other = await client.chat_completion(MESSAGES, temperature=0.1)
+        finally:
+            await client.close()
+        assert first == second
+        assert other.content == "Подайте заявление."
+
+    asyncio.run(scenario())
+    assert len(requests) == 2
+
+
+def test_response_cache_is_shared_between_clients_through_redis():
+    server = fakeredis.FakeServer()
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return completion("Подайте заявление.")
+
+    def shared_cache() -> TieredCache:
+        cache = TieredCache("test-llm", redis_url="redis://cache")
+        cache._redis = fakeredis.aioredis.FakeRedis(server=server)
+        return cache
+
+    async def scenario():
+        first = make_client(handler, cache=shared_cache())
+        second = make_client(handler, cache=shared_cache())
+        try:
+            await first.chat_completion(MESSAGES)
+            response = await second.chat_completion(MESSAGES)
+        finally:
+            await first.close()
+            await second.close()
+        assert response.content == "Подайте заявление."
+
+    asyncio.run(scenario())
+    assert len(requests) == 1
+
+
+def test_failed_response_is_not_cached():
+    responses = [httpx.Response(400, json={"error": "bad request"}), completion("Ответ.")]
+
+    async def scenario():
+        client = make_client(lambda request: responses.pop(0))
+        try:
+            with pytest.raises(DeepSeekError):
+                await client.chat_completion(MESSAGES)
+            response = await client.chat_completion(MESSAGES)
+        finally:
+            await client.close()
+        assert response.content == "Ответ."
+
+    asyncio.run(scenario())
+    assert responses == []
+
+
+def test_prompt_cache_hits_are_recorded_from_usage():
+    usage = {
+        "prompt_cache_hit_tokens": 1200,
+        "prompt_cache_miss_tokens": 300,
+        "completion_tokens": 150,
+        "total_tokens": 1650,
+    }
+    before = {kind: billed_tokens(kind) for kind in ("prompt_cache_hit", "prompt_cache_miss", "completion")}
+
+    async def scenario():
+        client = make_client(lambda request: completion("Ответ.", usage))
+        try:
+            await client.chat_completion(MESSAGES, temperature=0.3)
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
+    assert billed_tokens("prompt_cache_hit") == before["prompt_cache_hit"] + 1200
+    assert billed_tokens("prompt_cache_miss") == before["prompt_cache_miss"] + 300
+    assert billed_tokens("completion") == before["completion"] + 150
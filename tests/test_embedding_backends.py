@@ -0,0 +1,41 @@
+"""Совпадение эмбеддингов ONNX Runtime с эталонной моделью PyTorch.
+
+Тест выполняется, если модель экспортирована скриптом
+``scripts/export_onnx_model.py`` в ``config.embedding.onnx_path``.
+"""
+from pathlib import Path
+
+import pytest
+
+from config.settings import config
+from app.ai_integration.embedding_backends import OnnxBackend, TorchBackend, cosine_parity
+
+SAMPLE_TEXTS = [
+    "Как вступить в СРО?",
+    "Какой размер взноса в компенсационный фонд возмещения вреда?",
+    "Кто может быть специалистом по организации строительства?",
+    "Порядок уплаты членских взносов",
+    "Члены саморегулируемой организации обязаны соблюдать требования стандартов "
+    "и внутренних документов СРО, а также условия членства.",
+]
+
+
+@pytest.mark.parametrize(
+    "quantized, min_cosine",
+    [(False, 0.999), (True, 0.97)],
+    ids=["fp32", "int8"]
+)
+def test_onnx_embeddings_match_torch(quantized, min_cosine):
+    model_file = OnnxBackend.QUANTIZED_MODEL_FILE if quantized else OnnxBackend.MODEL_FILE
+    if not (Path(config.embedding.onnx_path) / model_file).exists():
+        pytest.skip(f"ONNX model {model_file} is not exported")
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("sentence_transformers")
+
+    onnx = OnnxBackend(
+        config.embedding.onnx_path, model_name=config.embedding.model_name, quantized=quantized
+    )
+    torch = TorchBackend(config.embedding.model_name)
+
+    cos_min, _ = cosine_parity(torch.encode(SAMPLE_TEXTS), onnx.encode(SAMPLE_TEXTS))
+    assert cos_min >= min_cosine
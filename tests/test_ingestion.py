@@ -0,0 +1,108 @@
+"""Тесты инкрементальной синхронизации каталога документов."""
+import asyncio
+import hashlib
+
+import docx
+
+from app.ai_integration.chunker import StructuredChunker
+from app.ai_integration.document_processor import DocumentProcessor
+from app.ai_integration.ingestion import IngestionPipeline
+from app.utils.helpers import file_sha256
+from tests.test_vector_store import open_store
+
+
+def make_pipeline(index_path) -> IngestionPipeline:
+    chunker = StructuredChunker(
+        count_tokens=lambda texts: [len(text.split()) for text in texts],
+        max_tokens=64,
+        overlap_tokens=8
+    )
+    return IngestionPipeline(
+        open_store(index_path, "flat"),
+        document_processor=DocumentProcessor(chunker),
+        max_workers=1
+    )
+
+
+def write_docx(path, text: str) -> None:
+    document = docx.Document()
+    document.add_paragraph(text)
+    document.save(str(path))
+
+
+def test_sync_skips_unchanged_and_drops_deleted_files(tmp_path):
+    docs = tmp_path / "docs"
+    (docs / "sub").mkdir(parents=True)
+    write_docx(docs / "a.docx", "Первый документ о вступлении в СРО.")
+    write_docx(docs / "sub" / "b.docx", "Второй документ о взносах.")
+
+    async def scenario():
+        pipeline = make_pipeline(tmp_path / "index")
+        stats = await pipeline.sync(docs)
+        assert (stats.files, stats.failed) == (2, 0)
+        assert set(pipeline.vector_store.manifest) == {str(docs / "a.docx"), str(docs / "sub" / "b.docx")}
+
+        (docs / "sub" / "b.docx").unlink()
+        stats = await pipeline.sync(docs)
+        assert (stats.skipped, stats.deleted) == (1, 1)
+        assert set(pipeline.vector_store.manifest) == {str(docs / "a.docx")}
+
+    asyncio.run(scenario())
+
+
+def test_sync_reindexes_changed_files_and_updates_document_fields(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    path = docs / "a.docx"
+    source = str(path)
+    write_docx(path, "Старая редакция положения.")
+
+    async def scenario():
+        pipeline = make_pipeline(tmp_path / "index")
+        await pipeline.sync(docs, documents={source: {"category": "Положения"}})
+        old_ranges = pipeline.vector_store.manifest[source]["ranges"]
+
+        stats = await pipeline.sync(docs, documents={source: {"category": "Регламенты"}})
+        assert (stats.files, stats.skipped) == (0, 1)
+        assert pipeline.vector_store.get_source_document(source) == {"category": "Регламенты"}
+
+        write_docx(path, "Новая редакция положения с изменённым порядком вступления.")
+        stats = await pipeline.sync(docs)
+        assert (stats.files, stats.skipped) == (1, 0)
+        assert pipeline.vector_store.get_source_hash(source) == file_sha256(path)
+        assert pipeline.vector_store.manifest[source]["ranges"] != old_ranges
+
+    asyncio.run(scenario())
+
+
+def test_file_sha256_reads_in_blocks(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 100)
+
+    assert file_sha256(path, chunk_size=1000) == hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_discover_finds_only_supported_formats(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("a.docx", "b.PDF", "sub/c.doc", "notes.txt", "image.png"):
+        (tmp_path / name).write_bytes(b"")
+
+    found = IngestionPipeline.discover(tmp_path)
+
+    assert found == sorted([tmp_path / "a.docx", tmp_path / "b.PDF", tmp_path / "sub" / "c.doc"])
+
+
+def test_run_indexes_readable_files_when_one_fails(tmp_path):
+    good = tmp_path / "good.docx"
+    broken = tmp_path / "broken.docx"
+    write_docx(good, "Порядок уплаты членских взносов.")
+    broken.write_bytes(b"not a zip archive")
+
+    async def scenario():
+        pipeline = make_pipeline(tmp_path / "index")
+        stats = await pipeline.run([good, broken])
+        assert (stats.files, stats.failed, stats.pages) == (2, 1, 1)
+        assert stats.chunks > 0
+        assert set(pipeline.vector_store.manifest) == {str(good)}
+
+    asyncio.run(scenario())
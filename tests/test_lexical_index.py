@@ -0,0 +1,40 @@
+"""Тесты лексического (BM25) индекса."""
+from app.ai_integration.lexical_index import LexicalIndex
+
+
+def test_incremental_saves_match_single_build(tmp_path):
+    docs = [
+        (0, "Членские взносы уплачиваются ежеквартально"),
+        (1, "Статья 55.8 Градостроительного кодекса"),
+        (2, "Компенсационный фонд возмещения вреда"),
+        (3, "Взнос в компенсационный фонд по статье 55.16"),
+    ]
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    incremental = LexicalIndex(tmp_path / "a")
+    for record in docs:
+        incremental.add([record])
+        incremental.save()
+
+    single = LexicalIndex(tmp_path / "b")
+    single.add(docs)
+    single.save()
+
+    for query in ("взносы", "статья 55.8", "компенсационный фонд"):
+        assert incremental.search(query, 4) == single.search(query, 4)
+
+
+def test_removed_chunks_are_dropped_and_vocabulary_compacted(tmp_path):
+    (tmp_path / "ix").mkdir()
+    index = LexicalIndex(tmp_path / "ix")
+    index.add([(0, "ростехнадзор проверка"), (1, "проверка документов")])
+    index.save()
+
+    index.remove([0])
+    index.save()
+    index = LexicalIndex(tmp_path / "ix")
+
+    assert len(index) == 1
+    assert index.search("ростехнадзор") == []
+    assert [chunk_id for chunk_id, _ in index.search("проверка")] == [1]
+    assert index.tokenizer.tokenize("ростехнадзор")[0] not in index._terms
@@ -0,0 +1,72 @@
+"""Тесты объединения запросов в пачки."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.ai_integration.micro_batcher import MicroBatcher
+
+
+def test_concurrent_requests_are_split_by_batch_size():
+    sizes = []
+
+    def process(items):
+        sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    async def scenario():
+        batcher = MicroBatcher(process, max_batch_size=4, max_wait=0.05)
+        try:
+            results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        finally:
+            await batcher.close()
+        assert results == [i * 2 for i in range(10)]
+        assert sizes == [4, 4, 2]
+
+    asyncio.run(scenario())
+
+
+def test_batch_error_is_raised_in_every_caller_and_batcher_keeps_working():
+    def process(items):
+        if "bad" in items:
+            raise ValueError("bad item")
+        return items
+
+    async def scenario():
+        batcher = MicroBatcher(process, max_batch_size=8, max_wait=0.05)
+        try:
+            results = await asyncio.gather(
+                batcher.submit("a"), batcher.submit("bad"), return_exceptions=True
+            )
+            assert all(isinstance(result, ValueError) for result in results)
+            assert await batcher.submit("c") == "c"
+        finally:
+            await batcher.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_cancels_the_batch_in_flight():
+    started = threading.Event()
+    release = threading.Event()
+
+    def process(items):
+        started.set()
+        release.wait(5)
+        return items
+
+    async def scenario():
+        executor = ThreadPoolExecutor(max_workers=1)
+        batcher = MicroBatcher(process, max_batch_size=2, max_wait=0, executor=executor)
+        request = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+
+        await batcher.close()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(request, 1)
+
+        release.set()
+        executor.shutdown(wait=True)
+
+    asyncio.run(scenario())
@@ -0,0 +1,102 @@
+"""Тесты сборки запроса к модели в пределах бюджета токенов."""
+from app.ai_integration.prompt_builder import CONTEXT_HEADER, SUMMARY_HEADER, PromptBuilder
+
+SYSTEM = "Ты консультант СРО."
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def chunk(chunk_id: int, words: int, topic: str = "текст") -> dict:
+    return {
+        "content": " ".join(f"{topic}{chunk_id}_{i}" for i in range(words)),
+        "metadata": {"chunk_id": chunk_id},
+    }
+
+
+def turn(number: int, words: int = 20) -> dict:
+    return {
+        "user_message": f"вопрос {number}",
+        "bot_response": " ".join(f"ответ{number}_{i}" for i in range(words)),
+    }
+
+
+def test_prompt_fits_the_budget_by_dropping_least_relevant_chunks():
+    builder = PromptBuilder(max_prompt_tokens=300, count_tokens=count_words)
+    chunks = [chunk(chunk_id, 100) for chunk_id in (5, 2, 9, 7)]
+
+    prompt = builder.build(SYSTEM, "Как вступить?", chunks=chunks, history=[turn(1)])
+
+    assert prompt.total_tokens <= 300
+    assert prompt.dropped_chunks == 1
+    context = prompt.messages[1]["content"]
+    assert context.startswith(CONTEXT_HEADER)
+    # Два самых релевантных фрагмента целиком, третий сокращён под остаток бюджета
+    assert "текст5_99" in context and "текст2_99" in context
+    assert "текст9_0" in context and "текст9_99" not in context
+    assert "текст7_0" not in context
+
+
+def test_history_keeps_newest_turns_within_its_share():
+    builder = PromptBuilder(max_prompt_tokens=400, history_share=0.25, count_tokens=count_words)
+    history = [turn(number) for number in range(1, 6)]
+    chunks = [chunk(chunk_id, 10) for chunk_id in range(40)]
+
+    prompt = builder.build(SYSTEM, "Как вступить?", chunks=chunks, history=history)
+
+    assert prompt.total_tokens <= 400
+    assert prompt.dropped_chunks == 12
+    user_turns = [message["content"] for message in prompt.messages if message["role"] == "user"][:-1]
+    assert user_turns == ["вопрос 3", "вопрос 4", "вопрос 5"]
+    assert prompt.dropped_turns == 2
+
+
+def test_unused_context_budget_goes_to_history_and_summary():
+    builder = PromptBuilder(max_prompt_tokens=400, history_share=0.1, count_tokens=count_words)
+    history = [turn(number) for number in range(1, 6)]
+
+    prompt = builder.build(
+        SYSTEM, "Как вступить?", chunks=[chunk(1, 10)], history=history, summary="Обсуждали взносы."
+    )
+
+    assert prompt.dropped_turns == 0
+    assert {"role": "system", "content": SUMMARY_HEADER + "Обсуждали взносы."} in prompt.messages
+
+
+def test_overlapping_chunks_are_deduplicated():
+    builder = PromptBuilder(count_tokens=count_words)
+    first = "Заявление подаётся в СРО. Решение принимает совет партнёрства."
+    second = "Решение принимает совет партнёрства. Срок рассмотрения тридцать дней."
+
+    prompt = builder.build(SYSTEM, "Как вступить?", context=f"{first}\n\n{second}\n\n{first}")
+
+    assert prompt.messages[1]["content"] == (
+        CONTEXT_HEADER + first + "\n\nСрок рассмотрения тридцать дней."
+    )
+    assert prompt.dropped_chunks == 0
+
+
+def test_too_long_question_is_truncated():
+    builder = PromptBuilder(max_prompt_tokens=100, count_tokens=count_words)
+    question = " ".join(f"слово{i}" for i in range(500))
+
+    prompt = builder.build(SYSTEM, question)
+
+    assert prompt.total_tokens <= 100
+    assert prompt.messages[-1]["content"].endswith("…")
+
+
+def test_same_chunks_give_byte_identical_prefix():
+    builder = PromptBuilder(count_tokens=count_words)
+    chunks = [chunk(chunk_id, 10) for chunk_id in (7, 3, 5)]
+    history = [turn(1)]
+
+    first = builder.build(SYSTEM, "Как вступить?", chunks=chunks, history=history).messages
+    second = builder.build(SYSTEM, "Какой взнос?", chunks=list(reversed(chunks)), history=history).messages
+
+    assert first[:-1] == second[:-1]
+    assert [message["role"] for message in first] == ["system", "system", "user", "assistant", "user"]
+    context = first[1]["content"]
+    assert context.index("текст3_0") < context.index("текст5_0") < context.index("текст7_0")
+    assert (first[-1]["content"], second[-1]["content"]) == ("Как вступить?", "Какой взнос?")
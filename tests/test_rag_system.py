@@ -0,0 +1,103 @@
+"""Тесты инициализации RAG-системы."""
+import asyncio
+
+import pytest
+
+from config.settings import config
+from app.ai_integration.rag_system import DocumentIndexError, DocumentMetadataUnavailable, RAGSystem
+from tests.test_vector_store import HashEmbeddings, open_store
+
+
+class TokenEmbeddings(HashEmbeddings):
+    def count_tokens(self, texts):
+        return [len(text.split()) for text in texts]
+
+
+def make_rag(tmp_path) -> RAGSystem:
+    store = open_store(tmp_path / "index", "flat")
+    store.embedding_service = TokenEmbeddings()
+    return RAGSystem(vector_store=store)
+
+
+def test_postponed_sync_is_retried_after_interval(tmp_path, monkeypatch):
+    rag = make_rag(tmp_path)
+    outcomes = [None, object()]
+    calls = []
+
+    async def sync_documents(documents_path, wait=True):
+        calls.append(documents_path)
+        return outcomes[len(calls) - 1]
+
+    monkeypatch.setattr(rag, "sync_documents", sync_documents)
+
+    async def scenario():
+        await rag.initialize(str(tmp_path))
+        assert not rag._initialized
+        # До истечения интервала синхронизация не повторяется
+        await rag.initialize(str(tmp_path))
+        assert len(calls) == 1
+
+        rag._sync_retry_at = 0.0
+        await rag.initialize(str(tmp_path))
+        assert rag._initialized
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_initialize_does_not_wait_for_a_locked_index(tmp_path, monkeypatch):
+    rag = make_rag(tmp_path)
+    (tmp_path / "docs").mkdir()
+
+    async def load_document_metadata(documents_path):
+        return {}
+
+    monkeypatch.setattr(rag, "load_document_metadata", load_document_metadata)
+
+    async def scenario():
+        with rag.vector_store.write_lock.hold(wait=False) as locked:
+            assert locked
+            await asyncio.wait_for(rag.initialize(str(tmp_path / "docs")), timeout=5)
+        assert not rag._initialized
+        assert rag._sync_retry_at > 0
+
+    asyncio.run(scenario())
+
+
+class StalledReranker:
+    """Модель не успевает за бюджет: возвращается исходный порядок."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def rerank(self, query, results, top_k, timeout=None):
+        self.calls.append((query, timeout))
+        return results[:top_k]
+
+
+def test_batch_rerank_stops_waiting_after_the_budget_is_exhausted(tmp_path):
+    rag = make_rag(tmp_path)
+    rag.reranker = StalledReranker()
+    queries = [f"q{i}" for i in range(20)]
+    candidates = [[{"content": f"{q} a"}, {"content": f"{q} b"}] for q in queries]
+
+    results = asyncio.run(rag._rerank_batch(queries, candidates, top_k=1))
+
+    assert [r[0]["content"] for r in results] == [f"q{i} a" for i in range(20)]
+    # Ждёт модель только первая группа, и её бюджет не зависит от размера пакета
+    assert 0 < len(rag.reranker.calls) < len(queries)
+    assert len({timeout for _, timeout in rag.reranker.calls}) == 1
+    assert rag.reranker.calls[0][1] < config.rag.rerank_timeout_ms / 1000 * len(queries)
+
+
+def test_add_document_reports_unavailable_metadata(tmp_path, monkeypatch):
+    rag = make_rag(tmp_path)
+
+    async def load_document_metadata(documents_path):
+        return None
+
+    monkeypatch.setattr(rag, "load_document_metadata", load_document_metadata)
+
+    with pytest.raises(DocumentMetadataUnavailable):
+        asyncio.run(rag.add_document(str(tmp_path / "doc.pdf")))
+    assert issubclass(DocumentMetadataUnavailable, DocumentIndexError)
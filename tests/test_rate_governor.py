@@ -0,0 +1,151 @@
+"""Тесты регулятора нагрузки на API модели."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from app.ai_integration import rate_governor as governor_module
+from app.ai_integration.rate_governor import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_MEMBER,
+    GovernorOverloaded,
+    RateGovernor,
+    TokenBucket,
+    parse_retry_after,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_concurrency_grows_additively_and_halves_once_per_wave(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(governor_module.time, "monotonic", clock)
+    governor = RateGovernor("test-aimd", requests_per_minute=0, initial_concurrency=4, max_concurrency=8)
+
+    expected = 4.0
+    for _ in range(4):
+        governor._admit(0)
+        governor.release(latency=1.0)
+        expected += 1 / expected
+    assert governor._limit == pytest.approx(expected)
+    assert governor.limit == 4
+
+    # Волна ошибок 429 снижает предел один раз
+    for _ in range(3):
+        governor._admit(0)
+        governor.release(latency=0.5, throttled=True)
+    assert governor.limit == 2
+
+    clock.now += RateGovernor.DECREASE_COOLDOWN
+    governor._admit(0)
+    governor.release(latency=governor.latency_target + 1)
+    assert governor.limit == 1
+
+    clock.now += RateGovernor.DECREASE_COOLDOWN
+    governor._admit(0)
+    governor.release(throttled=True)
+    assert governor.limit == governor.min_concurrency
+
+
+def test_request_that_did_not_run_keeps_the_limit():
+    governor = RateGovernor("test-no-latency", requests_per_minute=0, initial_concurrency=3)
+    governor._admit(0)
+    governor.release(tokens_used=0)
+
+    assert governor._limit == 3
+    assert governor.in_flight == 0
+
+
+def test_queued_requests_are_admitted_by_priority():
+    async def scenario():
+        governor = RateGovernor("test-priority", requests_per_minute=0, initial_concurrency=1)
+        await governor.acquire()
+        order = []
+
+        async def request(priority: int, name: str):
+            await governor.acquire(priority=priority)
+            order.append(name)
+            governor.release(latency=0.1)
+
+        background = asyncio.create_task(request(PRIORITY_BACKGROUND, "batch"))
+        await asyncio.sleep(0)
+        member = asyncio.create_task(request(PRIORITY_MEMBER, "member"))
+        await asyncio.sleep(0)
+
+        governor.release(latency=0.1)
+        await asyncio.gather(background, member)
+        assert order == ["member", "batch"]
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_new_requests():
+    async def scenario():
+        governor = RateGovernor("test-queue", requests_per_minute=0, initial_concurrency=1, max_queue=1)
+        await governor.acquire()
+        waiting = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(GovernorOverloaded):
+            await governor.acquire()
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_take_a_slot():
+    async def scenario():
+        governor = RateGovernor("test-cancel", requests_per_minute=0, initial_concurrency=1)
+        await governor.acquire()
+        waiting = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        governor.release(latency=0.1)
+
+        assert governor.in_flight == 0
+        await asyncio.wait_for(governor.acquire(), 1)
+        assert governor.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_token_reservation_is_settled_with_actual_usage(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(governor_module.time, "monotonic", clock)
+    bucket = TokenBucket(rate_per_minute=600)
+
+    bucket.take(500)
+    assert bucket.delay(200) == pytest.approx(10.0)
+
+    # Запрос израсходовал меньше резерва — излишек возвращается
+    bucket.take(300 - 500)
+    assert bucket.delay(200) == 0
+
+    # Перерасход уводит уровень в минус и задерживает следующие запросы
+    bucket.take(900)
+    assert bucket.delay(1) == pytest.approx(60.1)
+    clock.now += 61
+    assert bucket.delay(1) == 0
+
+
+def test_parse_retry_after_accepts_seconds_and_http_date():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < parse_retry_after(date) <= 30
@@ -0,0 +1,51 @@
+"""Тесты append-only хранилища фрагментов."""
+from app.ai_integration.segment_store import SegmentStore
+
+
+def _records(start, count, source):
+    return [(i, f"{source} text {i}", {"source": source}) for i in range(start, start + count)]
+
+
+def test_append_and_reload(tmp_path):
+    store = SegmentStore(tmp_path)
+    store.append(_records(0, 3, "A"))
+    store.close()
+
+    store = SegmentStore(tmp_path)
+    assert len(store) == 3
+    assert store.get(1) == ("A text 1", {"source": "A"})
+    assert store.get(5) is None
+    assert store.next_id == 3
+
+
+def test_rewrite_does_not_recycle_trailing_ids(tmp_path):
+    store = SegmentStore(tmp_path)
+    store.append(_records(0, 50, "A"))
+    store.append(_records(50, 50, "B"))
+
+    store.rewrite(record for record in store.iter_records() if record[2]["source"] != "B")
+    assert len(store) == 50
+    assert store.next_id == 100
+
+    store.close()
+    store = SegmentStore(tmp_path)
+    assert store.next_id == 100
+
+    store.rewrite([])
+    assert store.next_id == 100
+
+
+def test_appends_are_mapped_only_when_read(tmp_path, monkeypatch):
+    store = SegmentStore(tmp_path)
+    remaps = []
+    original_map = store._map
+    monkeypatch.setattr(store, "_map", lambda: (remaps.append(1), original_map()))
+
+    for start in range(0, 30, 10):
+        store.append(_records(start, 10, "A"))
+    assert len(store) == 30 and store.next_id == 30
+    assert not remaps
+
+    assert store.get(25) == ("A text 25", {"source": "A"})
+    assert store.get(5) == ("A text 5", {"source": "A"})
+    assert len(remaps) == 1
@@ -0,0 +1,31 @@
+"""Тесты семантического кеша ответов."""
+import asyncio
+
+from app.ai_integration.semantic_cache import SemanticAnswerCache
+
+from tests.test_vector_store import HashEmbeddings, add_source, open_store
+
+
+class CacheEmbeddings(HashEmbeddings):
+    model_id = "test"
+
+
+def test_answer_is_stale_after_source_content_changes(tmp_path):
+    async def scenario():
+        store = open_store(tmp_path, "flat")
+        ids = await add_source(store, "B", count=5)
+        store.set_source_hash("B", "v1")
+        cache = SemanticAnswerCache(CacheEmbeddings(), source_versions=store.source_versions)
+
+        await cache.store("как вступить в СРО", "ответ", ids[:2])
+        assert (await cache.lookup("как вступить в СРО")).answer == "ответ"
+
+        # Документ переиндексирован с другим содержимым
+        store.set_source_hash("B", "v2")
+        assert await cache.lookup("как вступить в СРО") is None
+
+        await cache.store("как вступить в СРО", "новый ответ", ids[:2])
+        await store.delete_documents_by_source("B")
+        assert await cache.lookup("как вступить в СРО") is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+"""Тесты истории диалога в сессии."""
+import asyncio
+import json
+
+import fakeredis
+
+from app.services.conversation_summarizer import ConversationSummarizer
+from app.services.session_service import SessionService
+
+
+class RecordingSummarizer(ConversationSummarizer):
+    def __init__(self):
+        super().__init__(deepseek_client=None, threshold_tokens=10_000, keep_turns=2)
+        self.scheduled = []
+
+    def schedule(self, user_id, session_service):
+        self.scheduled.append(user_id)
+
+
+def make_service(monkeypatch, summarizer=None, server=None) -> SessionService:
+    service = SessionService(summarizer=summarizer)
+    service.redis_client = fakeredis.FakeRedis(server=server or fakeredis.FakeServer())
+
+    async def save_session_to_db(session):
+        pass
+
+    monkeypatch.setattr(service, "_save_session_to_db", save_session_to_db)
+    return service
+
+
+def turn(i: int) -> dict:
+    return {"user_message": f"q{i}", "bot_response": f"a{i}", "timestamp": f"t{i:03d}"}
+
+
+def test_turns_beyond_the_limit_are_summarized_before_they_are_dropped(monkeypatch):
+    summarizer = RecordingSummarizer()
+    service = make_service(monkeypatch, summarizer)
+
+    async def scenario():
+        for i in range(11):
+            await service.add_to_history(1, turn(i))
+        history = (await service.get_or_create_session(1))["conversation_history"]
+        assert len(history) == 11
+        assert summarizer.scheduled
+
+        await service.apply_summary(1, "резюме", [t["timestamp"] for t in history[:-2]])
+        summary, recent = await service.get_conversation_state(1, limit=5)
+        assert summary == "резюме"
+        assert [t["timestamp"] for t in recent] == ["t009", "t010"]
+
+    asyncio.run(scenario())
+
+
+def test_history_without_summarizer_keeps_the_limit(monkeypatch):
+    service = make_service(monkeypatch)
+
+    async def scenario():
+        for i in range(15):
+            await service.add_to_history(1, turn(i))
+        history = await service.get_conversation_history(1, limit=100)
+        assert [t["timestamp"] for t in history] == [f"t{i:03d}" for i in range(5, 15)]
+
+    asyncio.run(scenario())
+
+
+def test_summary_does_not_lose_a_turn_saved_concurrently(monkeypatch):
+    server = fakeredis.FakeServer()
+    service = make_service(monkeypatch, server=server)
+    other_process = fakeredis.FakeRedis(server=server)
+
+    async def scenario():
+        for i in range(3):
+            await service.add_to_history(1, turn(i))
+
+        def summarize(session):
+            # Другой процесс сохраняет реплику между чтением сессии и записью резюме
+            if not other_process.get("saved"):
+                stored = json.loads(other_process.get("session:1"))
+                stored["conversation_history"].append(turn(3))
+                other_process.set("session:1", json.dumps(stored))
+                other_process.set("saved", 1)
+            session["conversation_history"] = session["conversation_history"][2:]
+
+        await service._update_session(1, summarize)
+
+        history = await service.get_conversation_history(1, limit=100)
+        assert [t["timestamp"] for t in history] == ["t002", "t003"]
+
+    asyncio.run(scenario())
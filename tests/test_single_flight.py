@@ -0,0 +1,111 @@
+"""Тесты объединения одинаковых одновременных запросов."""
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+from app.ai_integration.single_flight import SingleFlight
+
+
+class Upstream:
+    """Медленный внешний вызов, сохраняющий результат в общий кеш."""
+
+    def __init__(self, store: dict, fail: bool = False):
+        self.store = store
+        self.fail = fail
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def call(self) -> str:
+        self.calls += 1
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("upstream failed")
+        self.store["key"] = "answer"
+        return "answer"
+
+    async def load(self):
+        return self.store.get("key")
+
+
+def test_concurrent_calls_share_one_upstream_request():
+    async def scenario():
+        flight = SingleFlight("test-local")
+        upstream = Upstream({})
+        waiters = [asyncio.create_task(flight.do("key", upstream.call, upstream.load)) for _ in range(5)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+
+        assert await asyncio.gather(*waiters) == ["answer"] * 5
+        assert upstream.calls == 1
+        assert flight._flights == {}
+
+    asyncio.run(scenario())
+
+
+def test_error_reaches_every_waiter_and_next_call_retries():
+    async def scenario():
+        flight = SingleFlight("test-error")
+        upstream = Upstream({}, fail=True)
+        waiters = [asyncio.create_task(flight.do("key", upstream.call, upstream.load)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        upstream.fail = False
+        assert await flight.do("key", upstream.call, upstream.load) == "answer"
+        assert upstream.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_first_waiter_does_not_cancel_the_request():
+    async def scenario():
+        flight = SingleFlight("test-cancel")
+        upstream = Upstream({})
+        first = asyncio.create_task(flight.do("key", upstream.call, upstream.load))
+        second = asyncio.create_task(flight.do("key", upstream.call, upstream.load))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        upstream.release.set()
+
+        assert await second == "answer"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert upstream.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_other_process_waits_for_the_leader_through_redis():
+    server = fakeredis.FakeServer()
+
+    def process_flight() -> SingleFlight:
+        flight = SingleFlight("test-remote", redis_url="redis://cache", lock_ttl=5)
+        flight._redis = fakeredis.aioredis.FakeRedis(server=server)
+        flight.POLL_INTERVAL = 0.05
+        return flight
+
+    async def scenario():
+        shared_cache = {}
+        leader_upstream = Upstream(shared_cache)
+        follower_upstream = Upstream(shared_cache)
+        leader, follower = process_flight(), process_flight()
+
+        leading = asyncio.create_task(leader.do("key", leader_upstream.call, leader_upstream.load))
+        await asyncio.sleep(0.05)
+        following = asyncio.create_task(follower.do("key", follower_upstream.call, follower_upstream.load))
+        await asyncio.sleep(0.05)
+        leader_upstream.release.set()
+
+        assert await asyncio.wait_for(asyncio.gather(leading, following), 5) == ["answer", "answer"]
+        assert (leader_upstream.calls, follower_upstream.calls) == (1, 0)
+
+        await leader.close()
+        await follower.close()
+
+    asyncio.run(scenario())
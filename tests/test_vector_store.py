@@ -0,0 +1,160 @@
+"""Тесты векторного хранилища: удаление, компактизация и восстановление после сбоя."""
+import asyncio
+import hashlib
+
+import faiss
+import numpy as np
+import pytest
+
+from app.ai_integration.ann_index import ANNParams, index_type_of
+from app.ai_integration.vector_store import VectorStore
+
+DIMENSION = 32
+
+
+class HashEmbeddings:
+    """Детерминированные эмбеддинги по хэшу текста."""
+
+    def vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(DIMENSION).astype("float32")
+        return vector / np.linalg.norm(vector)
+
+    async def encode_batch(self, texts, batch_size: int = 32) -> np.ndarray:
+        return np.vstack([self.vector(text) for text in texts])
+
+    async def encode_cached(self, text: str) -> np.ndarray:
+        return self.vector(text)
+
+
+def open_store(path, index_type: str) -> VectorStore:
+    return VectorStore(
+        dimension=DIMENSION,
+        index_path=str(path),
+        embedding_service=HashEmbeddings(),
+        ann_params=ANNParams(index_type=index_type)
+    )
+
+
+async def add_source(store: VectorStore, source: str, count: int = 50, commit: bool = True):
+    texts = [f"{source} text {i}" for i in range(count)]
+    return await store.add_documents(texts, [{}] * count, source=source, commit=commit)
+
+
+def assert_consistent(store: VectorStore) -> None:
+    """Каждый вектор индекса соответствует тексту фрагмента с тем же идентификатором."""
+    embeddings = HashEmbeddings()
+    for chunk_id in faiss.vector_to_array(store.index.id_map).tolist():
+        if chunk_id in store._tombstones:
+            continue
+        record = store.segments.get(int(chunk_id))
+        assert record is not None, f"vector {chunk_id} has no chunk"
+        np.testing.assert_allclose(
+            store.index.reconstruct(int(chunk_id)), embeddings.vector(record[0]), atol=1e-5
+        )
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_uncommitted_delete_survives_crash(tmp_path, index_type):
+    async def scenario():
+        store = open_store(tmp_path, index_type)
+        await add_source(store, "A")
+        await add_source(store, "B")
+
+        # Синхронизация: удаление и добавление без сохранения, затем сбой
+        await store.delete_documents_by_source("B", commit=False)
+        c_ids = await add_source(store, "C", commit=False)
+        assert len(store.segments) == 150
+
+        store = open_store(tmp_path, index_type)
+        results = await store.search("C text 7", top_k=1, score_threshold=0.99)
+        assert [r["content"] for r in results] == ["C text 7"]
+        assert results[0]["metadata"]["chunk_id"] == c_ids[7]
+
+        results = await store.search("B text 7", top_k=5, score_threshold=-1)
+        assert all(not r["content"].startswith("B ") for r in results)
+        assert_consistent(store)
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_committed_delete_compacts_without_reusing_ids(tmp_path, index_type):
+    async def scenario():
+        store = open_store(tmp_path, index_type)
+        await add_source(store, "A")
+        b_ids = await add_source(store, "B")
+
+        assert await store.delete_documents_by_source("B") == 50
+        assert len(store.segments) == 50 and not store._tombstones
+
+        new_ids = await add_source(store, "B")
+        assert min(new_ids) > max(b_ids)
+
+        store = open_store(tmp_path, index_type)
+        assert len(store.segments) == 100
+        assert sorted(store.manifest) == ["A", "B"]
+        results = await store.search("B text 3", top_k=1, score_threshold=0.99)
+        assert results[0]["metadata"]["chunk_id"] == new_ids[3]
+        assert_consistent(store)
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_filtered_search_returns_only_matching_documents(tmp_path, index_type):
+    async def scenario():
+        store = open_store(tmp_path, index_type)
+        await add_source(store, "public", count=10)
+        await add_source(store, "members", count=10)
+        store.set_source_document("public", {"is_public": True})
+        store.set_source_document("members", {"is_public": False})
+
+        results = await store.search("members text 3", top_k=20, score_threshold=-1,
+                                     filters={"is_public": True})
+        assert len(results) == 10
+        assert {r["metadata"]["source"] for r in results} == {"public"}
+        assert store.chunks_match([r["metadata"]["chunk_id"] for r in results], {"is_public": True})
+
+    asyncio.run(scenario())
+
+
+def test_load_writes_nothing_while_another_process_holds_the_lock(tmp_path):
+    async def scenario():
+        store = open_store(tmp_path, "flat")
+        await add_source(store, "A", count=10)
+        store.segments.close()
+
+        manifest = tmp_path / VectorStore.MANIFEST_FILE
+        manifest.unlink()
+        with store.write_lock.hold(wait=False) as locked:
+            assert locked
+            # Манифест строится в памяти, но не сохраняется под чужой блокировкой
+            reader = open_store(tmp_path, "flat")
+            assert sorted(reader.manifest) == ["A"]
+            assert not manifest.exists()
+            reader.segments.close()
+
+        open_store(tmp_path, "flat")
+        assert manifest.exists()
+
+    asyncio.run(scenario())
+
+
+def test_reloaded_ivfpq_index_accepts_new_vectors(tmp_path):
+    params = ANNParams(index_type="ivfpq", pq_m=8)
+
+    async def scenario():
+        store = VectorStore(dimension=DIMENSION, index_path=str(tmp_path),
+                            embedding_service=HashEmbeddings(), ann_params=params)
+        await add_source(store, "A", count=24500)
+        assert index_type_of(store.index) == "ivfpq"
+
+        store = VectorStore(dimension=DIMENSION, index_path=str(tmp_path),
+                            embedding_service=HashEmbeddings(), ann_params=params)
+        b_ids = await add_source(store, "B", count=10)
+        assert store.index.ntotal == 24510
+        await store.delete_documents_by_source("B")
+        assert set(b_ids).isdisjoint(faiss.vector_to_array(store.index.id_map).tolist())
+
+    asyncio.run(scenario())